@@ -0,0 +1,4 @@
+"""
+五子棋引擎: 棋盘(chessboard)、评估(evaluate)及搜索(strategy)不依赖Qt, 可在无界面的进程中直接导入,
+只有界面(play.py, render.py)使用PyQt5; 查找表在首次使用时构建, numpy及torch只在批量评估及神经网络评估时导入
+"""
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+批量局面评估: 一次评估堆叠在一起的多个棋盘, 可分到进程池并流式读写文件
+结果与Evaluation(board, target).get_score(min_max=True)一致(不传落子点, 没有位置分)
+author: yooongchun@foxmail.com
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from gobang import pattern_table
+from gobang.evaluate import PATTERN_TABLE, Score
+from gobang.config import Chess, Config
+
+# 斜线不足部分的填充值, 不属于任何形态
+PAD = 3
+# 需要判断组合形态的分数及其组合后的分数
+COMBINED = {
+    Score.LEVEL1: Score.c_db_half_died_four,
+    Score.LEVEL2: Score.c_db_live_three,
+    Score.LEVEL3: Score.c_db_half_died_three,
+}
+
+
+def _lines(digits: np.ndarray):
+    """四个方向的线, 返回{方向: (线数组, 线上位置 -> 棋盘坐标的函数)}
+    Args:
+        digits: (N, m, m)的编码棋盘
+    """
+    n, m = digits.shape[0], digits.shape[1]
+    rows, cols = np.indices((m, m))
+    diag = np.full((n, 2 * m - 1, m), PAD, dtype=np.int64)
+    diag[:, (m - 1) - (cols - rows), rows] = digits
+    rdiag = np.full((n, 2 * m - 1, m), PAD, dtype=np.int64)
+    rdiag[:, rows + cols, rows] = digits
+    return (
+        (digits, lambda line, pos: (line, pos)),
+        (digits.transpose(0, 2, 1), lambda line, pos: (pos, line)),
+        (diag, lambda line, pos: (pos, pos + (m - 1) - line)),
+        (rdiag, lambda line, pos: (pos, line - pos)),
+    )
+
+
+def max_scores(boards: np.ndarray, chess: np.ndarray):
+    """每个棋盘上chess一方的最高形态分, 即MaxEvaluation(board, chess).get_score()
+    Args:
+        boards: (N, n, n)的棋盘, 取值为Chess
+        chess: (N,)的角色
+    """
+    count, size = boards.shape[0], boards.shape[1]
+    m = size + 2
+    # 编码: 0空, 1己方, 2对方, 棋盘四周加一圈对方棋子
+    digits = np.full((count, m, m), 2, dtype=np.int64)
+    inner = np.where(boards == Chess.EMPTY, 0, np.where(boards == chess[:, None, None], 1, 2))
+    digits[:, 1:-1, 1:-1] = inner
+    num = len(PATTERN_TABLE.patterns)
+    found = np.zeros((count, num), dtype=bool)
+    # (形态编号数组, 方向, 窗口长度, 坐标函数)
+    windows = []
+    for dire, (lines, coord) in enumerate(_lines(digits)):
+        pad = lines == PAD
+        rel = np.where(pad, 0, lines)
+        code, invalid = None, None
+        for k in range(1, PATTERN_TABLE.lengths[-1] + 1):
+            width = lines.shape[2] - k + 1
+            if width <= 0:
+                break
+            if code is None:
+                code, invalid = rel[:, :, :width], pad[:, :, :width]
+            else:
+                code = code[:, :, :width] * 3 + rel[:, :, k - 1:k - 1 + width]
+                invalid = invalid[:, :, :width] | pad[:, :, k - 1:k - 1 + width]
+            if k not in PATTERN_TABLE.ids_np:
+                continue
+            ids = PATTERN_TABLE.ids_np[k][code]
+            ids[invalid] = -1
+            board_idx, line_idx, pos_idx = np.nonzero(ids >= 0)
+            found[board_idx, ids[board_idx, line_idx, pos_idx]] = True
+            windows.append((ids, dire, k, coord))
+    # 按分数从高到低找到第一个匹配的形态, 正序优先于逆序
+    scores = np.zeros(count, dtype=np.int64)
+    chosen = np.full(count, -1, dtype=np.int64)
+    pending = np.ones(count, dtype=bool)
+    for case in PATTERN_TABLE.cases:
+        forward = PATTERN_TABLE.ids[len(case)][pattern_table.encode(case)]
+        reverse = PATTERN_TABLE.ids[len(case)][pattern_table.encode(case[::-1])]
+        hit_forward = pending & found[:, forward]
+        hit_reverse = pending & ~hit_forward & found[:, reverse]
+        chosen[hit_forward] = forward
+        chosen[hit_reverse] = reverse
+        hit = hit_forward | hit_reverse
+        scores[hit] = getattr(Score, case)
+        pending &= ~hit
+    # 冲四/活三/眠三: 同一形态在不同方向上有交叉时为组合形态
+    combined = np.isin(scores, list(COMBINED))
+    if combined.any():
+        cover = np.zeros((4, count, m, m), dtype=bool)
+        for ids, dire, k, coord in windows:
+            board_idx, line_idx, pos_idx = np.nonzero((ids == chosen[:, None, None]) & combined[:, None, None])
+            for t in range(k):
+                x, y = coord(line_idx, pos_idx + t)
+                cover[dire, board_idx, x, y] = True
+        multi = (cover.sum(axis=0) >= 2).any(axis=(1, 2))
+        for level, score in COMBINED.items():
+            scores[multi & (scores == level)] = score
+    return scores
+
+
+def evaluate_batch(boards: np.ndarray, sides: np.ndarray):
+    """批量评估
+    Args:
+        boards: (N, n, n)的棋盘, 取值为Chess
+        sides: (N,)轮到落子的一方
+    Returns:
+        (N, 2)的int32数组: 轮到落子一方及对方的最高形态分, 两者之差即为落子一方的Evaluation分数
+    """
+    boards = np.asarray(boards)
+    sides = np.asarray(sides, dtype=np.int64)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2] or sides.shape != boards.shape[:1]:
+        raise ValueError(f"Invalid batch shape: {boards.shape}, {sides.shape}")
+    if not len(boards):
+        return np.zeros((0, 2), dtype=np.int32)
+    armies = np.where(sides == Chess.BLACK, Chess.WHITE, Chess.BLACK)
+    return np.stack([max_scores(boards, sides), max_scores(boards, armies)], axis=1).astype(np.int32)
+
+
+def evaluate_parallel(boards: np.ndarray, sides: np.ndarray, workers: int=os.cpu_count() or 1,
+                        chunk: int=Config.BATCH_EVAL_CHUNK, executor: Optional[ProcessPoolExecutor]=None):
+    """分块后在进程池中批量评估, 结果顺序与输入一致
+    Args:
+        boards: (N, n, n)的棋盘
+        sides: (N,)轮到落子的一方
+        workers: 进程数
+        chunk: 每块的棋盘数
+        executor: 进程池, 传入时复用, 否则新建
+    """
+    if workers <= 1 or len(boards) <= chunk:
+        return evaluate_batch(boards, sides)
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        starts = range(0, len(boards), chunk)
+        results = pool.map(evaluate_batch, [boards[i:i + chunk] for i in starts], [sides[i:i + chunk] for i in starts])
+        return np.concatenate(list(results))
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+
+def write_positions(path: str, boards: np.ndarray, sides: np.ndarray, append: bool=False):
+    """写出局面文件: 每条记录为n*n字节的棋盘(按行)加1字节轮到落子的一方"""
+    boards = np.asarray(boards, dtype=np.uint8)
+    records = np.concatenate([boards.reshape(len(boards), -1), np.asarray(sides, dtype=np.uint8)[:, None]], axis=1)
+    with open(path, "ab" if append else "wb") as f:
+        records.tofile(f)
+    return len(records)
+
+
+def read_positions(path: str, size: int=Config.SIZE, chunk: int=Config.BATCH_EVAL_CHUNK):
+    """流式读取局面文件, 每次返回最多chunk个(棋盘, 轮到落子的一方)"""
+    record = size * size + 1
+    with open(path, "rb") as f:
+        while True:
+            data = np.fromfile(f, dtype=np.uint8, count=chunk * record)
+            if not len(data):
+                break
+            if len(data) % record:
+                raise ValueError(f"Truncated positions file: {path}")
+            data = data.reshape(-1, record)
+            yield data[:, :-1].reshape(-1, size, size), data[:, -1]
+
+
+def evaluate_file(src: str, dst: str, size: int=Config.SIZE, chunk: int=Config.BATCH_EVAL_CHUNK,
+                    workers: int=1):
+    """流式评估局面文件, 结果按记录顺序以int32对(落子一方, 对方)写入dst, 内存占用与文件大小无关
+    Args:
+        src: 局面文件, 见write_positions
+        dst: 结果文件
+        size: 棋盘大小
+        chunk: 每块的棋盘数
+        workers: 进程数, 大于1时每次读取workers块并行评估
+    """
+    count = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        with open(dst, "wb") as out:
+            batches = []
+            for batch in read_positions(src, size, chunk):
+                batches.append(batch)
+                if len(batches) < workers:
+                    continue
+                count += _flush(batches, out, pool)
+            count += _flush(batches, out, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return count
+
+
+def _flush(batches: list, out, pool: Optional[ProcessPoolExecutor]):
+    """评估缓存的块并写出, 返回写出的记录数"""
+    if not batches:
+        return 0
+    if pool is None:
+        results = [evaluate_batch(boards, sides) for boards, sides in batches]
+    else:
+        results = pool.map(evaluate_batch, *zip(*batches))
+    count = 0
+    for scores in results:
+        scores.astype("<i4").tofile(out)
+        count += len(scores)
+    batches.clear()
+    return count
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Batch position evaluation")
+    parser.add_argument("input", help="positions file: n*n board bytes + 1 side byte per record")
+    parser.add_argument("output", help="scores file: int32 (side, opponent) per record")
+    parser.add_argument("-s", "--size", type=int, default=Config.SIZE, help="board size")
+    parser.add_argument("-c", "--chunk", type=int, default=Config.BATCH_EVAL_CHUNK, help="boards per batch")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="evaluation processes")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    start = time.time()
+    count = evaluate_file(args.input, args.output, args.size, args.chunk, args.workers)
+    elapsed = time.time() - start
+    print(f"{count} positions evaluated in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} positions/s)")
+
+
+if __name__ == "__main__":
+    main()
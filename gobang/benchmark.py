@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+无界面的性能基准: 固定局面集和AI自对弈, 输出JSON报告并与基线对比
+author: yooongchun@foxmail.com
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict as ddict
+from typing import Optional
+
+from gobang import chessboard
+from gobang.strategy import flat_search, mcts, min_max_tree
+from gobang.config import Chess, Config, Point
+
+
+def peak_memory_kb():
+    """进程的内存峰值(KB), 不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节, Linux为KB
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def load_board(moves: list, size: int):
+    """按落子顺序复原棋盘, 黑棋先手, 返回棋盘及轮到落子的一方"""
+    board = chessboard.ChessBoard(size=size)
+    for k, (x, y) in enumerate(moves):
+        board.set(Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE))
+    return board, Chess.WHITE if len(moves) % 2 else Chess.BLACK
+
+
+def search_once(board: chessboard.ChessBoard, target: Chess, depth: int,
+                time_budget_ms: Optional[float]=None, options: Optional[dict]=None):
+    """搜索一步并记录结果
+    Args:
+        options: MinMaxSearcher的参数, 另外low_alloc为True时使用低分配的FlatSearcher,
+            neural为True时使用神经网络评估的NeuralSearcher(需要torch), mcts为True时使用MCTSSearcher,
+            trace_memory为True时用tracemalloc记录搜索中的内存峰值(会使搜索变慢)
+    """
+    options = dict(options or {})
+    low_alloc = options.pop("low_alloc", Config.LOW_ALLOC_SEARCH)
+    trace_memory = options.pop("trace_memory", False)
+    searcher_cls = flat_search.FlatSearcher if low_alloc else min_max_tree.MinMaxSearcher
+    if options.pop("neural", False):
+        # 用到时才导入, 不使用网络时不加载numpy及torch
+        from gobang.strategy import neural
+
+        searcher_cls = neural.NeuralSearcher
+    if options.pop("mcts", False):
+        searcher_cls = mcts.MCTSSearcher
+    searcher = searcher_cls(board, target, **options)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    cpu = time.process_time()
+    score, move = searcher.search(depth, time_budget_ms)
+    cpu = time.process_time() - cpu
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats = searcher.stats
+    # 开局库及算杀的耗时不计入搜索, 节点数本来就只包括博弈树的节点
+    search_time = max(0.0, elapsed - stats.threat_time)
+    result = {
+        "move": [move.x, move.y] if move else None,
+        "pv": [[pt.x, pt.y] for pt in searcher.pv],
+        "score": score,
+        "depth": searcher.completed_depth,
+        "time": elapsed,
+        "search_time": search_time,
+        "cpu_time": cpu,
+        "nodes": stats.total_nodes,
+        "nps": stats.total_nodes / search_time if stats.total_nodes and search_time else 0.0,
+        "book_hits": stats.book_hits,
+        "threat_nodes": stats.threat_nodes,
+        "branching_factor": stats.branching_factor,
+        "first_cutoff_rate": stats.first_cutoff_rate,
+        "mean_cutoff_index": stats.mean_cutoff_index,
+    }
+    if peak is not None:
+        result["peak_memory_bytes"] = peak
+        result["memory_per_node"] = peak / stats.total_nodes if stats.total_nodes else 0.0
+    return result
+
+
+def run_positions(suite: list, depths: list, time_budget_ms: Optional[float]=None, options: Optional[dict]=None):
+    """在固定局面集上按不同深度搜索, 开局库及算杀是否使用由options决定(默认都不使用, 只比较博弈树搜索)"""
+    results = []
+    for position in suite:
+        for depth in depths:
+            board, target = load_board(position["moves"], position.get("size", Config.SIZE))
+            result = search_once(board, target, depth, time_budget_ms, options)
+            result.update({"name": position["name"], "max_depth": depth})
+            results.append(result)
+            print(f"[position] {position['name']:<18} depth={depth} move={result['move']} "
+                  f"score={result['score']} time={result['time']:.3f}s nps={result['nps']:.0f}")
+    return results
+
+
+def run_selfplay(games: int, depth: int, size: int, max_moves: int, seed: int=0,
+                    time_budget_ms: Optional[float]=None, options: Optional[dict]=None):
+    """AI自对弈, 每局以随机的开局第二步区分"""
+    rand = random.Random(seed)
+    results = []
+    for game in range(games):
+        center = size // 2
+        board, turn = load_board([[center, center]], size)
+        opening = [(center + dx, center + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+        x, y = rand.choice(opening)
+        board.set(Point(x, y, turn))
+        moves = [[center, center], [x, y]]
+        turn = Chess.BLACK
+        records, winner = [], None
+        while len(moves) < max_moves and board.has_empty():
+            result = search_once(board, turn, depth, time_budget_ms, options)
+            if result["move"] is None:
+                break
+            board.set(Point(*result["move"], turn))
+            moves.append(result["move"])
+            records.append(result)
+            if board.check_win(turn):
+                winner = turn.name
+                break
+            turn = Chess.WHITE if turn == Chess.BLACK else Chess.BLACK
+        total = sum(r["time"] for r in records)
+        search_time = sum(r["search_time"] for r in records)
+        nodes = sum(r["nodes"] for r in records)
+        results.append({
+            "game": game,
+            "moves": moves,
+            "winner": winner,
+            "time": total,
+            "search_time": search_time,
+            "nodes": nodes,
+            "nps": nodes / search_time if search_time else 0.0,
+            "time_per_move": [r["time"] for r in records],
+        })
+        print(f"[selfplay] game={game} moves={len(moves)} winner={winner} time={total:.2f}s "
+              f"nps={results[-1]['nps']:.0f}")
+    return results
+
+
+def run_match(games: int, depth: int, size: int, max_moves: int, seed: int=0,
+                time_budget_ms: Optional[float]=None, options: Optional[dict]=None):
+    """博弈树搜索与MCTS对弈, 双方轮流先手, 每局以随机的开局第二步区分, 按每步的时间预算比较单位CPU时间的棋力"""
+    rand = random.Random(seed)
+    engines = {"alphabeta": dict(options or {}, mcts=False), "mcts": dict(options or {}, mcts=True)}
+    results = []
+    cpu = ddict(list)
+    for game in range(games):
+        center = size // 2
+        board, _ = load_board([[center, center]], size)
+        opening = [(center + dx, center + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+        x, y = rand.choice(opening)
+        board.set(Point(x, y, Chess.WHITE))
+        moves = [[center, center], [x, y]]
+        # 偶数局博弈树搜索执黑
+        players = {Chess.BLACK: "alphabeta", Chess.WHITE: "mcts"}
+        if game % 2:
+            players = {Chess.BLACK: "mcts", Chess.WHITE: "alphabeta"}
+        turn, winner = Chess.BLACK, None
+        while len(moves) < max_moves and board.has_empty():
+            result = search_once(board, turn, depth, time_budget_ms, engines[players[turn]])
+            if result["move"] is None:
+                break
+            cpu[players[turn]].append(result["cpu_time"])
+            board.set(Point(*result["move"], turn))
+            moves.append(result["move"])
+            if board.check_win(turn):
+                winner = players[turn]
+                break
+            turn = Chess.WHITE if turn == Chess.BLACK else Chess.BLACK
+        results.append({"game": game, "black": players[Chess.BLACK], "moves": moves, "winner": winner})
+        print(f"[match] game={game} black={players[Chess.BLACK]} moves={len(moves)} winner={winner}")
+    return {
+        "games": results,
+        "wins": {name: sum(1 for r in results if r["winner"] == name) for name in engines},
+        "draws": sum(1 for r in results if r["winner"] is None),
+        "cpu_per_move": {name: sum(ts) / len(ts) if ts else None for name, ts in cpu.items()},
+    }
+
+
+def summarize(positions: list, games: list):
+    """汇总: 博弈树搜索的总体每秒节点数及各深度的平均每步耗时"""
+    nodes = sum(r["nodes"] for r in positions) + sum(g["nodes"] for g in games)
+    seconds = sum(r["search_time"] for r in positions) + sum(g["search_time"] for g in games)
+    per_depth = ddict(list)
+    for r in positions:
+        per_depth[r["max_depth"]].append(r["time"])
+    return {
+        "nodes": nodes,
+        "time": seconds,
+        "nps": nodes / seconds if seconds else 0.0,
+        "time_per_move": {str(d): sum(ts) / len(ts) for d, ts in sorted(per_depth.items())},
+        "selfplay_time_per_move": (sum(g["time"] for g in games) / sum(len(g["time_per_move"]) for g in games)
+                                    if games and any(g["time_per_move"] for g in games) else None),
+        "peak_memory_kb": peak_memory_kb(),
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float):
+    """与基线对比, 返回(变慢的项, 走法或结果变化的项)"""
+    slowdowns, changes = [], []
+    new, old = report["summary"], baseline["summary"]
+    if old.get("nps") and new["nps"] < old["nps"] * (1 - threshold):
+        slowdowns.append(f"nps {old['nps']:.0f} -> {new['nps']:.0f}")
+    for depth, seconds in new["time_per_move"].items():
+        base = old.get("time_per_move", {}).get(depth)
+        if base and seconds > base * (1 + threshold):
+            slowdowns.append(f"depth {depth} time per move {base:.3f}s -> {seconds:.3f}s")
+    base_positions = {(r["name"], r["max_depth"]): r for r in baseline.get("positions", [])}
+    for r in report["positions"]:
+        base = base_positions.get((r["name"], r["max_depth"]))
+        if base is None:
+            continue
+        if base["move"] != r["move"]:
+            changes.append(f"{r['name']} depth {r['max_depth']}: move {base['move']} -> {r['move']}")
+        if r["score"] is not None and base["score"] is not None and r["score"] < base["score"]:
+            changes.append(f"{r['name']} depth {r['max_depth']}: score {base['score']} -> {r['score']}")
+    for game, base in zip(report["games"], baseline.get("games", [])):
+        if game["winner"] != base["winner"] or game["moves"] != base["moves"]:
+            changes.append(f"selfplay game {game['game']}: winner {base['winner']} -> {game['winner']}, "
+                           f"{len(base['moves'])} -> {len(game['moves'])} moves")
+    return slowdowns, changes
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Headless search benchmark")
+    parser.add_argument("--suite", default=Config.BENCH_POSITIONS, help="positions suite(json)")
+    parser.add_argument("-d", "--depths", type=int, nargs="*", default=[1, 2, 3], help="search depths for positions")
+    parser.add_argument("-g", "--games", type=int, default=0, help="number of self-play games")
+    parser.add_argument("--game-depth", type=int, default=2, help="search depth in self-play")
+    parser.add_argument("--max-moves", type=int, default=60, help="max moves per self-play game")
+    parser.add_argument("-s", "--size", type=int, default=Config.SIZE, help="board size for self-play")
+    parser.add_argument("-t", "--time-budget", type=float, default=None, help="time budget per move(ms)")
+    parser.add_argument("--no-book", action="store_true", default=False,
+                        help="do not use the opening book in self-play and matches")
+    parser.add_argument("--book", action="store_true", default=False,
+                        help="use the opening book for the positions suite too(off by default to time the search)")
+    parser.add_argument("--threat", action="store_true", default=False,
+                        help="run the VCF/VCT pre-search for the positions suite too(off by default to time the search)")
+    parser.add_argument("--no-pvs", action="store_true", default=False, help="search every move with a full window")
+    parser.add_argument("--aspiration", type=int, default=Config.ASPIRATION_WINDOW,
+                        help="aspiration window radius, 0 for a full window")
+    parser.add_argument("--no-killers", action="store_true", default=False, help="disable killer moves")
+    parser.add_argument("--no-history", action="store_true", default=False, help="disable the history heuristic")
+    parser.add_argument("--low-alloc", action="store_true", default=Config.LOW_ALLOC_SEARCH,
+                        help="use the low-allocation searcher")
+    parser.add_argument("--neural", action="store_true", default=False,
+                        help="evaluate leaves with the neural network(requires torch)")
+    parser.add_argument("--mcts", action="store_true", default=False,
+                        help="use Monte Carlo tree search for positions and self-play")
+    parser.add_argument("--match", type=int, default=0,
+                        help="number of alpha-beta vs MCTS games at --game-depth/--time-budget per move")
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="record peak traced memory of every search(slow)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of self-play openings")
+    parser.add_argument("-o", "--output", default=None, help="write JSON report to this file")
+    parser.add_argument("-b", "--baseline", default=None, help="compare with this baseline report")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown ratio against baseline")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口, 相对基线变慢时返回非0"""
+    args = parse_args()
+    with open(args.suite, encoding="utf-8") as f:
+        suite = json.load(f)
+    options = {"use_book": not args.no_book, "pvs": not args.no_pvs, "aspiration": args.aspiration,
+               "killers": not args.no_killers, "history": not args.no_history,
+               "low_alloc": args.low_alloc, "neural": args.neural, "mcts": args.mcts,
+               "trace_memory": args.trace_memory}
+    # 局面集只比较博弈树搜索, 命中开局库或算杀时不会搜索
+    position_options = dict(options, use_book=args.book, threat_search=args.threat)
+    positions = run_positions(suite, args.depths, args.time_budget, position_options)
+    games = run_selfplay(args.games, args.game_depth, args.size, args.max_moves, args.seed, args.time_budget, options)
+    match = None
+    if args.match:
+        match = run_match(args.match, args.game_depth, args.size, args.max_moves, args.seed, args.time_budget, options)
+    report = {
+        "version": Config.APP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "summary": summarize(positions, games),
+        "positions": positions,
+        "games": games,
+        "match": match,
+    }
+    summary = report["summary"]
+    print(f"nodes={summary['nodes']} time={summary['time']:.2f}s nps={summary['nps']:.0f} "
+          f"peak_memory={summary['peak_memory_kb']}KB time_per_move={summary['time_per_move']}")
+    if match is not None:
+        print(f"match wins={match['wins']} draws={match['draws']} cpu_per_move={match['cpu_per_move']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    slowdowns, changes = compare(report, baseline, args.threshold)
+    for change in changes:
+        print(f"[changed] {change}")
+    for slowdown in slowdowns:
+        print(f"[slower] {slowdown}")
+    return 1 if slowdowns else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,86 @@
 # !/usr/bin/env python3
 # -*- coding:utf-8 -*-
 
+import functools
 import random
 from typing import Optional, List
 
-import util
-from config import Chess, Point, Config
+from gobang import util
+from gobang.config import Chess, Point, Config
+
+
+@functools.lru_cache(maxsize=None)
+def zobrist_keys(size: int):
+    """Zobrist随机数表, 按keys[x][y][chess]索引, 空位为0"""
+    rand = random.Random(Config.ZOBRIST_SEED)
+    return [[(0, rand.getrandbits(64), rand.getrandbits(64)) for _ in range(size)] for _ in range(size)]
+
+
+# 候选走法的启发式分数: (连子数, 两端空位数) -> 分数
+SHAPE_SCORE = {
+    (5, 0): 100000, (5, 1): 100000, (5, 2): 100000,
+    (4, 2): 10000, (4, 1): 1000,
+    (3, 2): 1000, (3, 1): 100,
+    (2, 2): 100, (2, 1): 10,
+    (1, 2): 10, (1, 1): 1,
+}
+
+
+def replay(stones: List[Point], size: int=Config.SIZE):
+    """在空棋盘上按顺序落下stones, 得到带完整落子历史的棋盘
+    Args:
+        stones: 落子序列, 如ChessBoard.stones
+        size: 棋盘大小
+    Returns:
+        新的ChessBoard
+    """
+    board = ChessBoard(size=size)
+    for pt in stones:
+        board.set(pt)
+    return board
+
+
+def roi_bounds(size: int, point: Point, roi: int):
+    """计算size大小的棋盘上ROI区域的边界: (start_x, end_x, start_y, end_y)"""
+    roi = min(roi, size)
+    start_x = max(0, point.x - roi + 1)
+    end_x = min(size, point.x + roi)
+    start_y = max(0, point.y - roi + 1)
+    end_y = min(size, point.y + roi)
+    # crop之后需要将区域补齐为正方形
+    left = True
+    while end_y - start_y > end_x - start_x:
+        if left:
+            if start_x > 0:
+                start_x -= 1
+            left = False
+        else:
+            if end_x < size:
+                end_x += 1
+            left = True
+    left = True
+    while end_x - start_x > end_y - start_y:
+        if left:
+            if start_y > 0:
+                start_y -= 1
+            left = False
+        else:
+            if end_y < size:
+                end_y += 1
+            left = True
+    return start_x, end_x, start_y, end_y
+
+
+def crop_roi(board: List[list], point: Point, roi: int):
+    """从二维数组中截取ROI区域, 不需要构建ChessBoard
+    Args:
+        board: 方阵
+        point: 兴趣点中心
+        roi: 以point为中心, roi为距离的感兴趣区域
+    """
+    start_x, end_x, start_y, end_y = roi_bounds(len(board), point, roi)
+    # crop区域
+    return [[board[j][i] for i in range(start_x, end_x)] for j in range(start_y, end_y)]
 
 
 class ChessBoard(object):
@@ -17,12 +92,97 @@ class ChessBoard(object):
             size: 初始化board的大小
         """
         self.size = size
-        if board is None:
-            self._board = [[Chess.EMPTY.value for _ in range(size)] for _ in range(size)]
-        else:
+        if board is not None:
             assert len(board) == size, "board's shape and config.SIZE is conflict with each other!"
-            self._board = board
         self._history = []
+        # 监听落子/悔棋/重置的对象, 用于增量维护评估等状态
+        self._listeners = []
+        self._zobrist = zobrist_keys(size)
+        self._neighbor_layer = Config.NEIGHBOR_LAYER
+        self._load(board)
+
+    def _load(self, board:Optional[List[list]]):
+        """载入棋盘并重建派生状态, board为None时载入空棋盘"""
+        if board is None:
+            board = [[Chess.EMPTY.value for _ in range(self.size)] for _ in range(self.size)]
+        self._board = board
+        # Zobrist哈希, 落子和悔棋时增量更新
+        self._hash = 0
+        for i in range(self.size):
+            for j in range(self.size):
+                self._hash ^= self._zobrist[i][j][self._board[i][j]]
+        # 邻居计数及候选位置(有邻居的空位), 首次使用时构建, 之后增量更新
+        self._neighbors = None
+        self._candidates = None
+        # 已连成五子的一方及其在历史中的步数, 落子时由最后一步判断, 悔棋到此之前时清除
+        self._winner = None
+        self._win_ply = 0
+        # 载入时已有的棋子, 不在落子历史中
+        self._initial = []
+        for i in range(self.size):
+            for j in range(self.size):
+                if self._board[i][j] != Chess.EMPTY:
+                    self._initial.append(Point(i, j, Chess(int(self._board[i][j]))))
+                    if self._winner is None and self._is_five(i, j, self._board[i][j]):
+                        self._winner = Chess(int(self._board[i][j]))
+
+    def _put(self, x:int, y:int, value:int):
+        """写入一个点的状态"""
+        self._board[x][y] = value
+
+    @property
+    def hash(self):
+        """当前局面的Zobrist哈希"""
+        return self._hash
+
+    @property
+    def history(self):
+        """落子历史, 按落子顺序排列"""
+        return list(self._history)
+
+    @property
+    def stones(self):
+        """棋盘上的全部棋子, 包括载入时已有的棋子及落子历史"""
+        return self._initial + self._history
+
+    @property
+    def winner(self):
+        """已经连成五子的一方, 没有时为None"""
+        return self._winner
+
+    def is_over(self):
+        """对局是否结束: 有一方连成五子或棋盘已满"""
+        return self._winner is not None or not self.has_empty()
+
+    def check_win(self, chess: Chess):
+        """chess一方是否已经连成五子"""
+        return self._winner == chess
+
+    def _is_five(self, x:int, y:int, chess:int):
+        """经过(x, y)的四条线上是否有chess一方连成五子"""
+        for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                i, j = x + sign * dx, y + sign * dy
+                while 0 <= i < self.size and 0 <= j < self.size and self._board[i][j] == chess:
+                    count += 1
+                    i, j = i + sign * dx, j + sign * dy
+            if count >= 5:
+                return True
+        return False
+
+    def copy(self):
+        """复制棋盘: 重放全部棋子, 保留落子顺序及历史, 不复制监听对象"""
+        return replay(self.stones, self.size)
+
+    def add_listener(self, listener):
+        """注册监听对象, 需实现on_set/on_unset/on_reset方法"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """移除监听对象"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
 
     def get_board(self, point:Optional[Point]=None, roi:int=8):
         """获取棋盘
@@ -52,6 +212,13 @@ class ChessBoard(object):
         """
         if len(self._history) == 0:
             return [(self.size // 2, self.size // 2)]
+        if neighbor_layer == self._neighbor_layer:
+            # 直接使用增量维护的候选位置
+            self._build_neighbors()
+            moves = sorted(self._candidates)
+            if shuffle:
+                random.shuffle(moves)
+            return moves
         moves = []
         for i in range(self.size):
             for j in range(self.size):
@@ -64,6 +231,76 @@ class ChessBoard(object):
             random.shuffle(moves)
         return moves
 
+    def get_candidates(self, chess: Chess, top_k:Optional[int]=None, tiebreak:Optional[list]=None):
+        """候选走法, 按启发式分数从高到低排列
+        Args:
+            chess: 轮到落子的一方
+            top_k: 最多返回的走法数量, 不传则返回全部
+            tiebreak: 棋盘大小的分数表(如搜索的历史表), 启发式分数相同时分数高的在前
+        """
+        self._build_neighbors()
+        if not self._candidates:
+            center = self.size // 2
+            return [(center, center)] if self._board[center][center] == Chess.EMPTY else []
+        army = Chess.BLACK if chess == Chess.WHITE else Chess.WHITE
+        scores = {}
+        for i, j in self._candidates:
+            # 进攻分优先于防守分
+            scores[(i, j)] = 2 * self._point_score(i, j, chess) + self._point_score(i, j, army)
+        if tiebreak is None:
+            moves = sorted(scores, key=lambda move: (-scores[move], move))
+        else:
+            moves = sorted(scores, key=lambda move: (-scores[move], -tiebreak[move[0]][move[1]], move))
+        if top_k:
+            moves = moves[:top_k]
+        return moves
+
+    def _point_score(self, x:int, y:int, chess:int):
+        """在(x, y)落子后四个方向上形成的棋形分数之和"""
+        score = 0
+        for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count, open_ends = 1, 0
+            for sign in (1, -1):
+                i, j = x + sign * dx, y + sign * dy
+                while 0 <= i < self.size and 0 <= j < self.size and self._board[i][j] == chess:
+                    count += 1
+                    i, j = i + sign * dx, j + sign * dy
+                if 0 <= i < self.size and 0 <= j < self.size and self._board[i][j] == Chess.EMPTY:
+                    open_ends += 1
+            score += SHAPE_SCORE.get((min(count, 5), open_ends), 0)
+        return score
+
+    def _build_neighbors(self):
+        """构建邻居计数及候选位置"""
+        if self._neighbors is not None:
+            return
+        self._neighbors = [[0] * self.size for _ in range(self.size)]
+        self._candidates = set()
+        for i in range(self.size):
+            for j in range(self.size):
+                if self._board[i][j] != Chess.EMPTY:
+                    self._update_neighbors(i, j, 1)
+
+    def _update_neighbors(self, x:int, y:int, delta:int):
+        """(x, y)处落子(delta=1)或提子(delta=-1)后更新周围的邻居计数及候选位置"""
+        layer = self._neighbor_layer
+        for i in range(max(0, x-layer), min(self.size, x+layer+1)):
+            row = self._neighbors[i]
+            for j in range(max(0, y-layer), min(self.size, y+layer+1)):
+                if i == x and j == y:
+                    continue
+                row[j] += delta
+                if self._board[i][j] != Chess.EMPTY:
+                    continue
+                if row[j] > 0:
+                    self._candidates.add((i, j))
+                else:
+                    self._candidates.discard((i, j))
+        if self._board[x][y] != Chess.EMPTY:
+            self._candidates.discard((x, y))
+        elif self._neighbors[x][y] > 0:
+            self._candidates.add((x, y))
+
     def _has_neighbors(self, x:int, y:int, layer:int=2):
         """是否有邻居"""
         for i in range(max(0, x-layer), min(self.size, x+layer+1)):
@@ -80,35 +317,11 @@ class ChessBoard(object):
             point: 兴趣点中心, 当和roi一起传递时会截取关注区域
             roi: 以point为中心, roi为距离的感兴趣区域
         """
-        roi = min(roi, len(self._board))
-        start_x = max(0, point.x - roi + 1)
-        end_x = min(len(self._board), point.x + roi)
-        start_y = max(0, point.y - roi + 1)
-        end_y = min(len(self._board), point.y + roi)
-        # crop之后需要将区域补齐为正方形
-        left = True
-        while end_y - start_y > end_x - start_x:
-            if left:
-                if start_x > 0:
-                    start_x -= 1
-                left = False
-            else:
-                if end_x < len(self._board):
-                    end_x += 1
-                left = True
-        left = True
-        while end_x - start_x > end_y - start_y:
-            if left:
-                if start_y > 0:
-                    start_y -= 1
-                left = False
-            else:
-                if end_y < len(self._board):
-                    end_y += 1
-                left = True
-        # crop区域
-        cropped_board = [[self._board[j][i] for i in range(start_x, end_x)] for j in range(start_y, end_y)]
-        return cropped_board
+        return crop_roi(self._board, point, roi)
+
+    def _roi_bounds(self, point:Point, roi:int):
+        """计算ROI区域的边界: (start_x, end_x, start_y, end_y)"""
+        return roi_bounds(len(self._board), point, roi)
 
     def set(self, pt:Point):
         """落子"""
@@ -116,8 +329,16 @@ class ChessBoard(object):
             raise ValueError(f"{pt} position not empty!")
         if pt.x < 0 or pt.x >= self.size or pt.y < 0 or pt.y >= self.size:
             raise ValueError(f"{pt} out of boundary!")
-        self._board[pt.x][pt.y] = pt.chess.value
+        self._put(pt.x, pt.y, pt.chess.value)
+        self._hash ^= self._zobrist[pt.x][pt.y][pt.chess]
+        if self._neighbors is not None:
+            self._update_neighbors(pt.x, pt.y, 1)
         self._history.append(pt)
+        if self._winner is None and self._is_five(pt.x, pt.y, pt.chess):
+            self._winner = pt.chess
+            self._win_ply = len(self._history)
+        for listener in self._listeners:
+            listener.on_set(pt)
         return True
 
     def unset(self):
@@ -125,7 +346,14 @@ class ChessBoard(object):
         if not self._history:
             return False
         last = self._history.pop()
-        self._board[last.x][last.y] = Chess.EMPTY.value
+        if self._winner is not None and len(self._history) < self._win_ply:
+            self._winner = None
+        self._put(last.x, last.y, Chess.EMPTY.value)
+        self._hash ^= self._zobrist[last.x][last.y][last.chess]
+        if self._neighbors is not None:
+            self._update_neighbors(last.x, last.y, -1)
+        for listener in self._listeners:
+            listener.on_unset(last)
         return last
 
     def get(self, pt:Point):
@@ -137,7 +365,10 @@ class ChessBoard(object):
 
     def reset(self):
         """重置棋盘"""
-        self._board = [[Chess.EMPTY.value for _ in range(self.size)] for _ in range(self.size)]
+        self._load(None)
+        self._history = []
+        for listener in self._listeners:
+            listener.on_reset()
         return self._board
 
     def show(self):
@@ -6,25 +6,102 @@
 author:yooongchun@foxmail.com
 """
 import enum
-import pathlib
+import os
 
 
 class Config(object):
-    PROJ_DIR = pathlib.Path(__file__).parent
+    PROJ_DIR = os.path.dirname(os.path.abspath(__file__))
     APP_NAME = "GoBang"
     APP_VERSION = "v1.0.0"
     # 棋盘和棋子图片 
-    CHESSBOARD_BG = str(pathlib.Path(PROJ_DIR, "assets/img/chessboard.jpg"))
-    CHESS_BLACK = str(pathlib.Path(PROJ_DIR, "assets/img/black.png"))
-    CHESS_WHITE = str(pathlib.Path(PROJ_DIR, "assets/img/white.png"))
+    CHESSBOARD_BG = os.path.join(PROJ_DIR, "assets/img/chessboard.jpg")
+    CHESS_BLACK = os.path.join(PROJ_DIR, "assets/img/black.png")
+    CHESS_WHITE = os.path.join(PROJ_DIR, "assets/img/white.png")
 
     # 背景音效
-    SOUND_DEFEATED = str(pathlib.Path(PROJ_DIR, "assets/sound/defeated.wav"))
-    SOUND_WIN = str(pathlib.Path(PROJ_DIR, "assets/sound/win.wav"))
-    SOUND_MOVE = str(pathlib.Path(PROJ_DIR, "assets/sound/move.wav"))
+    SOUND_DEFEATED = os.path.join(PROJ_DIR, "assets/sound/defeated.wav")
+    SOUND_WIN = os.path.join(PROJ_DIR, "assets/sound/win.wav")
+    SOUND_MOVE = os.path.join(PROJ_DIR, "assets/sound/move.wav")
+
+    # 基准测试的固定局面集
+    BENCH_POSITIONS = os.path.join(PROJ_DIR, "assets/bench/positions.json")
+    # 开局库, 文件不存在时不使用
+    OPENING_BOOK = os.path.join(PROJ_DIR, "assets/book/opening.bin")
 
     # 棋盘
     SIZE = 15
+    # Zobrist哈希的随机种子, 固定后不同进程中同一局面的哈希一致
+    ZOBRIST_SEED = 20230421
+    # 候选走法需要在此距离内有棋子
+    NEIGHBOR_LAYER = 2
+
+    # 置换表: 槽位数量及替换策略(depth: 深度优先, always: 总是替换)
+    TT_SIZE = 1 << 18
+    TT_POLICY = "depth"
+
+    # AI每步的最大搜索深度及时间预算(毫秒)
+    AI_MAX_DEPTH = 8
+    AI_TIME_BUDGET_MS = 3000
+    # 搜索进程数, 大于1时根节点并行搜索
+    SEARCH_WORKERS = 1
+    # 期望窗口的半径: 每轮迭代先在上一轮分数附近搜索, 0表示使用完整窗口
+    ASPIRATION_WINDOW = 300
+    # 走法排序: 是否使用杀手走法及历史启发
+    KILLER_MOVES = True
+    HISTORY_HEURISTIC = True
+    # 是否使用低分配的搜索模式(一维棋盘、整数走法), 结果与默认搜索一致
+    LOW_ALLOC_SEARCH = False
+    # 对手思考时是否在后台预测其应对并继续搜索
+    PONDER = True
+    # 后台思考的时间上限为每步时间预算的倍数, 避免与界面线程长时间争抢GIL
+    PONDER_TIME_FACTOR = 3
+
+    # 是否用蒙特卡洛树搜索(MCTS)代替博弈树搜索
+    USE_MCTS = False
+    # MCTS: 每步最多的模拟次数, 树的节点数上限, UCT探索系数, 每个节点展开的候选走法数, 每次模拟最多的步数
+    MCTS_PLAYOUTS = 20000
+    MCTS_MAX_NODES = 1 << 18
+    MCTS_EXPLORATION = 1.4
+    MCTS_EXPAND_K = 12
+    MCTS_ROLLOUT_LIMIT = 60
+
+    # 算杀: 搜索前先找连续冲四(VCF)/连续冲四活三(VCT)的取胜序列
+    THREAT_SEARCH = True
+    # 进攻方最多的步数, 节点数上限及时间预算(毫秒)
+    VCF_DEPTH = 10
+    VCT_DEPTH = 6
+    THREAT_MAX_NODES = 20000
+    THREAT_TIME_MS = 300
+
+    # 搜索前是否先查开局库
+    USE_OPENING_BOOK = True
+
+    # 评估缓存的最大条目数, 及缓存文件(设置后启动时载入、退出时保存, 在多局之间共享)
+    EVAL_CACHE_SIZE = 1 << 18
+    EVAL_CACHE_FILE = None
+
+    # 批量评估时每块的棋盘数
+    BATCH_EVAL_CHUNK = 4096
+
+    # 神经网络评估(需要torch): 权重文件(不存在时随机初始化, 只能用于测试), 卷积通道数及层数
+    NEURAL_MODEL = os.path.join(PROJ_DIR, "assets/model/value_policy.pt")
+    NEURAL_CHANNELS = 32
+    NEURAL_BLOCKS = 4
+    # 每批推理的局面数, 及价值输出1对应的分数(小于Score.WIN, 网络的判断不当作必胜)
+    NEURAL_BATCH_SIZE = 64
+    NEURAL_VALUE_SCALE = 5000
+
+    # 对局服务: 监听地址及端口, AI搜索进程数, 最多同时进行的对局数
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8765
+    SERVER_WORKERS = 2
+    SERVER_MAX_GAMES = 256
+    # 排队的AI请求数上限及每局排队的请求数上限, 超过时拒绝请求并让客户端稍后重试
+    SERVER_MAX_QUEUE = 64
+    SERVER_MAX_PENDING_PER_GAME = 2
+    # AI请求的默认期限(毫秒), 及留给进程间通信的余量(毫秒), 到期未完成时退回启发式分数最高的走法
+    SERVER_DEADLINE_MS = 2000
+    SERVER_DEADLINE_MARGIN_MS = 50
     
     # UI界面
     UI_CHESS_SIZE = 36
@@ -42,6 +119,8 @@ class Chess(enum.IntEnum):
 # 点对象
 class Point(object):
     """定义点对象"""
+    __slots__ = ("x", "y", "chess")
+
     def __init__(self, x: int, y: int, val: enum.IntEnum=Chess.EMPTY):
         self.x = x
         self.y = y
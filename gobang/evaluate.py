@@ -5,13 +5,15 @@
 author: yooongchun@foxmail.com
 """
 import enum
+import functools
 import typing
 from collections import defaultdict as ddict
 from itertools import combinations as comb
 
-import util
-import chessboard
-from  config import Point, Chess
+from gobang import util
+from gobang import chessboard
+from gobang import pattern_table
+from gobang.config import Point, Chess
 
 
 class Score(object):
@@ -59,6 +61,29 @@ class Score(object):
     c_db_live_three = WIN + 1
     c_db_half_died_three = LEVEL2
 
+    # 搜索中真正分出胜负的分数, 高于所有形态分: 第ply步分出胜负时为±(MATE - ply), 越快取胜分数越高
+    MATE = 1000000
+    # 绝对值不小于MATE_BOUND的分数都是证明的胜负, 算杀找到的必胜步数未知, 按MATE_BOUND计
+    MATE_BOUND = MATE - 1000
+
+
+def is_mate(score: typing.Optional[float]):
+    """分数是否为搜索证明的胜负, 而不是形态的启发式分数"""
+    return score is not None and abs(score) >= Score.MATE_BOUND
+
+
+@functools.lru_cache(maxsize=None)
+def get_pattern_table():
+    """窗口编码到形态的查找表, 首次使用时由Score生成, 只做增量评估时不会构建"""
+    return pattern_table.PatternTable(Score)
+
+
+def __getattr__(name: str):
+    """PATTERN_TABLE延迟到首次访问时构建"""
+    if name == "PATTERN_TABLE":
+        return get_pattern_table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class Direction(object):
     """方向定义"""
@@ -126,7 +151,7 @@ class Matcher(object):
     def _rdiag_match_arr(self):
         """逆对角线"""
         stop_k = self.n - self.k + 1
-        for x in range(self.n-self.k-1, self.n): # 左半轴
+        for x in range(self.k-1, self.n): # 左半轴
             for i, j in zip(range(x), range(x, self.k-2, -1)):
                 sub = [self.matrix[i+m][j-m] for m in range(self.k)]
                 if sub != self.arr:
@@ -135,7 +160,7 @@ class Matcher(object):
                 self.indexes[Direction.RDIAG].append(index)
                 if not self.rt_all:
                     return
-        for x in range(stop_k): # 右半轴
+        for x in range(1, stop_k): # 右半轴, 起点(0, n-1)已在左半轴中搜索
             for i, j in zip(range(x, stop_k), range(self.n-1, self.k-2, -1)):
                 sub = [self.matrix[i+m][j-m] for m in range(self.k)]
                 if sub != self.arr:
@@ -167,6 +192,150 @@ class Matcher(object):
         return self.indexes
 
 
+class BatchMatcher(object):
+    """批量搜索: 一次性把矩阵四个方向的线编码为整数数组,
+    再用滑动窗口编码和查找表在一次遍历中搜索多个数组, 结果与Matcher一致
+    """
+    # 编码的进制, 0-2为棋子状态, 3为斜线不足部分的填充
+    BASE = 4
+    PAD = 3
+
+    def __init__(self, matrix, arrs: typing.Optional[list]=None) -> None:
+        """初始化
+        Args:
+            matrix: 方阵
+            arrs: 需要预先搜索的数组
+        """
+        import numpy as np
+
+        self.n = n = len(matrix)
+        board = np.asarray(matrix, dtype=np.int64).reshape(n, n)
+        rows, cols = np.indices((n, n))
+        # 斜线按行号递增排列, 行的顺序与Matcher的搜索顺序一致
+        diag = np.full((2 * n - 1, n), self.PAD, dtype=np.int64)
+        diag[(n - 1) - (cols - rows), rows] = board
+        rdiag = np.full((2 * n - 1, n), self.PAD, dtype=np.int64)
+        rdiag[rows + cols, rows] = board
+        self._lines = {
+            Direction.HORI: board,
+            Direction.VERT: board.T,
+            Direction.DIAG: diag,
+            Direction.RDIAG: rdiag,
+        }
+        # 窗口长度 -> {方向: 窗口编码}
+        self._codes = {}
+        # 数组 -> {方向: [坐标序列]}
+        self._found = {}
+        if arrs:
+            self.search(arrs)
+
+    def _window_codes(self, k: int):
+        """计算长度为k的所有窗口的编码"""
+        import numpy as np
+
+        if k not in self._codes:
+            codes = {}
+            for dire, lines in self._lines.items():
+                width = lines.shape[1] - k + 1
+                code = np.zeros((lines.shape[0], max(width, 0)), dtype=np.int64)
+                for m in range(k if width > 0 else 0):
+                    code = code * self.BASE + lines[:, m:m+width]
+                codes[dire] = code
+            self._codes[k] = codes
+        return self._codes[k]
+
+    def _index(self, dire: int, row: int, col: int, k: int):
+        """窗口在原矩阵中的坐标序列"""
+        if dire == Direction.HORI:
+            return tuple((row, col+m) for m in range(k))
+        if dire == Direction.VERT:
+            return tuple((col+m, row) for m in range(k))
+        if dire == Direction.DIAG:
+            offset = (self.n - 1) - row
+            return tuple((col+m, col+m+offset) for m in range(k))
+        return tuple((col+m, row-col-m) for m in range(k))
+
+    def search(self, arrs: list):
+        """在一次遍历中搜索多个数组, 结果缓存后由match_arr读取"""
+        import numpy as np
+
+        by_len = ddict(list)
+        for arr in arrs:
+            key = tuple(arr)
+            if key not in self._found:
+                self._found[key] = ddict(list)
+                by_len[len(key)].append(key)
+        for k, keys in by_len.items():
+            # 查找表: 窗口编码 -> 数组编号
+            table = np.full(self.BASE ** k, -1, dtype=np.int64)
+            for idx, key in enumerate(keys):
+                code = 0
+                for v in key:
+                    code = code * self.BASE + v
+                table[code] = idx
+            for dire, codes in self._window_codes(k).items():
+                ids = table[codes]
+                for row, col in zip(*np.nonzero(ids >= 0)):
+                    found = self._found[keys[ids[row, col]]]
+                    found[dire].append(self._index(dire, int(row), int(col), k))
+
+    def search_table(self, table: pattern_table.PatternTable, x: int, d: int):
+        """用查找表在一次遍历中搜索表中的所有形态, 结果缓存后由match_arr读取
+        Args:
+            table: 形态查找表
+            x: 己方在矩阵中的取值
+            d: 对方在矩阵中的取值
+        """
+        import numpy as np
+
+        arrs = table.arrays(x, d)
+        for arr in arrs:
+            self._found.setdefault(arr, ddict(list))
+        # 矩阵取值 -> 三进制编码, 填充位置不属于任何形态
+        digits = np.zeros(self.PAD + 1, dtype=np.int64)
+        digits[x], digits[d] = 1, 2
+        for dire, lines in self._lines.items():
+            rel = digits[lines]
+            pad = lines == self.PAD if dire in (Direction.DIAG, Direction.RDIAG) else None
+            # 由长度k-1的窗口编码递推长度k的窗口编码
+            code, invalid = None, None
+            for k in range(1, table.lengths[-1] + 1):
+                width = lines.shape[1] - k + 1
+                if width <= 0:
+                    break
+                if code is None:
+                    code = rel[:, :width]
+                    invalid = pad[:, :width] if pad is not None else None
+                else:
+                    code = code[:, :width] * 3 + rel[:, k-1:k-1+width]
+                    if pad is not None:
+                        invalid = invalid[:, :width] | pad[:, k-1:k-1+width]
+                if k not in table.ids_np:
+                    continue
+                ids = table.ids_np[k][code]
+                if invalid is not None:
+                    ids[invalid] = -1
+                for row, col in zip(*np.nonzero(ids >= 0)):
+                    arr = arrs[ids[row, col]]
+                    self._found[arr][dire].append(self._index(dire, int(row), int(col), k))
+
+    def match_arr(self, arr: list, match_all=False):
+        """搜索数组arr, 返回值与Matcher.match_arr相同"""
+        key = tuple(arr)
+        if key not in self._found:
+            self.search([key])
+        found = self._found[key]
+        if not match_all:
+            for dire in (Direction.HORI, Direction.VERT, Direction.DIAG, Direction.RDIAG):
+                if found[dire]:
+                    return found[dire][0]
+            return False
+        indexes = ddict(list, {dire: list(found[dire]) for dire in found if found[dire]})
+        if not len(indexes):
+            return False
+        return indexes
+
+
 class MaxEvaluation(object):
     """棋盘评估类, 只对一个类型打分"""
     def __init__(self, board: chessboard.ChessBoard, target: enum.IntEnum,
@@ -190,25 +359,27 @@ class MaxEvaluation(object):
         self.o = Chess.EMPTY.value
         # 添加边框
         self._add_border()
+        # 批量搜索器, 首次搜索时构建
+        self._matcher = None
 
     @property
     def position_score(self):
         """位置分,越靠近中心越高"""
         if self._point is None:
             return 0
-        size = self._chessboard.size
+        size = len(self._board)
         x = self._point.x
         y = self._point.y
         return min([x, y, size-x, size-y])
 
     def _add_border(self):
-        """添加边框"""
+        """添加边框, 带边框的棋盘只用于查找, 保存为二维数组, 不构建ChessBoard"""
         size = self._chessboard.size + 2
         new_board = [[self.d for _ in range(size)] for _ in range(size)]
         board = self._chessboard.get_board()
         for i in range(1, size-1):
             new_board[i][1:-1] = board[i-1]
-        self._chessboard = chessboard.ChessBoard(new_board, size)
+        self._board = new_board
         if self._point:
             self._point = Point(self._point.x+1, self._point.y+1, self._point.chess)
 
@@ -219,6 +390,8 @@ class MaxEvaluation(object):
         # 按照分数对case进行排序，便于查找的时候从高到低查找
         cases = filter(lambda x: x[0] in 'oxd', dir(Score))
         cases = sorted(cases, key=lambda x: getattr(Score, x), reverse=True)
+        # 通过查找表一次搜索所有case及其逆序
+        self._get_matcher().search_table(get_pattern_table(), self.x, self.d)
         for case in cases:
             score = getattr(Score, case)
             # Only these cases need consider double case
@@ -241,19 +414,26 @@ class MaxEvaluation(object):
     def search_case(self, case: str, match_all=False):
         """搜索case"""
         # 通过字符串构建查找序列
-        roi_board = self._chessboard.get_board(self._point, self._roi)
+        matcher = self._get_matcher()
         arr = [getattr(self, s) for s in case]
-        matcher = Matcher(roi_board, arr, match_all)
-        matched = matcher.match_arr()
+        matched = matcher.match_arr(arr, match_all)
         if matched:
             return matched
         # 序列不对称，则需要额外查找逆序
         arr2 = list(reversed(arr))
         if arr != arr2:
-            matcher = Matcher(roi_board, arr2, match_all)
-            return matcher.match_arr()
+            return matcher.match_arr(arr2, match_all)
         return None
 
+    def _get_matcher(self):
+        """roi区域的批量搜索器"""
+        if self._matcher is None:
+            roi_board = self._board
+            if self._point is not None and self._roi:
+                roi_board = chessboard.crop_roi(self._board, self._point, self._roi)
+            self._matcher = BatchMatcher(roi_board)
+        return self._matcher
+
     def _is_multi_case(self, cases):
         """交叉情况判断"""
         for dire1, dire2 in comb(cases.keys(), 2):
@@ -305,6 +485,180 @@ class Evaluation(object):
         util.show(roi)
 
 
+@functools.lru_cache(maxsize=None)
+def line_layout(n: int):
+    """加边框后大小为n的棋盘上的所有线, 首次使用时构建
+    Returns:
+        (line_cells, cell_lines): 线的键(方向, 编号) -> 线上的点(按行号递增排列), 点 -> [(线的键, 在线上的位置)]
+    """
+    line_cells = {}
+    for k in range(n):
+        line_cells[(Direction.HORI, k)] = [(k, j) for j in range(n)]
+        line_cells[(Direction.VERT, k)] = [(i, k) for i in range(n)]
+    for k in range(-n + 1, n):
+        line_cells[(Direction.DIAG, k)] = [(i, i + k) for i in range(n) if 0 <= i + k < n]
+    for k in range(2 * n - 1):
+        line_cells[(Direction.RDIAG, k)] = [(i, k - i) for i in range(n) if 0 <= k - i < n]
+    cell_lines = ddict(list)
+    for key, cells in line_cells.items():
+        for pos, cell in enumerate(cells):
+            cell_lines[cell].append((key, pos))
+    return line_cells, dict(cell_lines)
+
+
+class IncrementalEvaluation(object):
+    """增量评估: 维护双方在每条线上匹配到的形态, 落子/悔棋时只更新经过该点的四条线
+    评分结果与全局评估Evaluation(board, target).get_score()一致
+    """
+
+    def __init__(self, board: chessboard.ChessBoard):
+        """初始化并注册到棋盘, 之后棋盘的set/unset/reset会自动同步
+        Args:
+            board: 棋盘
+        """
+        self._chessboard = board
+        # 加边框后的大小, 边框对双方都视为对手棋子
+        self._n = board.size + 2
+        # 按照分数从高到低排序的case, 与MaxEvaluation.get_score顺序保持一致
+        cases = filter(lambda x: x[0] in 'oxd', dir(Score))
+        cases = sorted(cases, key=lambda x: getattr(Score, x), reverse=True)
+        self._cases = [(case, getattr(Score, case)) for case in cases]
+        # 待搜索的序列: (case, 是否逆序, 序列字符串)
+        self._patterns = []
+        for case, _ in self._cases:
+            self._patterns.append((case, False, case))
+            if case != case[::-1]:
+                self._patterns.append((case, True, case[::-1]))
+        self._build_lines()
+        self._sync()
+        board.add_listener(self)
+
+    def close(self):
+        """从棋盘注销, 不再跟随棋盘更新"""
+        self._chessboard.remove_listener(self)
+
+    def _build_lines(self):
+        """所有线及每个点所在的线, 只与棋盘大小有关, 多个评估对象共享"""
+        self._line_cells, self._cell_lines = line_layout(self._n)
+
+    def _sync(self):
+        """根据棋盘当前状态重建所有线及其匹配结果"""
+        n = self._n
+        board = self._chessboard.get_board()
+        self._lines = {}
+        self._matches = {}
+        self._where = {}
+        for color in (Chess.BLACK, Chess.WHITE):
+            self._lines[color] = {}
+            self._matches[color] = {}
+            # (case, 是否逆序) -> 匹配到该形态的线
+            self._where[color] = ddict(set)
+            for key, cells in self._line_cells.items():
+                values = [board[i-1][j-1] if 0 < i < n-1 and 0 < j < n-1 else None for i, j in cells]
+                self._lines[color][key] = ''.join(self._trans(color, v) for v in values)
+                self._update_line(color, key)
+
+    @staticmethod
+    def _trans(color: enum.IntEnum, value: typing.Optional[int]):
+        """转换为case中的表示符号, 边框(None)和对手都为d"""
+        if value == Chess.EMPTY:
+            return 'o'
+        if value == color:
+            return 'x'
+        return 'd'
+
+    def _scan(self, line: str):
+        """搜索一条线上的所有形态"""
+        matches = []
+        # 所有形态都包含自己的棋子
+        if 'x' not in line:
+            return matches
+        for case, rev, arr in self._patterns:
+            start = line.find(arr)
+            while start >= 0:
+                matches.append((case, rev, start))
+                start = line.find(arr, start + 1)
+        return matches
+
+    def _update_line(self, color: enum.IntEnum, key: tuple):
+        """重新匹配一条线并更新索引"""
+        where = self._where[color]
+        for case, rev, _ in self._matches[color].get(key, ()):
+            where[(case, rev)].discard(key)
+        matches = self._scan(self._lines[color][key])
+        for case, rev, _ in matches:
+            where[(case, rev)].add(key)
+        self._matches[color][key] = matches
+
+    def _set_cell(self, x: int, y: int, value: int):
+        """更新一个点, 只重新匹配经过该点的四条线"""
+        for key, pos in self._cell_lines[(x+1, y+1)]:
+            for color in (Chess.BLACK, Chess.WHITE):
+                line = self._lines[color][key]
+                self._lines[color][key] = line[:pos] + self._trans(color, value) + line[pos+1:]
+                self._update_line(color, key)
+
+    def on_set(self, pt: Point):
+        """棋盘落子"""
+        self._set_cell(pt.x, pt.y, pt.chess)
+
+    def on_unset(self, pt: Point):
+        """棋盘悔棋"""
+        self._set_cell(pt.x, pt.y, Chess.EMPTY)
+
+    def on_reset(self):
+        """棋盘重置"""
+        self._sync()
+
+    def _is_multi_case(self, color: enum.IntEnum, case: str, rev: bool):
+        """交叉情况判断: 不同方向上的两个匹配存在公共点"""
+        cells = ddict(list)
+        for key in self._where[color][(case, rev)]:
+            line_cells = self._line_cells[key]
+            for c, r, start in self._matches[color][key]:
+                if c == case and r == rev:
+                    cells[key[0]].append(set(line_cells[start:start+len(case)]))
+        for dire1, dire2 in comb(cells.keys(), 2):
+            for arr1 in cells[dire1]:
+                for arr2 in cells[dire2]:
+                    if arr1 & arr2:
+                        return True
+        return False
+
+    def get_max_score(self, target: enum.IntEnum):
+        """对一方打分, 等价于MaxEvaluation(board, target).get_score()"""
+        where = self._where[target]
+        for case, score in self._cases:
+            # 与search_case一致: 正序没有匹配时才使用逆序的结果
+            rev = not where[(case, False)]
+            if not where[(case, rev)]:
+                continue
+            match_all = score in [Score.LEVEL1, Score.LEVEL2, Score.LEVEL3]
+            if not match_all:
+                return score
+            if self._is_multi_case(target, case, rev):
+                if score == Score.LEVEL1:
+                    return Score.c_db_half_died_four
+                if score == Score.LEVEL2:
+                    return Score.c_db_live_three
+                return Score.c_db_half_died_three
+            return score
+        return 0
+
+    def get_score(self, target: enum.IntEnum, min_max=False):
+        """计算得分, 等价于Evaluation(board, target).get_score()"""
+        army = Chess.BLACK if target == Chess.WHITE else Chess.WHITE
+        max_score = self.get_max_score(target)
+        min_score = self.get_max_score(army)
+        if not min_max:
+            return max_score - min_score
+        return max_score, min_score
+
+    def check_win(self, target: enum.IntEnum):
+        """是否已经获胜"""
+        return bool(self._where[target][('xxxxx', False)])
+
+
 if __name__ == "__main__":
     raw_input = [
         [0, 0, 0, 0, 0, 0],
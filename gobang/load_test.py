@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+对局服务的压力测试: 多个并发客户端各自不停地下棋, 统计AI每步的延迟分位数及吞吐量
+author: yooongchun@foxmail.com
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+
+from gobang import chessboard
+from gobang import server
+from gobang.config import Chess, Config, Point
+
+
+class Client(object):
+    """一个客户端连接, 同一时间只有一个请求, 回复按顺序返回"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._ids = 0
+        # 被拒绝后重试的次数
+        self.retries = 0
+
+    async def call(self, request: dict):
+        """发送请求, 服务繁忙时按retry_after_ms等待后重试"""
+        while True:
+            self._ids += 1
+            self._writer.write(json.dumps(dict(request, id=self._ids)).encode() + b"\n")
+            await self._writer.drain()
+            reply = json.loads(await self._reader.readline())
+            if reply["ok"]:
+                return reply
+            if reply["error"] != "busy":
+                raise ValueError(f"{request} -> {reply}")
+            self.retries += 1
+            await asyncio.sleep(reply["retry_after_ms"] / 1000)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def play(host: str, port: int, index: int, until: float, size: int, depth: int,
+                deadline_ms: float, seed: int, moves: list):
+    """一个客户端: 在until之前一局接一局地下棋, 人类一方在启发式最好的3个走法中随机选择
+    Args:
+        index: 客户端序号, 奇数序号的客户端让AI先手
+        until: 结束时间点(time.perf_counter())
+        moves: 每次AI走法的记录, 元素为(延迟(毫秒), 完成的深度, 是否退回启发式走法)
+    Returns:
+        (完成的对局数, 重试次数)
+    """
+    rand = random.Random(seed * 1000 + index)
+    client = Client(*await asyncio.open_connection(host, port))
+    games = 0
+    try:
+        while time.perf_counter() < until:
+            reply = await client.call({"op": "new", "size": size, "depth": depth, "deadline_ms": deadline_ms,
+                                        "ai_first": index % 2 == 1})
+            game, ai = reply["game"], Chess[reply["ai"]]
+            human = Chess.WHITE if ai == Chess.BLACK else Chess.BLACK
+            board = chessboard.ChessBoard(size=size)
+            if reply["move"]:
+                board.set(Point(*reply["move"], ai))
+            while time.perf_counter() < until and board.winner is None and board.has_empty():
+                x, y = rand.choice(board.get_candidates(human, 3))
+                start = time.perf_counter()
+                reply = await client.call({"op": "move", "game": game, "x": x, "y": y})
+                board.set(Point(x, y, human))
+                if reply["move"] is None:
+                    break
+                moves.append(((time.perf_counter() - start) * 1000, reply["depth"], reply["fallback"]))
+                board.set(Point(*reply["move"], ai))
+            await client.call({"op": "close", "game": game})
+            games += 1
+    finally:
+        await client.close()
+    return games, client.retries
+
+
+async def run(args):
+    """启动服务(或连接已有的服务)并运行所有客户端, 返回报告"""
+    game_server = None
+    host, port = args.host, args.port
+    if not args.connect:
+        game_server = server.GameServer(args.workers, max_queue=args.max_queue, max_depth=args.depth,
+                                        deadline_ms=args.deadline, low_alloc=args.low_alloc)
+        listener = await game_server.start(host, 0)
+        port = listener.sockets[0].getsockname()[1]
+    moves = []
+    try:
+        start = time.perf_counter()
+        until = start + args.duration
+        results = await asyncio.gather(*(play(host, port, k, until, args.size, args.depth, args.deadline,
+                                                args.seed, moves) for k in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        if game_server is not None:
+            server_stats = game_server.stats()
+        else:
+            client = server_stats = None
+            try:
+                client = Client(*await asyncio.open_connection(host, port))
+                server_stats = await client.call({"op": "stats"})
+            finally:
+                if client is not None:
+                    await client.close()
+    finally:
+        if game_server is not None:
+            await game_server.close()
+    latencies = [m[0] for m in moves]
+    return {
+        "version": Config.APP_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "summary": {
+            "clients": args.clients,
+            "time": elapsed,
+            "games": sum(r[0] for r in results),
+            "moves": len(moves),
+            "throughput": len(moves) / elapsed if elapsed else 0.0,
+            "latency_ms": {"p50": server.percentile(latencies, 50), "p99": server.percentile(latencies, 99),
+                            "max": max(latencies) if latencies else None},
+            "mean_depth": sum(m[1] for m in moves) / len(moves) if moves else None,
+            "fallbacks": sum(1 for m in moves if m[2]),
+            "retries": sum(r[1] for r in results),
+        },
+        "server": server_stats,
+    }
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Load generator for the game server")
+    parser.add_argument("-c", "--clients", type=int, default=8, help="concurrent clients, one game at a time each")
+    parser.add_argument("--duration", type=float, default=30, help="test duration(s)")
+    parser.add_argument("-s", "--size", type=int, default=Config.SIZE, help="board size")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="AI search depth")
+    parser.add_argument("--deadline", type=float, default=Config.SERVER_DEADLINE_MS, help="deadline per move(ms)")
+    parser.add_argument("-w", "--workers", type=int, default=Config.SERVER_WORKERS,
+                        help="search processes of the in-process server")
+    parser.add_argument("--max-queue", type=int, default=Config.SERVER_MAX_QUEUE,
+                        help="max queued requests of the in-process server")
+    parser.add_argument("--low-alloc", action="store_true", default=Config.LOW_ALLOC_SEARCH,
+                        help="use the low-allocation searcher in the in-process server")
+    parser.add_argument("--connect", action="store_true", default=False,
+                        help="connect to a running server instead of starting one")
+    parser.add_argument("--host", default=Config.SERVER_HOST, help="server address")
+    parser.add_argument("-p", "--port", type=int, default=Config.SERVER_PORT, help="server port with --connect")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the human moves")
+    parser.add_argument("-o", "--output", default=None, help="write JSON report to this file")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    report = asyncio.run(run(args))
+    summary = report["summary"]
+    latency = summary["latency_ms"]
+    print(f"clients={summary['clients']} games={summary['games']} moves={summary['moves']} "
+          f"time={summary['time']:.2f}s throughput={summary['throughput']:.2f} moves/s")
+    if summary["moves"]:
+        print(f"latency p50={latency['p50']:.1f}ms p99={latency['p99']:.1f}ms max={latency['max']:.1f}ms "
+              f"mean_depth={summary['mean_depth']:.2f} fallbacks={summary['fallbacks']} "
+              f"retries={summary['retries']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
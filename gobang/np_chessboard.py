@@ -0,0 +1,102 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+基于NumPy的棋盘实现
+author: yooongchun@foxmail.com
+"""
+import random
+from typing import Optional
+
+import numpy as np
+
+from gobang import chessboard
+from gobang.config import Chess, Point
+from gobang.evaluate import Direction
+
+# 斜线视图中不属于棋盘的填充值
+WALL = 3
+
+
+class NumpyChessBoard(chessboard.ChessBoard):
+    """以uint8数组存储的棋盘, 同时维护按方向排列的视图:
+    每个视图的一行即为该方向上的一条线, 斜线长度不足的部分用WALL填充,
+    落子和悔棋只需写入固定的几个位置, 按方向取线无需拷贝.
+    初始化时传入的uint8数组不会被拷贝
+    """
+
+    def _load(self, board):
+        """载入棋盘并重建方向视图"""
+        if board is None:
+            board = np.zeros((self.size, self.size), dtype=np.uint8)
+        else:
+            board = np.asarray(board, dtype=np.uint8)
+        super()._load(board)
+        n = self.size
+        rows, cols = np.indices((n, n))
+        # 主对角线方向: 第k行为列号-行号=k-(n-1)的斜线, 按行号递增排列
+        self._diag = np.full((2 * n - 1, n), WALL, dtype=np.uint8)
+        self._diag[cols - rows + n - 1, rows] = board
+        # 副对角线方向: 第k行为行号+列号=k的斜线, 按行号递增排列
+        self._rdiag = np.full((2 * n - 1, n), WALL, dtype=np.uint8)
+        self._rdiag[rows + cols, rows] = board
+
+    def _put(self, x:int, y:int, value:int):
+        """写入一个点的状态, 同步更新斜线视图"""
+        self._board[x, y] = value
+        self._diag[y - x + self.size - 1, x] = value
+        self._rdiag[x + y, x] = value
+
+    def _crop_roi(self, point:Point, roi:int):
+        """截取ROI区域, 返回原数组的视图"""
+        start_x, end_x, start_y, end_y = self._roi_bounds(point, roi)
+        return self._board[start_y:end_y, start_x:end_x]
+
+    def get(self, pt:Point):
+        """获取指定点坐标的状态"""
+        assert 0 <= pt.x < self.size, "Invalid pt.x"
+        assert 0 <= pt.y < self.size, "Invalid pt.y"
+
+        return int(self._board[pt.x, pt.y])
+
+    def get_empty(self, neighbor_layer:Optional[int]=2, shuffle=True):
+        """空位置, 不需要邻居时直接向量化查找"""
+        if neighbor_layer or len(self._history) == 0:
+            return super().get_empty(neighbor_layer, shuffle)
+        moves = [tuple(ij) for ij in np.argwhere(self._board == Chess.EMPTY).tolist()]
+        if shuffle:
+            random.shuffle(moves)
+        return moves
+
+    def get_lines(self, direction:int):
+        """按方向获取所有线, 返回二维数组视图, 每一行为一条线
+        Args:
+            direction: 方向, 见evaluate.Direction
+        """
+        if direction == Direction.HORI:
+            return self._board
+        if direction == Direction.VERT:
+            return self._board.T
+        if direction == Direction.DIAG:
+            return self._diag
+        if direction == Direction.RDIAG:
+            return self._rdiag
+        raise ValueError(f"Unsupported direction: {direction}")
+
+    @property
+    def nbytes(self):
+        """棋盘及方向视图占用的字节数"""
+        return self._board.nbytes + self._diag.nbytes + self._rdiag.nbytes
+
+
+if __name__ == "__main__":
+    import sys
+
+    board = NumpyChessBoard(size=15)
+    board.set((Point(7,7,Chess.BLACK)))
+    board.set((Point(6,8,Chess.WHITE)))
+    board.set((Point(5,9,Chess.BLACK)))
+    board.show()
+    print("rdiag line:", board.get_lines(Direction.RDIAG)[14])
+    lists = chessboard.ChessBoard(size=15).get_board()
+    list_bytes = sys.getsizeof(lists) + sum(sys.getsizeof(row) for row in lists)
+    print(f"list board: {list_bytes} bytes, numpy board: {board.nbytes} bytes")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+形态查找表: 线上的窗口按三进制(空/己方/对方)编码为整数, 直接查得对应的形态及分数
+author: yooongchun@foxmail.com
+"""
+import sys
+import time
+from array import array
+
+# 编码符号, 与Score中case的表示一致
+DIGITS = {'o': 0, 'x': 1, 'd': 2}
+
+
+def encode(case: str):
+    """把case字符串编码为整数"""
+    code = 0
+    for s in case:
+        code = code * 3 + DIGITS[s]
+    return code
+
+
+class PatternTable(object):
+    """由评分类生成的查找表: 窗口编码 -> 形态编号, 新增形态后自动生效"""
+
+    def __init__(self, score_cls: type):
+        """初始化
+        Args:
+            score_cls: 评分类, 以o/x/d开头的属性为形态, 见evaluate.Score
+        """
+        start = time.perf_counter()
+        # 按照分数从高到低排序, 与MaxEvaluation.get_score的顺序一致
+        cases = filter(lambda x: x[0] in 'oxd', dir(score_cls))
+        self.cases = sorted(cases, key=lambda x: getattr(score_cls, x), reverse=True)
+        self.lengths = sorted(set(len(case) for case in self.cases))
+        # 形态编号 -> (case, 是否逆序, 分数)
+        self.patterns = []
+        # 窗口长度 -> 编码到形态编号的表, -1表示不是任何形态
+        self.ids = {k: array('h', [-1]) * 3 ** k for k in self.lengths}
+        for case in self.cases:
+            score = getattr(score_cls, case)
+            for rev, arr in ((False, case), (True, case[::-1])):
+                if rev and arr == case:
+                    continue
+                code = encode(arr)
+                if self.ids[len(arr)][code] != -1:
+                    raise ValueError(f"Pattern {arr} conflicts with {self.patterns[self.ids[len(arr)][code]]}")
+                self.ids[len(arr)][code] = len(self.patterns)
+                self.patterns.append((case, rev, score))
+        # (己方取值, 对方取值) -> 按形态编号排列的序列
+        self._arrays = {}
+        # 供numpy批量查找使用, 首次访问时创建
+        self._ids_np = None
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    @property
+    def ids_np(self):
+        """窗口长度 -> numpy查找表, 与self.ids共享内存, 不做批量查找时不导入numpy"""
+        if self._ids_np is None:
+            import numpy as np
+
+            self._ids_np = {k: np.frombuffer(ids, dtype=np.int16) for k, ids in self.ids.items()}
+        return self._ids_np
+
+    @property
+    def nbytes(self):
+        """查找表占用的字节数"""
+        tables = sum(sys.getsizeof(ids) for ids in self.ids.values())
+        patterns = sys.getsizeof(self.patterns) + sum(sys.getsizeof(p) for p in self.patterns)
+        return tables + patterns
+
+    def arrays(self, x: int, d: int):
+        """把所有形态按给定的取值转换为序列, 顺序与形态编号一致"""
+        if (x, d) not in self._arrays:
+            symbols = {'o': 0, 'x': x, 'd': d}
+            self._arrays[(x, d)] = [tuple(symbols[s] for s in (case[::-1] if rev else case))
+                                    for case, rev, _ in self.patterns]
+        return self._arrays[(x, d)]
+
+    def lookup(self, code: int, k: int):
+        """查找长度为k的窗口编码对应的形态, 不是任何形态时返回None"""
+        idx = self.ids[k][code]
+        return self.patterns[idx] if idx >= 0 else None
+
+
+if __name__ == "__main__":
+    from gobang.evaluate import PATTERN_TABLE as TABLE
+
+    print(f"patterns: {len(TABLE.patterns)}, window lengths: {TABLE.lengths}")
+    print(f"build time: {TABLE.build_ms:.2f}ms, memory: {TABLE.nbytes / 1024:.1f}KB")
+    print("oxxxxd ->", TABLE.lookup(encode("oxxxxd"), 6))
+    print("dxxxxo ->", TABLE.lookup(encode("dxxxxo"), 6))
@@ -3,18 +3,20 @@
 """
 UI界面
 """
+import os
 import sys
 
 from PyQt5 import QtCore
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QBrush, QColor, QIcon, QPainter, QPen, QPixmap
+from PyQt5.QtGui import QIcon, QPainter, QPixmap
 from PyQt5.QtMultimedia import QSound
 from PyQt5.QtWidgets import QApplication, QLabel, QMessageBox, QWidget
 
-from strategy import min_max_tree
-import chessboard
-import evaluate
-from config import Chess, Config, Point
+from gobang.strategy import flat_search, mcts, min_max_tree, parallel, ponder
+from gobang.strategy.eval_cache import EvalCache
+from gobang import chessboard
+from gobang.render import BoardRenderer
+from gobang.config import Chess, Config, Point
 
 
 class AI(QtCore.QThread):
@@ -22,18 +24,42 @@ class AI(QtCore.QThread):
 
     finishSignal = QtCore.pyqtSignal(Point)
 
-    def __init__(self, chessboard: chessboard.ChessBoard, role: Chess, parent=None):
+    def __init__(self, chessboard: chessboard.ChessBoard, role: Chess, eval_cache: EvalCache=None, parent=None,
+                    ponderer: ponder.Ponderer=None, pondered: tuple=None, tree: mcts.MCTSTree=None):
         super(AI, self).__init__(parent)
         self.role = role
         self.chessboard = chessboard
+        self.eval_cache = eval_cache
+        # 后台思考: 共享其置换表, pondered为命中预测时后台思考的(分数, 走法)
+        self.ponderer = ponderer
+        self.pondered = pondered
+        # MCTS的搜索树, 在各步之间保留
+        self.tree = tree
+        self.pv = []
 
     def run(self):
         """独立线程执行"""
-        self.ai = min_max_tree.MinMaxSearcher(self.chessboard, self.role, 8)
-        best_score, best_move = self.ai.search(2)
+        if self.pondered is not None:
+            best_score, best_move = self.pondered
+            print(f"AI ponder hit: ({best_move.x}, {best_move.y}), best score: {best_score}")
+            self.pv = self.ponderer.result.pv
+            self.finishSignal.emit(Point(best_move.x, best_move.y, self.role))
+            return
+        tt = self.ponderer.tt if self.ponderer is not None else None
+        if Config.USE_MCTS:
+            self.ai = mcts.MCTSSearcher(self.chessboard, self.role, tree=self.tree)
+        elif Config.SEARCH_WORKERS > 1:
+            self.ai = parallel.ParallelSearcher(self.chessboard, self.role, Config.SEARCH_WORKERS, roi=8)
+        elif Config.LOW_ALLOC_SEARCH:
+            self.ai = flat_search.FlatSearcher(self.chessboard, self.role, 8, tt=tt, eval_cache=self.eval_cache)
+        else:
+            self.ai = min_max_tree.MinMaxSearcher(self.chessboard, self.role, 8, tt=tt, eval_cache=self.eval_cache)
+        best_score, best_move = self.ai.search(Config.AI_MAX_DEPTH, Config.AI_TIME_BUDGET_MS)
+        self.pv = getattr(self.ai, "pv", [])
         if not best_move:
             raise ValueError("No best move!")
-        print(f"AI searched best move: ({best_move.x}, {best_move.y}), best score: {best_score}")
+        print(f"AI searched best move: ({best_move.x}, {best_move.y}), best score: {best_score}, depth: {self.ai.completed_depth}")
+        print(self.ai.stats)
         self.finishSignal.emit(Point(best_move.x, best_move.y, self.role))
 
 
@@ -48,9 +74,23 @@ class GoBang(QWidget):
         self.MARGIN = 30
 
         self.step = 0  # 步数
-        self.ui_point = Point(0, 0)
         # AI已下棋，主要是为了加锁，当值是False的时候说明AI正在思考
         self.ai_down = True
+        # 评估缓存在各步及各局之间共享
+        self.eval_cache = EvalCache()
+        if Config.EVAL_CACHE_FILE and os.path.exists(Config.EVAL_CACHE_FILE):
+            self.eval_cache.load(Config.EVAL_CACHE_FILE)
+        # 人类思考时AI在后台思考
+        self.ponderer = None
+        # MCTS的搜索树, 对局继续时复用子树
+        self.tree = mcts.MCTSTree() if Config.USE_MCTS else None
+        if Config.PONDER:
+            searcher_cls = flat_search.FlatSearcher if Config.LOW_ALLOC_SEARCH else min_max_tree.MinMaxSearcher
+            options = {"roi": 8, "eval_cache": self.eval_cache}
+            if Config.USE_MCTS:
+                # 后台思考用单独的树, 不移动前台搜索的树
+                searcher_cls, options = mcts.MCTSSearcher, {"tree": mcts.MCTSTree()}
+            self.ponderer = ponder.Ponderer(Chess.WHITE, searcher_cls=searcher_cls, **options)
 
         # 初始化UI
         self.initUI()
@@ -69,18 +109,25 @@ class GoBang(QWidget):
 
         self.black = QPixmap(Config.CHESS_BLACK)
         self.white = QPixmap(Config.CHESS_WHITE)
+        # 棋盘缓存为图片, 棋子按棋盘历史增量绘制
+        self.renderer = BoardRenderer(Config.SIZE, self.GRID_SIZE, self.MARGIN,
+                                        self.palette().color(self.backgroundRole()), self.black, self.white)
 
         self.setMouseTracking(True)
         self.show()
 
-    def paintEvent(self, event):  # 画出指示箭头
+    def paintEvent(self, event):
+        """只重绘需要更新的区域"""
         qp = QPainter()
         qp.begin(self)
-        self.drawBoardGrid(qp)
-        if self.step:
-            self.drawCircle(qp)
+        self.renderer.paint(qp, event.rect())
         qp.end()
 
+    def refresh(self):
+        """把棋盘的变化同步到棋子层, 只重绘变化的区域"""
+        for rect in self.renderer.sync(self.chessboard):
+            self.update(rect)
+
     def mousePressEvent(self, e):
         """人类玩家下棋"""
         if e.button() == Qt.LeftButton: # 按下鼠标左键
@@ -95,11 +142,17 @@ class GoBang(QWidget):
             if not self.chessboard.is_empty(point): # 棋子没有落在空白处
                 print(f"Position {point} not empty!")
                 return
+            # 先停止后台思考再落子, 后台搜索使用的是棋盘的副本
+            pondered = self.ponderer.take(point) if self.ponderer is not None else None
             self.chessboard.set(point)
-            self.draw(point)
+            if self.draw(point):
+                # 对局已结束(已重新开始或关闭窗口), 不再让AI思考
+                return
             print("AI is thinking...")
             self.ai_down = False
-            self.ai = AI(self.chessboard, Chess.WHITE)  # 新建线程对象，传入棋盘参数
+            # 新建线程对象，传入棋盘参数
+            self.ai = AI(self.chessboard, Chess.WHITE, self.eval_cache, ponderer=self.ponderer, pondered=pondered,
+                            tree=self.tree)
             self.ai.finishSignal.connect(self.AI_move)  # 结束线程，传出参数
             self.ai.start()  # run
 
@@ -110,84 +163,22 @@ class GoBang(QWidget):
         self.chessboard.set(point)
         self.ai_down = True
 
-        self.draw(point)
+        if self.draw(point):
+            # 对局已结束, 棋盘已重置或窗口已关闭, 主变例属于上一局, 不再后台思考
+            return
+        if self.ponderer is not None and not self.chessboard.is_over():
+            self.ponderer.start(self.chessboard, self.ai.pv)
 
     def draw(self, point: Point):
-        """绘制落子位置的棋子图"""
-        self.ui_point = self.coord_map2pixel(point)
-        size = Config.UI_CHESS_SIZE
-        x = self.ui_point.x - size // 2
-        y = self.ui_point.y - size // 2
-        w = int(self.GRID_SIZE * 0.5)
-
-        if self.ui_point.chess == Chess.WHITE:
-            color = QColor(10, 10, 10, 80)
-        else:
-            color = QColor(240, 230, 240, 80)
-        qp = QPainter()
-        brush = QBrush(color)
-        qp.setBrush(brush)
-        qp.drawEllipse(x, y, w, w)
-        
+        """绘制落子位置的棋子图, 返回对局是否因这一步结束"""
+        self.refresh()
         self.sound_piece.play()  # 落子音效
         self.step += 1  # 步数+1
-        if evaluate.Evaluation(self.chessboard, point.chess).check_win():  # 判断输赢
+        if self.chessboard.check_win(point.chess):  # 判断输赢
             winner = point.chess
             self.gameover(winner)
-        self.update()
-
-    def drawBoardGrid(self, qp: QPainter):
-        """绘制棋盘"""
-        # 背景颜色
-        brush = QBrush(QColor(238, 185, 89, 80))
-        qp.setBrush(brush)
-        qp.drawRect(0, 0, Config.UI_BG_SIZE + 2 * self.MARGIN, Config.UI_BG_SIZE + 2 * self.MARGIN)
-        
-        def set_pen(width:int, color:QColor=QColor(0, 0, 200, 70)):
-            """切换画笔"""
-            pen = QPen(color, width)
-            qp.setPen(pen)
-        # 网格线
-        cnt = 0
-        w1, w2 = 1, 2
-        set_pen(w1)
-        xy = self.MARGIN
-        while xy <= Config.UI_BG_SIZE + self.MARGIN:
-            cnt += 1
-            x1 = int(xy)
-            y1 = int(self.MARGIN)
-            y2 = int(self.MARGIN + Config.UI_BG_SIZE)            
-            qp.drawLine(x1, y1, x1, y2)  # 竖线
-            qp.drawLine(y1, x1, y2, x1)  # 横线
-            if cnt == Config.SIZE // 2 + 1:
-                # 中心线加粗
-                set_pen(w2)
-                qp.drawLine(x1, y1, x1, y2)  # 竖线
-                qp.drawLine(y1, x1, y2, x1)  # 横线
-                # 恢复画笔
-                set_pen(w1)
-            xy += self.GRID_SIZE
-        # 中心点
-        brush = QBrush(QColor(0, 0, 200, 90))
-        qp.setBrush(brush)
-        xy = self.MARGIN + round(Config.UI_BG_SIZE / 2)
-        x = self.MARGIN + round(self.GRID_SIZE * 3)
-        y = self.MARGIN + round(Config.UI_BG_SIZE - self.GRID_SIZE * 3)
-        w = 5
-        qp.drawRect(xy-w, xy-w, 2*w, 2*w)
-        qp.drawRect(x-w, y-w, 2*w, 2*w)
-        qp.drawRect(y-w, x-w, 2*w, 2*w)
-        qp.drawRect(x-w, x-w, 2*w, 2*w)
-        qp.drawRect(y-w, y-w, 2*w, 2*w)
-
-    def drawCircle(self, qp: QPainter):
-        """指示当前位置的棋子"""
-        pen = QPen(QColor(200, 0, 0, 80), 2)
-        qp.setPen(pen)
-        size = Config.UI_CHESS_SIZE
-        x = self.ui_point.x - size // 2
-        y = self.ui_point.y - size // 2
-        qp.drawRect(x, y, size, size)
+            return True
+        return False
 
     def coord_map2pixel(self, point: Point):
         """从 chessMap 里的逻辑坐标到 UI 上的绘制坐标的转换"""
@@ -206,6 +197,14 @@ class GoBang(QWidget):
         else:
             return Point(x, y, ui_point.chess)
 
+    def closeEvent(self, event):
+        """退出时停止后台思考并保存评估缓存"""
+        if self.ponderer is not None:
+            self.ponderer.stop()
+        if Config.EVAL_CACHE_FILE:
+            self.eval_cache.save(Config.EVAL_CACHE_FILE)
+        super().closeEvent(event)
+
     def gameover(self, winner):
         if winner == Chess.BLACK:
             self.sound_win.play()
@@ -217,9 +216,11 @@ class GoBang(QWidget):
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:  # 复位
+            if self.ponderer is not None:
+                self.ponderer.stop()
             self.step = 0
             self.chessboard.reset()
-            self.update()
+            self.refresh()
         else:
             self.close()
 
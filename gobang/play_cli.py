@@ -4,42 +4,108 @@
 命令行模拟
 author: yooongchun@foxmail.com
 """
+import os
 import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
-import chessboard
-import evaluate
-from strategy import min_max_tree
-from config import Chess, Point
+from gobang import chessboard
+from gobang import record
+from gobang.strategy import flat_search, mcts, min_max_tree, parallel, ponder
+from gobang.strategy.eval_cache import EvalCache
+from gobang.config import Chess, Config, Point
 
 
-def simulate(size: int, max_depth:int=3, ai_first:bool=False):
-    """模拟"""
+def simulate(size: int, max_depth:int=3, ai_first:bool=False, time_budget_ms:Optional[float]=None,
+                workers:int=1, eval_cache_file:Optional[str]=None, record_file:Optional[str]=None,
+                low_alloc:bool=Config.LOW_ALLOC_SEARCH, use_ponder:bool=Config.PONDER, use_neural:bool=False,
+                use_mcts:bool=Config.USE_MCTS):
+    """模拟
+    Args:
+        size: 棋盘大小
+        max_depth: AI最大搜索深度
+        ai_first: AI先手
+        time_budget_ms: AI每步的时间预算(毫秒), 不传则搜索到max_depth
+        workers: AI搜索的进程数, 大于1时并行搜索, 进程池在各步之间复用, 不支持神经网络评估及MCTS
+        eval_cache_file: 评估缓存文件, 存在时先载入, 结束时保存
+        record_file: 棋谱文件, 结束时把本局追加到其中
+        low_alloc: 是否使用低分配的搜索模式
+        use_ponder: 人类输入时AI是否在后台思考
+        use_neural: 是否用神经网络评估局面(需要torch)
+        use_mcts: 是否用蒙特卡洛树搜索, 搜索树在各步之间复用, 此时max_depth不起作用
+    """
+    if workers > 1 and (use_neural or use_mcts):
+        raise ValueError("Parallel search supports neither the neural evaluator nor MCTS")
     board = chessboard.ChessBoard(size=size)
     ai = Chess.BLACK if ai_first else Chess.WHITE
     human = Chess.WHITE if ai_first else Chess.BLACK
     turn = ai_first
+    # 评估缓存在每一步之间共享
+    eval_cache = EvalCache()
+    if eval_cache_file and os.path.exists(eval_cache_file):
+        eval_cache.load(eval_cache_file)
+    searcher_cls = flat_search.FlatSearcher if low_alloc else min_max_tree.MinMaxSearcher
+    options = {"eval_cache": eval_cache}
+    if use_neural:
+        # 用到时才导入, 不使用网络时不加载numpy及torch
+        from gobang.strategy import neural
+
+        # 网络在每一步之间共享, 只载入一次权重
+        searcher_cls = neural.NeuralSearcher
+        options = {"evaluator": neural.NeuralEvaluator()}
+    if use_mcts:
+        searcher_cls = mcts.MCTSSearcher
+        options = {"tree": mcts.MCTSTree()}
+    ponderer = None
+    if use_ponder and workers <= 1:
+        ponder_options = dict(options)
+        if use_mcts:
+            # 后台思考用单独的树, 不移动前台搜索的树
+            ponder_options["tree"] = mcts.MCTSTree()
+        ponderer = ponder.Ponderer(ai, max_depth, time_budget_ms, searcher_cls, **ponder_options)
+    executor = None
+    if workers > 1:
+        # 进程池在各步之间复用, 不必每步重新启动进程
+        executor = ProcessPoolExecutor(max_workers=workers)
+    # 命中预测时后台思考的(分数, 走法)
+    pondered = None
     while True:
-        if evaluate.Evaluation(board, ai).check_win():
+        if board.check_win(ai):
             print("AI win!")
             break
-        if evaluate.Evaluation(board, human).check_win():
+        if board.check_win(human):
             print("You win!")
             break
         if not board.has_empty():
             print("No empty position to go!")
             break
         if turn: # AI play
-            mmt = min_max_tree.MinMaxSearcher(board, Chess.BLACK)
+            if pondered is not None:
+                best_score, best_move = pondered
+                print(f"AI ponder hit, score:{best_score}, move:{best_move}")
+                board.set(best_move)
+                board.show()
+                turn = False
+                ponderer.start(board, ponderer.result.pv)
+                continue
+            tt = ponderer.tt if ponderer is not None else None
+            if executor is not None:
+                mmt = parallel.ParallelSearcher(board, ai, workers, executor=executor, low_alloc=low_alloc, **options)
+            else:
+                mmt = searcher_cls(board, ai, tt=tt, **options)
             print("AI is thinking...")
             start = time.time()
-            best_score, best_move = mmt.search(max_depth)
+            best_score, best_move = mmt.search(max_depth, time_budget_ms)
             end = time.time()
-            print(f"AI score:{best_score}, move:{best_move}, depth:{max_depth}, time:{end-start:0.2f}s")
+            print(f"AI score:{best_score}, move:{best_move}, depth:{mmt.completed_depth}, time:{end-start:0.2f}s")
+            print(mmt.stats)
             if best_move:
                 board.set(best_move)
                 board.show()
                 turn = False
+                if ponderer is not None:
+                    ponderer.start(board, mmt.pv)
             else:
                 print("No best move!")
                 break
@@ -55,9 +121,22 @@ def simulate(size: int, max_depth:int=3, ai_first:bool=False):
             else:
                 raise ValueError("Unsupported value!")
             pt = Point(int(x), int(y), human)
+            # 先停止后台思考再落子
+            pondered = ponderer.take(pt) if ponderer is not None else None
             board.set(pt)
             board.show()
             turn = True
+    if executor is not None:
+        executor.shutdown()
+    if ponderer is not None:
+        ponderer.stop()
+        print(f"Ponder hits: {ponderer.hits}, misses: {ponderer.misses}")
+    print(f"Evaluation cache: {eval_cache.stats()}")
+    if eval_cache_file:
+        eval_cache.save(eval_cache_file)
+    if record_file:
+        with record.RecordWriter(record_file) as writer:
+            print(f"Game {writer.write_board(board)} saved to {record_file}")
 
 
 def parse_args():
@@ -65,15 +144,30 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-s", "--size", type=int, default=5, help="board size")
     parser.add_argument("-d", "--depth", type=int, default=3, help="AI search max depth")
+    parser.add_argument("-t", "--time-budget", type=float, default=None, help="AI time budget per move(ms)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="AI search processes")
+    parser.add_argument("--eval-cache", default=None, help="evaluation cache file shared across games")
+    parser.add_argument("--record", default=None, help="append the game to this record file")
+    parser.add_argument("--low-alloc", action="store_true", default=Config.LOW_ALLOC_SEARCH,
+                        help="use the low-allocation searcher")
+    parser.add_argument("--neural", action="store_true", default=False,
+                        help="evaluate positions with the neural network(requires torch)")
+    parser.add_argument("--mcts", action="store_true", default=Config.USE_MCTS,
+                        help="use Monte Carlo tree search, the depth is ignored")
+    parser.add_argument("--no-ponder", action="store_true", default=not Config.PONDER,
+                        help="do not think on the human's time")
     parser.add_argument("--ai-first", action="store_true", default=False, help="AI first")
     args = parser.parse_args()
+    if args.workers > 1 and (args.neural or args.mcts):
+        parser.error("--workers > 1 supports neither --neural nor --mcts")
     return args
 
 
 def main():
     """主函数入口"""
     args = parse_args()
-    simulate(args.size, args.depth, args.ai_first)
+    simulate(args.size, args.depth, args.ai_first, args.time_budget, args.workers, args.eval_cache, args.record,
+                args.low_alloc, not args.no_ponder, args.neural, args.mcts)
 
 
 if __name__ == "__main__":
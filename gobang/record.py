@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+对局记录: 只追加写入的二进制棋谱文件, 流式读取及复盘, 并用索引文件定位第N局
+文件格式:
+    文件头: 魔数b"GBRC", 版本(u16)
+    每局: 魔数b"GM", 棋盘大小(u8), 胜方(u8, 0表示未分胜负), 步数(u16), 之后每步2字节:
+        第1字节低7位为x、最高位为棋子颜色(0黑1白), 第2字节为y
+索引文件(同名加.idx): 每局在棋谱文件中的偏移(u64), 第N局位于8*N处
+author: yooongchun@foxmail.com
+"""
+import argparse
+import os
+import struct
+from collections import namedtuple
+from typing import Optional
+
+from gobang import chessboard
+from gobang.config import Chess, Point
+
+MAGIC = b"GBRC"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+GAME_MAGIC = b"GM"
+GAME_HEADER = struct.Struct("<2sBBH")
+OFFSET = struct.Struct("<Q")
+
+# 一局对局: 棋盘大小, 胜方(Chess或None), 走法[(x, y, Chess)]
+Game = namedtuple("Game", ["size", "winner", "moves"])
+
+
+def encode_game(game: Game):
+    """把一局编码为字节"""
+    if game.size > 127:
+        raise ValueError(f"Unsupported board size: {game.size}")
+    data = bytearray(GAME_HEADER.pack(GAME_MAGIC, game.size, int(game.winner or 0), len(game.moves)))
+    for x, y, chess in game.moves:
+        data.append(x | (0x80 if chess == Chess.WHITE else 0))
+        data.append(y)
+    return bytes(data)
+
+
+def from_board(board: chessboard.ChessBoard):
+    """由棋盘上的全部棋子生成对局, 载入时已有的棋子排在落子历史之前, 复盘得到同一局面"""
+    return Game(board.size, board.winner, [(pt.x, pt.y, pt.chess) for pt in board.stones])
+
+
+def index_path(path: str):
+    """索引文件的路径"""
+    return path + ".idx"
+
+
+def _write_all(f, data: bytes):
+    """无缓冲的文件可能只写入一部分, 循环写完"""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+
+class RecordWriter(object):
+    """追加写入对局, 每局写完后再追加索引, 写入失败时截回写入前的长度"""
+
+    def __init__(self, path: str):
+        """初始化, 文件不存在时新建
+        Args:
+            path: 棋谱文件
+        """
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists and not os.path.exists(index_path(path)):
+            build_index(path)
+        # 不使用缓冲, 写入失败时文件中只有已写入的部分, 可以截掉
+        self._file = open(path, "ab", buffering=0)
+        self._index = open(index_path(path), "ab", buffering=0)
+        if not exists:
+            _write_all(self._file, FILE_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, game: Game):
+        """追加一局, 返回该局的序号"""
+        data = encode_game(game)
+        offset = self._file.seek(0, os.SEEK_END)
+        position = self._index.seek(0, os.SEEK_END)
+        try:
+            _write_all(self._file, data)
+            # 对局完整写入后才追加索引, 索引不会指向写了一半的数据
+            _write_all(self._index, OFFSET.pack(offset))
+        except BaseException:
+            os.ftruncate(self._file.fileno(), offset)
+            os.ftruncate(self._index.fileno(), position)
+            raise
+        return position // OFFSET.size
+
+    def write_board(self, board: chessboard.ChessBoard):
+        """追加棋盘上的当前对局"""
+        return self.write(from_board(board))
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _read_game(f):
+    """从文件当前位置读取一局, 文件结束时返回None"""
+    header = f.read(GAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < GAME_HEADER.size:
+        raise ValueError("Truncated game header")
+    magic, size, winner, count = GAME_HEADER.unpack(header)
+    if magic != GAME_MAGIC:
+        raise ValueError(f"Invalid game header at {f.tell() - GAME_HEADER.size}")
+    data = f.read(2 * count)
+    if len(data) < 2 * count:
+        raise ValueError("Truncated game moves")
+    moves = [(data[k] & 0x7f, data[k + 1], Chess.WHITE if data[k] & 0x80 else Chess.BLACK)
+                for k in range(0, len(data), 2)]
+    return Game(size, Chess(winner) if winner else None, moves)
+
+
+def _check_header(f, path: str):
+    magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Invalid record file: {path}")
+
+
+def build_index(path: str):
+    """扫描棋谱文件重建索引, 返回对局数"""
+    count = 0
+    with open(path, "rb") as f, open(index_path(path), "wb") as index:
+        _check_header(f, path)
+        while True:
+            offset = f.tell()
+            if _read_game(f) is None:
+                break
+            index.write(OFFSET.pack(offset))
+            count += 1
+    return count
+
+
+class RecordReader(object):
+    """流式读取对局, 不会一次载入整个文件"""
+
+    def __init__(self, path: str):
+        """初始化
+        Args:
+            path: 棋谱文件
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        _check_header(self._file, path)
+        self._index = None
+
+    def __iter__(self):
+        """依次读取每一局"""
+        self._file.seek(FILE_HEADER.size)
+        while True:
+            game = _read_game(self._file)
+            if game is None:
+                break
+            yield game
+
+    def __len__(self):
+        return os.path.getsize(self._index_file()) // OFFSET.size
+
+    def _index_file(self):
+        path = index_path(self.path)
+        if not os.path.exists(path):
+            build_index(self.path)
+        return path
+
+    def game(self, n: int):
+        """通过索引直接读取第n局(从0开始)"""
+        if self._index is None:
+            self._index = open(self._index_file(), "rb")
+        self._index.seek(n * OFFSET.size)
+        data = self._index.read(OFFSET.size)
+        if len(data) < OFFSET.size:
+            raise IndexError(f"Game {n} out of range")
+        self._file.seek(OFFSET.unpack(data)[0])
+        return _read_game(self._file)
+
+    def close(self):
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def replay(game: Game, board: Optional[chessboard.ChessBoard]=None):
+    """复盘: 依次通过ChessBoard.set落子, 每步之后返回(棋盘, 该步)
+    Args:
+        game: 对局
+        board: 棋盘, 不传时新建, 传入时先重置
+    """
+    if board is None:
+        board = chessboard.ChessBoard(size=game.size)
+    else:
+        board.reset()
+    for x, y, chess in game.moves:
+        pt = Point(x, y, chess)
+        board.set(pt)
+        yield board, pt
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Game records")
+    parser.add_argument("path", help="record file")
+    parser.add_argument("-n", "--game", type=int, default=None, help="replay game N")
+    parser.add_argument("--reindex", action="store_true", default=False, help="rebuild the index file")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口: 统计棋谱或复盘其中一局"""
+    args = parse_args()
+    if args.reindex:
+        print(f"{build_index(args.path)} games indexed")
+    with RecordReader(args.path) as reader:
+        if args.game is None:
+            games, moves, wins = 0, 0, {}
+            for game in reader:
+                games += 1
+                moves += len(game.moves)
+                winner = game.winner.name if game.winner else "NONE"
+                wins[winner] = wins.get(winner, 0) + 1
+            print(f"games: {games}, moves: {moves}, winners: {wins}")
+            return
+        game = reader.game(args.game)
+        board = chessboard.ChessBoard(size=game.size)
+        for _ in replay(game, board):
+            pass
+        board.show()
+        print(f"moves: {len(game.moves)}, winner: {game.winner.name if game.winner else None}")
+
+
+if __name__ == "__main__":
+    main()
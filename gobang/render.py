@@ -0,0 +1,157 @@
+#! /usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+棋盘的分层绘制: 静态的棋盘缓存在一个QPixmap中, 棋子画在另一个透明的QPixmap中并按ChessBoard的历史增量更新,
+每次落子只需重绘新棋子及上一步/这一步标记所在的小矩形
+"""
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QBrush, QColor, QPainter, QPen, QPixmap
+
+from gobang import chessboard
+from gobang.config import Chess, Config, Point
+
+
+class BoardRenderer(object):
+    """分层绘制棋盘及棋子, 只在界面线程中使用"""
+
+    # 最后一步标记的线宽, 重绘区域需要向外扩展
+    MARK_WIDTH = 2
+
+    def __init__(self, size: int, grid_size: float, margin: int, background: QColor,
+                    black: QPixmap, white: QPixmap, chess_size: int=Config.UI_CHESS_SIZE):
+        """初始化
+        Args:
+            size: 棋盘大小
+            grid_size: 网格间距(像素)
+            margin: 棋盘边距(像素)
+            background: 窗口背景色, 棋盘层半透明的底色叠加在它上面
+            black: 黑棋图片
+            white: 白棋图片
+            chess_size: 棋子的大小(像素)
+        """
+        self.size = size
+        self.grid_size = grid_size
+        self.margin = margin
+        self.chess_size = chess_size
+        width = int(round(grid_size * (size - 1))) + 2 * margin
+        self.rect = QRect(0, 0, width, width)
+        # 棋子图片预先缩放, 绘制时不再缩放
+        self._stones = {
+            Chess.BLACK: black.scaled(chess_size, chess_size, Qt.KeepAspectRatio, Qt.SmoothTransformation),
+            Chess.WHITE: white.scaled(chess_size, chess_size, Qt.KeepAspectRatio, Qt.SmoothTransformation),
+        }
+        # 静态的棋盘层, 只绘制一次
+        self.board_layer = QPixmap(width, width)
+        self.board_layer.fill(background)
+        qp = QPainter(self.board_layer)
+        self._draw_grid(qp)
+        qp.end()
+        # 棋子层, 与已绘制的历史保持一致
+        self.stone_layer = QPixmap(width, width)
+        self.stone_layer.fill(Qt.transparent)
+        self._drawn = []
+
+    def _draw_grid(self, qp: QPainter):
+        """绘制棋盘: 底色、网格线及星位"""
+        # 背景颜色
+        brush = QBrush(QColor(238, 185, 89, 80))
+        qp.setBrush(brush)
+        qp.drawRect(0, 0, self.rect.width() - 1, self.rect.height() - 1)
+
+        def set_pen(width:int, color:QColor=QColor(0, 0, 200, 70)):
+            """切换画笔"""
+            pen = QPen(color, width)
+            qp.setPen(pen)
+        # 网格线
+        w1, w2 = 1, 2
+        y1 = self.margin
+        y2 = self.margin + int(round(self.grid_size * (self.size - 1)))
+        for k in range(self.size):
+            x1 = int(self.margin + k * self.grid_size)
+            # 中心线加粗
+            set_pen(w2 if k == self.size // 2 else w1)
+            qp.drawLine(x1, y1, x1, y2)  # 竖线
+            qp.drawLine(y1, x1, y2, x1)  # 横线
+        # 中心点及四个星位
+        brush = QBrush(QColor(0, 0, 200, 90))
+        qp.setBrush(brush)
+        set_pen(w1)
+        w = 5
+        center = self.size // 2
+        stars = [(center, center)]
+        if self.size > 8:
+            near, far = 3, self.size - 4
+            stars += [(near, near), (near, far), (far, near), (far, far)]
+        for x, y in stars:
+            cx, cy = self.center(x, y)
+            qp.drawRect(cx - w, cy - w, 2 * w, 2 * w)
+
+    def center(self, x: int, y: int):
+        """棋盘坐标(x行y列)对应的像素中心, 与GoBang.coord_map2pixel一致"""
+        return int(y * self.grid_size + self.margin), int(x * self.grid_size + self.margin)
+
+    def cell_rect(self, pt: Point):
+        """棋子所占的矩形, 也是最后一步标记的位置"""
+        cx, cy = self.center(pt.x, pt.y)
+        half = self.chess_size // 2
+        return QRect(cx - half, cy - half, self.chess_size, self.chess_size)
+
+    def dirty_rect(self, pt: Point):
+        """棋子变化时需要重绘的矩形, 包括标记的线宽"""
+        return self.cell_rect(pt).adjusted(-self.MARK_WIDTH, -self.MARK_WIDTH, self.MARK_WIDTH, self.MARK_WIDTH)
+
+    def sync(self, board: chessboard.ChessBoard):
+        """按棋盘的历史增量更新棋子层: 只绘制新增的棋子, 只擦除悔棋的棋子, 历史不一致时重画
+        Returns:
+            需要重绘的矩形列表, 包括变化的棋子及新旧最后一步的标记
+        """
+        history = board.stones
+        common = 0
+        limit = min(len(history), len(self._drawn))
+        while common < limit and self._same(history[common], self._drawn[common]):
+            common += 1
+        if common == len(self._drawn) == len(history):
+            return []
+        if common < len(self._drawn) and common < len(history):
+            # 分叉(如换了一局): 清空后重画全部棋子
+            self.stone_layer.fill(Qt.transparent)
+            self._drawn = []
+            common = 0
+            dirty = [self.rect]
+        else:
+            dirty = [self.dirty_rect(self._drawn[-1])] if self._drawn else []
+        qp = QPainter(self.stone_layer)
+        if common < len(self._drawn):
+            # 悔棋: 只擦除撤销的棋子
+            qp.setCompositionMode(QPainter.CompositionMode_Clear)
+            for pt in self._drawn[common:]:
+                qp.fillRect(self.cell_rect(pt), Qt.transparent)
+                dirty.append(self.dirty_rect(pt))
+            qp.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            del self._drawn[common:]
+        for pt in history[common:]:
+            qp.drawPixmap(self.cell_rect(pt).topLeft(), self._stones[pt.chess])
+            self._drawn.append(Point(pt.x, pt.y, pt.chess))
+            dirty.append(self.dirty_rect(pt))
+        qp.end()
+        return dirty
+
+    @staticmethod
+    def _same(a: Point, b: Point):
+        """两个落子是否相同"""
+        return a.x == b.x and a.y == b.y and a.chess == b.chess
+
+    def paint(self, qp: QPainter, rect: QRect):
+        """只绘制rect内的部分: 棋盘层、棋子层及最后一步的标记"""
+        rect = rect.intersected(self.rect)
+        if rect.isEmpty():
+            return
+        qp.drawPixmap(rect, self.board_layer, rect)
+        qp.drawPixmap(rect, self.stone_layer, rect)
+        if self._drawn:
+            last = self._drawn[-1]
+            mark = self.cell_rect(last)
+            if self.dirty_rect(last).intersects(rect):
+                qp.setPen(QPen(QColor(200, 0, 0, 80), self.MARK_WIDTH))
+                qp.setBrush(Qt.NoBrush)
+                qp.drawRect(mark)
@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+无界面的对局服务: 在本机用asyncio同时管理多局人机对弈, AI走法交给共享的进程池搜索
+协议: 每行一个JSON请求, 每个请求返回一行JSON, 带有请求中的id, 同一连接上的请求可以并发, 返回顺序不保证
+    {"op": "new", "size": 15, "ai_first": false, "depth": 3, "deadline_ms": 2000}  新建对局
+    {"op": "move", "game": 1, "x": 7, "y": 7}  人类落子, 返回AI的应对
+    {"op": "hint", "game": 1}  为人类一方搜索建议的走法, 不落子
+    {"op": "close", "game": 1}  结束对局
+    {"op": "stats"}  服务的统计信息
+author: yooongchun@foxmail.com
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import math
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+from gobang import chessboard
+from gobang.config import Chess, Config, Point
+from gobang.strategy import flat_search, min_max_tree
+from gobang.strategy.eval_cache import EvalCache
+
+# 工作进程中在多次请求之间共享的评估缓存, 以局面哈希为键, 不同对局之间也可共享
+_worker_cache = None
+
+
+def _warm_worker():
+    """子进程: 预先启动进程并导入模块, 避免第一批请求的延迟偏高"""
+    return True
+
+
+def _search_worker(stones: list, size: int, target: int, max_depth: int, time_budget_ms: float, options: dict):
+    """子进程: 按落子顺序重放stones([(x, y, chess)])复原棋盘后搜索target一方的走法,
+    返回(分数, (x, y)或None, 完成的深度, 节点数)"""
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = EvalCache()
+    options = dict(options)
+    low_alloc = options.pop("low_alloc", Config.LOW_ALLOC_SEARCH)
+    searcher_cls = flat_search.FlatSearcher if low_alloc else min_max_tree.MinMaxSearcher
+    board = chessboard.replay([Point(x, y, Chess(chess)) for x, y, chess in stones], size)
+    searcher = searcher_cls(board, Chess(target), eval_cache=_worker_cache, **options)
+    score, move = searcher.search(max_depth, time_budget_ms)
+    return score, (move.x, move.y) if move else None, searcher.completed_depth, searcher.stats.total_nodes
+
+
+def percentile(values: list, q: float):
+    """按最近秩法取第q百分位数, 空列表返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class ServerBusy(Exception):
+    """排队的请求过多, 客户端应在retry_after_ms毫秒后重试"""
+
+    def __init__(self, message: str, retry_after_ms: float):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+# 一次AI搜索请求: 对局id, 按落子顺序的棋子快照, 棋盘大小, 搜索的一方, 最大深度, 期限(loop.time()), 入队时间, 结果
+SearchRequest = namedtuple("SearchRequest",
+                            ["game", "stones", "size", "target", "max_depth", "deadline", "enqueued", "future"])
+
+
+class FairQueue(object):
+    """按对局轮转的请求队列: 每局一个先进先出队列, 出队时依次轮到各局, 一局的大量请求不会让其他对局一直等待"""
+
+    def __init__(self):
+        # 对局id -> 请求队列, 按轮到的顺序排列
+        self._queues = OrderedDict()
+        self._size = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return self._size
+
+    def pending(self, game: int):
+        """某局排队的请求数"""
+        queue = self._queues.get(game)
+        return len(queue) if queue else 0
+
+    def put(self, game: int, item):
+        """请求入队, 新的对局排在最后"""
+        self._queues.setdefault(game, deque()).append(item)
+        self._size += 1
+        self._ready.set()
+
+    async def get(self):
+        """取出轮到的对局的第一个请求, 该局还有请求时排到最后, 队列为空时等待"""
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+        game, queue = self._queues.popitem(last=False)
+        item = queue.popleft()
+        if queue:
+            self._queues[game] = queue
+        self._size -= 1
+        return item
+
+    def drop(self, game: int):
+        """移除某局所有排队的请求并返回"""
+        queue = self._queues.pop(game, None) or ()
+        self._size -= len(queue)
+        return list(queue)
+
+
+class GameSession(object):
+    """一局人机对弈"""
+
+    def __init__(self, game: int, size: int, ai: Chess, max_depth: int, deadline_ms: float):
+        self.game = game
+        self.board = chessboard.ChessBoard(size=size)
+        self.ai = ai
+        self.human = Chess.WHITE if ai == Chess.BLACK else Chess.BLACK
+        self.max_depth = max_depth
+        self.deadline_ms = deadline_ms
+        # AI正在思考时人类不能落子
+        self.thinking = False
+
+    @property
+    def winner(self):
+        """胜方, 平局返回EMPTY, 未结束返回None"""
+        if self.board.winner is not None:
+            return self.board.winner
+        if not self.board.has_empty():
+            return Chess.EMPTY
+        return None
+
+
+class GameServer(object):
+    """多局对弈服务: 各局的AI请求进入按对局轮转的队列, 由调度协程在有空闲进程时依次交给进程池
+    排队的请求超过上限时直接拒绝(背压), 每个请求有期限, 搜索的时间预算为剩余时间, 到期仍未完成时退回启发式走法
+    """
+
+    def __init__(self, workers: int=Config.SERVER_WORKERS, max_games: int=Config.SERVER_MAX_GAMES,
+                    max_queue: int=Config.SERVER_MAX_QUEUE, max_pending: int=Config.SERVER_MAX_PENDING_PER_GAME,
+                    max_depth: int=Config.AI_MAX_DEPTH, deadline_ms: float=Config.SERVER_DEADLINE_MS,
+                    executor: Optional[Executor]=None, **options):
+        """初始化
+        Args:
+            workers: 搜索进程数, 也是同时进行的搜索数
+            max_games: 最多同时进行的对局数
+            max_queue: 排队的请求数上限
+            max_pending: 每局排队的请求数上限
+            max_depth: 搜索深度上限, 新建对局时的深度不能超过它
+            deadline_ms: 请求的默认期限(毫秒)
+            executor: 进程池, 不传时新建一个, 关闭服务时一并关闭
+            options: 传给每个进程中MinMaxSearcher的参数, 另外low_alloc为True时使用FlatSearcher
+        """
+        if workers < 1:
+            raise ValueError(f"Invalid workers: {workers}")
+        self.workers = workers
+        self.max_games = max_games
+        self.max_queue = max_queue
+        self.max_pending = max_pending
+        self.max_depth = max_depth
+        self.deadline_ms = deadline_ms
+        self._executor = executor
+        self._own_executor = executor is None
+        self._options = options
+        self._sessions = {}
+        self._ids = itertools.count(1)
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._server = None
+        self._started = None
+        # 统计: 最近的请求延迟及排队时间(毫秒)
+        self._latencies = deque(maxlen=10000)
+        self._waits = deque(maxlen=10000)
+        # 平均每次搜索的耗时(秒), 用于估计重试时间
+        self._service_time = 0.0
+        self.running = 0
+        self.served = 0
+        self.searched = 0
+        self.fallbacks = 0
+        self.rejected = 0
+        self.max_queued = 0
+
+    async def start(self, host: Optional[str]=None, port: Optional[int]=None):
+        """启动进程池及调度协程, 传入host和port时同时在此地址上监听"""
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_worker) for _ in range(self.workers)))
+        self._queue = FairQueue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._started = time.perf_counter()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if host is not None and port is not None:
+            self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server
+
+    async def close(self):
+        """停止监听及调度, 关闭进程池"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        for game in list(self._sessions):
+            self.close_game(game)
+        if self._own_executor and self._executor is not None:
+            # 等待进行中的搜索结束会阻塞, 放到线程中执行, 不阻塞事件循环
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(executor.shutdown, cancel_futures=True))
+
+    def close_game(self, game: int):
+        """结束对局, 排队中的请求直接退回启发式走法"""
+        self._sessions.pop(game, None)
+        if self._queue is None:
+            return
+        for request in self._queue.drop(game):
+            if not request.future.done():
+                request.future.set_result(None)
+
+    async def handle(self, request: dict, games: Optional[set]=None):
+        """处理一个请求, 返回回复
+        Args:
+            request: 请求
+            games: 当前连接创建的对局, 连接断开时一并结束
+        """
+        reply = {"id": request.get("id")}
+        try:
+            op = request.get("op")
+            if op == "new":
+                reply.update(await self._new_game(request, games))
+            elif op == "move":
+                reply.update(await self._move(self._session(request), request))
+            elif op == "hint":
+                session = self._session(request)
+                score, move, info = await self._search(session, session.human, request)
+                reply.update(score=score, move=move, **info)
+            elif op == "close":
+                game = self._session(request).game
+                self.close_game(game)
+                if games is not None:
+                    games.discard(game)
+            elif op == "stats":
+                reply.update(self.stats())
+            else:
+                raise ValueError(f"Unknown op: {op}")
+            reply["ok"] = True
+        except ServerBusy as e:
+            self.rejected += 1
+            reply.update(ok=False, error="busy", message=str(e), retry_after_ms=round(e.retry_after_ms))
+        except (KeyError, TypeError, ValueError) as e:
+            reply.update(ok=False, error="invalid", message=str(e))
+        return reply
+
+    def stats(self):
+        """服务的统计信息, 延迟及排队时间为毫秒"""
+        latencies, waits = list(self._latencies), list(self._waits)
+        uptime = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "games": len(self._sessions),
+            "queued": len(self._queue) if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "running": self.running,
+            "served": self.served,
+            "searched": self.searched,
+            "fallbacks": self.fallbacks,
+            "rejected": self.rejected,
+            "latency_ms": {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+                            "max": max(latencies) if latencies else None},
+            "queue_ms": {"p50": percentile(waits, 50), "p99": percentile(waits, 99)},
+            "throughput": self.served / uptime if uptime else 0.0,
+        }
+
+    def _session(self, request: dict):
+        game = request["game"]
+        if game not in self._sessions:
+            raise ValueError(f"Unknown game: {game}")
+        return self._sessions[game]
+
+    async def _new_game(self, request: dict, games: Optional[set]):
+        if len(self._sessions) >= self.max_games:
+            raise ServerBusy(f"Too many games: {len(self._sessions)}", self._retry_after())
+        if request.get("ai_first") and len(self._queue) >= self.max_queue:
+            raise ServerBusy(f"Queue full: {len(self._queue)} requests", self._retry_after())
+        size = int(request.get("size", Config.SIZE))
+        if not 5 <= size <= 25:
+            raise ValueError(f"Invalid size: {size}")
+        depth = min(int(request.get("depth", self.max_depth)), self.max_depth)
+        ai = Chess.BLACK if request.get("ai_first") else Chess.WHITE
+        session = GameSession(next(self._ids), size, ai, max(1, depth),
+                                float(request.get("deadline_ms", self.deadline_ms)))
+        self._sessions[session.game] = session
+        if games is not None:
+            games.add(session.game)
+        reply = {"game": session.game, "ai": ai.name, "move": None}
+        if ai == Chess.BLACK:
+            try:
+                reply.update(await self._play_ai(session, request))
+            except BaseException:
+                # 客户端拿不到对局id, 不保留这局
+                self.close_game(session.game)
+                if games is not None:
+                    games.discard(session.game)
+                raise
+        return reply
+
+    async def _move(self, session: GameSession, request: dict):
+        if session.winner is not None:
+            raise ValueError(f"Game {session.game} is over")
+        if session.thinking:
+            raise ValueError(f"Game {session.game}: not your turn")
+        pt = Point(int(request["x"]), int(request["y"]), session.human)
+        if not session.board.is_empty(pt):
+            raise ValueError(f"{pt} position not empty!")
+        # 先检查能否排队, 拒绝时不落子, 客户端可原样重试
+        self._check_capacity(session)
+        session.board.set(pt)
+        if session.winner is not None:
+            return {"move": None, "winner": session.winner.name}
+        return await self._play_ai(session, request)
+
+    async def _play_ai(self, session: GameSession, request: dict):
+        session.thinking = True
+        try:
+            score, move, info = await self._search(session, session.ai, request)
+        finally:
+            session.thinking = False
+        if self._sessions.get(session.game) is not session:
+            raise ValueError(f"Game {session.game} closed")
+        session.board.set(Point(move[0], move[1], session.ai))
+        winner = session.winner
+        return dict(score=score, move=move, winner=winner.name if winner is not None else None, **info)
+
+    async def _search(self, session: GameSession, target: Chess, request: dict):
+        """排队搜索target一方的走法, 到期未完成时退回启发式分数最高的走法"""
+        loop = asyncio.get_running_loop()
+        received = loop.time()
+        self._check_capacity(session)
+        deadline_ms = float(request.get("deadline_ms", session.deadline_ms))
+        stones = [(pt.x, pt.y, int(pt.chess)) for pt in session.board.stones]
+        future = loop.create_future()
+        self._queue.put(session.game, SearchRequest(session.game, stones, session.board.size, int(target),
+                                                    session.max_depth, received + deadline_ms / 1000,
+                                                    received, future))
+        self.max_queued = max(self.max_queued, len(self._queue))
+        done, _ = await asyncio.wait({future}, timeout=deadline_ms / 1000)
+        result = future.result() if done else None
+        if not done:
+            # 期限已到, 之后到达的结果丢弃
+            future.cancel()
+        fallback = result is None or result[1] is None
+        if fallback:
+            self.fallbacks += 1
+            candidates = session.board.get_candidates(target, 1)
+            if not candidates:
+                raise ValueError(f"Game {session.game}: no empty position")
+            score, move, depth, nodes = None, candidates[0], 0, 0
+        else:
+            score, move, depth, nodes = result
+        latency = (loop.time() - received) * 1000
+        self._latencies.append(latency)
+        self.served += 1
+        return score, list(move), {"depth": depth, "nodes": nodes, "fallback": fallback,
+                                    "latency_ms": round(latency, 2)}
+
+    def _check_capacity(self, session: GameSession):
+        if len(self._queue) >= self.max_queue:
+            raise ServerBusy(f"Queue full: {len(self._queue)} requests", self._retry_after())
+        if self._queue.pending(session.game) >= self.max_pending:
+            raise ServerBusy(f"Game {session.game}: too many pending requests", self._retry_after())
+
+    def _retry_after(self):
+        """估计排队的请求处理完的时间(毫秒)"""
+        service = self._service_time or self.deadline_ms / 1000
+        return max(1.0, service * (len(self._queue) + self.running) / self.workers * 1000)
+
+    async def _dispatch(self):
+        """调度协程: 有空闲进程时取出轮到的请求交给进程池"""
+        loop = asyncio.get_running_loop()
+        margin = Config.SERVER_DEADLINE_MARGIN_MS / 1000
+        while True:
+            await self._slots.acquire()
+            request = await self._queue.get()
+            now = loop.time()
+            # 已到期或剩余时间不够搜索的请求不再占用进程
+            if request.future.done() or request.deadline - now <= margin:
+                self._slots.release()
+                if not request.future.done():
+                    request.future.set_result(None)
+                continue
+            self._waits.append((now - request.enqueued) * 1000)
+            budget = (request.deadline - now - margin) * 1000
+            self.running += 1
+            task = loop.run_in_executor(self._executor, _search_worker, request.stones, request.size,
+                                        request.target, request.max_depth, budget, self._options)
+            task.add_done_callback(lambda task, request=request, start=now: self._finish(task, request, start))
+
+    def _finish(self, task: asyncio.Future, request: SearchRequest, start: float):
+        """搜索完成: 释放进程, 请求未到期时交回结果"""
+        self.running -= 1
+        self._slots.release()
+        elapsed = asyncio.get_running_loop().time() - start
+        self._service_time = elapsed if not self._service_time else 0.8 * self._service_time + 0.2 * elapsed
+        self.searched += 1
+        if request.future.done():
+            return
+        if task.cancelled() or task.exception() is not None:
+            request.future.set_result(None)
+        else:
+            request.future.set_result(task.result())
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """一个客户端连接: 每个请求在单独的任务中处理, 连接断开时结束它创建的对局"""
+        games = set()
+        tasks = set()
+        lock = asyncio.Lock()
+
+        async def respond(request: Optional[dict], error: Optional[str]=None):
+            if error is None:
+                reply = await self.handle(request, games)
+            else:
+                reply = {"id": None, "ok": False, "error": "invalid", "message": error}
+            async with lock:
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request, error = None, None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be an object")
+                except ValueError as e:
+                    error = str(e)
+                task = asyncio.create_task(respond(request, error))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for game in games:
+                self.close_game(game)
+            writer.close()
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Headless multi-game engine server")
+    parser.add_argument("--host", default=Config.SERVER_HOST, help="listen address")
+    parser.add_argument("-p", "--port", type=int, default=Config.SERVER_PORT, help="listen port")
+    parser.add_argument("-w", "--workers", type=int, default=Config.SERVER_WORKERS, help="search processes")
+    parser.add_argument("-d", "--depth", type=int, default=Config.AI_MAX_DEPTH, help="max search depth")
+    parser.add_argument("--deadline", type=float, default=Config.SERVER_DEADLINE_MS,
+                        help="default deadline per request(ms)")
+    parser.add_argument("--max-games", type=int, default=Config.SERVER_MAX_GAMES, help="max concurrent games")
+    parser.add_argument("--max-queue", type=int, default=Config.SERVER_MAX_QUEUE, help="max queued requests")
+    parser.add_argument("--low-alloc", action="store_true", default=Config.LOW_ALLOC_SEARCH,
+                        help="use the low-allocation searcher")
+    args = parser.parse_args()
+    return args
+
+
+async def serve(args):
+    """启动服务并一直运行"""
+    server = GameServer(args.workers, args.max_games, args.max_queue, max_depth=args.depth,
+                        deadline_ms=args.deadline, low_alloc=args.low_alloc)
+    listener = await server.start(args.host, args.port)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    """主函数入口"""
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+冷启动基准: 每次在新的解释器进程中导入引擎并完成一次无界面搜索, 统计进程启动、导入及搜索的耗时,
+导入明细由python -X importtime给出, 并检查进程是否加载了Qt、numpy及torch
+在仓库根目录运行: python -m gobang.startup_bench
+author: yooongchun@foxmail.com
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from gobang.config import Config
+
+# 场景 -> (导入的模块, 搜索类), 搜索类为None时只导入不搜索
+SCENARIOS = {
+    "python": (None, None),
+    "engine": ("gobang.strategy.min_max_tree", "MinMaxSearcher"),
+    "low-alloc": ("gobang.strategy.flat_search", "FlatSearcher"),
+    "mcts": ("gobang.strategy.mcts", "MCTSSearcher"),
+    "cli": ("gobang.play_cli", None),
+    "gui": ("gobang.play", None),
+}
+# 检查是否被加载的重量级模块
+HEAVY_MODULES = ("numpy", "torch", "PyQt5")
+# 搜索的局面: 开局后的几步, 不查开局库
+OPENING = ((7, 7), (7, 8), (8, 8), (6, 6), (8, 7), (8, 6))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+module, cls = {module!r}, {cls!r}
+if module:
+    __import__(module)
+imported = time.perf_counter()
+if cls:
+    from gobang import chessboard
+    from gobang.config import Chess, Point
+    board = chessboard.ChessBoard(size={size})
+    for k, (x, y) in enumerate({opening!r}):
+        board.set(Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE))
+    searcher = getattr(sys.modules[module], cls)(board, Chess.WHITE if len({opening!r}) % 2 else Chess.BLACK,
+                                                    use_book=False)
+    searcher.search({depth}, {time_budget!r})
+searched = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "search_ms": (searched - imported) * 1000,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """解析-X importtime的输出, 返回[(模块, 自身耗时(毫秒), 累计耗时(毫秒), 层级)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(fields[0]) / 1000, int(fields[1]) / 1000, level))
+    return entries
+
+
+def run_once(scenario: str, depth: int, time_budget_ms: float, importtime: bool=False):
+    """在新进程中运行一次场景
+    Returns:
+        (结果, importtime明细), 结果包含进程的墙钟耗时wall_ms, 进程内的导入及搜索耗时, 加载的重量级模块,
+        导入失败(如未安装PyQt5)时结果包含error
+    """
+    module, cls = SCENARIOS[scenario]
+    code = PROBE.format(module=module, cls=cls, size=Config.SIZE, opening=OPENING, depth=depth,
+                        time_budget=time_budget_ms, heavy=HEAVY_MODULES)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    # 在仓库根目录运行, 使gobang可以作为包导入
+    cwd = os.path.dirname(Config.PROJ_DIR)
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()
+        return {"wall_ms": wall, "error": error[-1] if error else f"exit code {proc.returncode}"}, []
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall
+    return result, parse_importtime(proc.stderr) if importtime else []
+
+
+def run_scenario(scenario: str, repeat: int, depth: int, time_budget_ms: float, top: int):
+    """多次冷启动取中位数, 另用-X importtime运行一次得到耗时最多的模块"""
+    runs = [run_once(scenario, depth, time_budget_ms)[0] for _ in range(repeat)]
+    errors = [r["error"] for r in runs if "error" in r]
+    if errors:
+        return {"scenario": scenario, "error": errors[0]}
+    _, entries = run_once(scenario, depth, time_budget_ms, importtime=True)
+    # 顶层导入中属于本项目的部分
+    engine = [e for e in entries if e[3] == 0 and e[0].split(".")[0] == "gobang"]
+    median = lambda key: sorted(r[key] for r in runs)[len(runs) // 2]
+    return {
+        "scenario": scenario,
+        "wall_ms": median("wall_ms"),
+        "import_ms": median("import_ms"),
+        "search_ms": median("search_ms"),
+        "loaded": runs[0]["loaded"],
+        "engine_import_ms": sum(e[2] for e in engine),
+        "slowest_imports": [{"module": name, "self_ms": self_ms, "cumulative_ms": cumulative}
+                            for name, self_ms, cumulative, _ in sorted(entries, key=lambda e: -e[1])[:top]],
+    }
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Cold-start time of a headless search in a fresh interpreter")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS),
+                        help=f"scenarios to measure: {', '.join(SCENARIOS)}")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="cold starts per scenario, median is reported")
+    parser.add_argument("-d", "--depth", type=int, default=2, help="search depth")
+    parser.add_argument("-t", "--time-budget", type=float, default=1000, help="time budget of the search(ms)")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest imports to show")
+    parser.add_argument("-o", "--output", default=None, help="write JSON report to this file")
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"invalid scenario: {scenario}")
+    return args
+
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    results = [run_scenario(s, args.repeat, args.depth, args.time_budget, args.top) for s in args.scenarios]
+    for result in results:
+        if "error" in result:
+            print(f"{result['scenario']:>10} skipped: {result['error']}")
+            continue
+        print(f"{result['scenario']:>10} wall={result['wall_ms']:.1f}ms import={result['import_ms']:.1f}ms "
+              f"search={result['search_ms']:.1f}ms loaded={','.join(result['loaded']) or '-'}")
+        slowest = ", ".join(f"{e['module']}({e['self_ms']:.1f}ms)" for e in result["slowest_imports"])
+        print(f"{'':>10} slowest imports: {slowest}")
+    if args.output:
+        report = {
+            "version": Config.APP_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
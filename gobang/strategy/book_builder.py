@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+生成开局库: 离线深度搜索展开开局局面, 或从自对弈的对局记录中统计胜方的走法
+author: yooongchun@foxmail.com
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional
+
+from gobang import chessboard
+from gobang import record
+from gobang.config import Chess, Config, Point
+from gobang.strategy import min_max_tree
+from gobang.strategy.opening_book import OpeningBook, OpeningBookWriter, board_key
+
+
+def build_from_search(writer: OpeningBookWriter, plies: int, width: int, depth: int,
+                        time_budget_ms: Optional[float]=None):
+    """从空棋盘开始, 每个局面深度搜索出最佳走法写入开局库, 并沿启发式最好的width个走法展开
+    Args:
+        writer: 开局库
+        plies: 展开的最大步数
+        width: 每个局面展开的走法数
+        depth: 每个局面的搜索深度
+        time_budget_ms: 每个局面的时间预算(毫秒)
+    """
+    board = chessboard.ChessBoard(size=writer.size)
+    seen = set()
+    count = 0
+
+    def expand(ply: int):
+        nonlocal count
+        key, _ = board_key(board)
+        if key in seen or board.winner is not None:
+            return
+        seen.add(key)
+        turn = Chess.BLACK if ply % 2 == 0 else Chess.WHITE
+        searcher = min_max_tree.MinMaxSearcher(board, turn, use_book=False)
+        score, move = searcher.search(depth, time_budget_ms)
+        if move is None:
+            return
+        writer.add(board, (move.x, move.y), score, max(1, searcher.completed_depth))
+        count += 1
+        print(f"[book] ply={ply} positions={count} move=({move.x},{move.y}) score={score} "
+              f"depth={searcher.completed_depth}")
+        if ply + 1 >= plies:
+            return
+        moves = [(move.x, move.y)]
+        for candidate in board.get_candidates(turn):
+            if len(moves) >= width:
+                break
+            if candidate not in moves:
+                moves.append(candidate)
+        for x, y in moves:
+            board.set(Point(x, y, turn))
+            try:
+                expand(ply + 1)
+            finally:
+                board.unset()
+
+    expand(0)
+    return count
+
+
+def build_from_games(writer: OpeningBookWriter, games: list, plies: int):
+    """统计对局记录中胜方在前plies步的走法, 每局权重为1
+    Args:
+        writer: 开局库
+        games: 对局[{"moves": [[x, y]], "winner": "BLACK"/"WHITE"/None}], 黑棋先手, 如benchmark报告中的games
+        plies: 统计的最大步数
+    """
+    count = 0
+    for game in games:
+        if not game.get("winner"):
+            continue
+        winner = Chess[game["winner"]]
+        board = chessboard.ChessBoard(size=writer.size)
+        for ply, (x, y) in enumerate(game["moves"][:plies]):
+            turn = Chess.BLACK if ply % 2 == 0 else Chess.WHITE
+            if turn == winner:
+                writer.add(board, (x, y), 0, 1)
+                count += 1
+            board.set(Point(x, y, turn))
+    return count
+
+
+def build_from_records(writer: OpeningBookWriter, path: str, plies: int):
+    """流式读取棋谱文件, 统计胜方在前plies步的走法"""
+    count = 0
+    with record.RecordReader(path) as reader:
+        for game in reader:
+            if game.winner is None or game.size != writer.size:
+                continue
+            board = chessboard.ChessBoard(size=game.size)
+            for ply, (x, y, chess) in enumerate(game.moves[:plies]):
+                if chess == game.winner:
+                    writer.add(board, (x, y), 0, 1)
+                    count += 1
+                board.set(Point(x, y, chess))
+    return count
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument("-o", "--output", default=Config.OPENING_BOOK, help="opening book file")
+    parser.add_argument("-s", "--size", type=int, default=Config.SIZE, help="board size")
+    parser.add_argument("-p", "--plies", type=int, default=4, help="max plies in the book")
+    parser.add_argument("-w", "--width", type=int, default=3, help="moves expanded per position")
+    parser.add_argument("-d", "--depth", type=int, default=4, help="search depth per position")
+    parser.add_argument("-t", "--time-budget", type=float, default=None, help="time budget per position(ms)")
+    parser.add_argument("-g", "--games", nargs="*", default=[], help="benchmark reports with self-play games")
+    parser.add_argument("-r", "--records", nargs="*", default=[], help="game record files")
+    parser.add_argument("--merge", action="store_true", default=False, help="keep entries of the existing book")
+    parser.add_argument("--no-search", action="store_true", default=False, help="only use the game records")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    writer = OpeningBookWriter(args.size)
+    if args.merge and os.path.exists(args.output):
+        book = OpeningBook(args.output)
+        writer.merge(book)
+        book.close()
+    start = time.time()
+    if not args.no_search:
+        build_from_search(writer, args.plies, args.width, args.depth, args.time_budget)
+    for path in args.games:
+        with open(path, encoding="utf-8") as f:
+            build_from_games(writer, json.load(f)["games"], args.plies)
+    for path in args.records:
+        build_from_records(writer, path, args.plies)
+    count = writer.write(args.output)
+    print(f"{count} entries of {len(writer.entries)} positions written to {args.output} "
+          f"in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
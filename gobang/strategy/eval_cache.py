@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+评估缓存: 以(局面哈希, 角色)为键缓存局面评分, 可在多次搜索及多局之间共享, 并保存到文件
+author: yooongchun@foxmail.com
+"""
+import os
+import struct
+import sys
+from collections import OrderedDict
+from typing import Optional
+
+from gobang.config import Config
+
+# 文件头: 魔数, 版本, 条目数; 条目: 局面哈希, 角色, 分数, 按最近使用从旧到新排列
+MAGIC = b"GBEC"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ENTRY = struct.Struct("<QBi")
+
+
+class EvalCache(object):
+    """容量固定的LRU评估缓存, 满了之后淘汰最久未使用的条目"""
+
+    def __init__(self, capacity: int=Config.EVAL_CACHE_SIZE):
+        """初始化
+        Args:
+            capacity: 最多缓存的条目数
+        """
+        if capacity <= 0:
+            raise ValueError(f"Invalid cache capacity: {capacity}")
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        # 计数器
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: int, side: int) -> Optional[int]:
+        """查找局面评分, 不存在时返回None"""
+        score = self._entries.get((key, side))
+        if score is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((key, side))
+        self.hits += 1
+        return score
+
+    def put(self, key: int, side: int, score: int):
+        """保存局面评分"""
+        entries = self._entries
+        if (key, side) in entries:
+            entries.move_to_end((key, side))
+        elif len(entries) >= self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[(key, side)] = score
+
+    def clear(self):
+        """清空缓存及计数器"""
+        self.__init__(self.capacity)
+
+    @property
+    def hit_rate(self):
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def memory_usage(self):
+        """估算占用的内存字节数"""
+        entry_size = sys.getsizeof((1 << 63, 1)) + sys.getsizeof(1 << 63) + sys.getsizeof(10000) + 100
+        return sys.getsizeof(self._entries) + len(self._entries) * entry_size
+
+    def save(self, path: str):
+        """保存到文件, 保留使用顺序, 先写临时文件再替换"""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self._entries)))
+            for (key, side), score in self._entries.items():
+                f.write(ENTRY.pack(key, side, score))
+        os.replace(tmp, path)
+        return len(self._entries)
+
+    def load(self, path: str):
+        """从文件载入并合并到当前缓存, 超出容量时淘汰文件中较旧的条目"""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION or len(data) != HEADER.size + count * ENTRY.size:
+            raise ValueError(f"Invalid evaluation cache: {path}")
+        for key, side, score in ENTRY.iter_unpack(data[HEADER.size:]):
+            self.put(key, side, score)
+        return count
+
+    def stats(self):
+        """计数器汇总"""
+        return {
+            "capacity": self.capacity,
+            "used": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "evictions": self.evictions,
+            "memory_bytes": self.memory_usage(),
+        }
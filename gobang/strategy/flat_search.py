@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+低分配的搜索模式: 整个搜索只使用一个加边框的一维棋盘, 走法编码为整数下标,
+落子/悔棋时就地更新棋盘、哈希、候选位置及形态计数, 递归中不创建Point、ChessBoard及评估对象,
+走法及主变例使用按层预先分配的列表, 搜索结果与相同参数的MinMaxSearcher一致
+author: yooongchun@foxmail.com
+"""
+import functools
+import time
+from itertools import combinations as comb
+from typing import Optional
+
+from gobang import chessboard
+from gobang import pattern_table
+from gobang.config import Chess, Config, Point
+from gobang.evaluate import Score, get_pattern_table
+from gobang.strategy.min_max_tree import MinMaxSearcher, SearchTimeout
+from gobang.strategy.transposition import Bound, score_from_tt, score_to_tt
+
+# 一维棋盘的取值: 0空, 1黑, 2白, 3边框
+BORDER = 3
+# 边框宽度, 不小于候选位置的邻居距离, 扫描时不需要判断越界
+PAD = max(2, Config.NEIGHBOR_LAYER)
+# 棋盘取值在每一方看来的形态符号: 空o(0), 己方x(1), 对方及边框d(2)
+DIGITS = {Chess.BLACK: (0, 1, 2, 2), Chess.WHITE: (0, 2, 1, 2)}
+# 需要判断组合形态的分数及组合后的分数, 与IncrementalEvaluation.get_max_score一致
+COMBINED = {
+    Score.LEVEL1: Score.c_db_half_died_four,
+    Score.LEVEL2: Score.c_db_live_three,
+    Score.LEVEL3: Score.c_db_half_died_three,
+}
+# 候选走法的启发式分数, 按连子数*3+两端空位数索引, 与chessboard.SHAPE_SCORE一致
+SHAPE_SCORE = [chessboard.SHAPE_SCORE.get((count, ends), 0) for count in range(6) for ends in range(3)]
+
+
+@functools.lru_cache(maxsize=None)
+def window_codes(k: int, chess: int):
+    """长度为k的窗口按棋盘取值四进制编码后, 在chess一方看来的三进制形态编码, 由长度k-1的结果递推"""
+    digits = DIGITS[chess]
+    if k == 0:
+        return [0]
+    return [code * 3 + digit for code in window_codes(k - 1, chess) for digit in digits]
+
+
+@functools.lru_cache(maxsize=None)
+def window_ids(k: int, chess: int):
+    """长度为k的窗口按棋盘取值四进制编码后, 对chess一方的形态编号表, -1表示不是任何形态"""
+    ids = get_pattern_table().ids[k]
+    return [ids[code] for code in window_codes(k, chess)]
+
+
+@functools.lru_cache(maxsize=None)
+def window_layout(size: int):
+    """一维棋盘上的全部窗口, 只与棋盘大小有关, 多次搜索共享
+    Returns:
+        (slots, windows): slots[槽位] = (起点, 步长, 长度), windows[点] = 经过该点的[(槽位, 权重, 黑方编号表, 白方编号表)]
+    """
+    width = size + 2 * PAD
+    slots = []
+    windows = [[] for _ in range(width * width)]
+    lo, hi = PAD - 1, PAD + size
+    for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        stride = dx * width + dy
+        for k in get_pattern_table().lengths:
+            tables = (window_ids(k, Chess.BLACK), window_ids(k, Chess.WHITE))
+            for x in range(lo, hi + 1):
+                for y in range(lo, hi + 1):
+                    ex, ey = x + (k - 1) * dx, y + (k - 1) * dy
+                    if not (lo <= ex <= hi and lo <= ey <= hi):
+                        continue
+                    slot = len(slots)
+                    start = x * width + y
+                    slots.append((start, stride, k))
+                    for t in range(k):
+                        windows[start + t * stride].append((slot, 4 ** (k - 1 - t)) + tables)
+    return slots, windows
+
+
+class FlatEvaluation(object):
+    """一维棋盘上的增量评估: 维护每个窗口的编码及双方每种形态的匹配数
+    评分结果与IncrementalEvaluation(board).get_score(target)一致
+    """
+
+    def __init__(self, cells: bytearray, size: int):
+        """初始化, 之后落子/悔棋时需调用update
+        Args:
+            cells: 加边框的一维棋盘, 宽度为size+2*PAD
+            size: 棋盘大小
+        """
+        table = get_pattern_table()
+        num = len(table.patterns)
+        # 形态按分数从高到低: (分数, 正序编号, 逆序编号), 对称的形态两者相同
+        self._cases = [(getattr(Score, case), table.ids[len(case)][pattern_table.encode(case)],
+                        table.ids[len(case)][pattern_table.encode(case[::-1])]) for case in table.cases]
+        self._slots, self._windows = window_layout(size)
+        self._codes = [0] * len(self._slots)
+        for slot, (start, stride, k) in enumerate(self._slots):
+            code = 0
+            for t in range(k):
+                code = code * 4 + cells[start + t * stride]
+            self._codes[slot] = code
+        # 每一方每种形态的匹配数, 需要判断组合形态的形态还记录匹配的槽位
+        combined = [score in COMBINED for _, _, score in table.patterns]
+        self._counts = [None, [0] * num, [0] * num]
+        self._where = [None] + [[set() if combined[pid] else None for pid in range(num)] for _ in range(2)]
+        for chess in (Chess.BLACK, Chess.WHITE):
+            counts, where = self._counts[chess], self._where[chess]
+            for slot, (_, _, k) in enumerate(self._slots):
+                pid = window_ids(k, chess)[self._codes[slot]]
+                if pid >= 0:
+                    counts[pid] += 1
+                    if where[pid] is not None:
+                        where[pid].add(slot)
+
+    def update(self, p: int, delta: int):
+        """p点的取值增加delta(落子时为棋子, 悔棋时为负的棋子), 只更新经过该点的窗口"""
+        codes = self._codes
+        black, white = self._counts[1], self._counts[2]
+        where_black, where_white = self._where[1], self._where[2]
+        for slot, weight, ids_black, ids_white in self._windows[p]:
+            old = codes[slot]
+            new = old + delta * weight
+            codes[slot] = new
+            a, b = ids_black[old], ids_black[new]
+            if a != b:
+                if a >= 0:
+                    black[a] -= 1
+                    if where_black[a] is not None:
+                        where_black[a].discard(slot)
+                if b >= 0:
+                    black[b] += 1
+                    if where_black[b] is not None:
+                        where_black[b].add(slot)
+            a, b = ids_white[old], ids_white[new]
+            if a != b:
+                if a >= 0:
+                    white[a] -= 1
+                    if where_white[a] is not None:
+                        where_white[a].discard(slot)
+                if b >= 0:
+                    white[b] += 1
+                    if where_white[b] is not None:
+                        where_white[b].add(slot)
+
+    def _is_multi_case(self, chess: int, pid: int):
+        """交叉情况判断: 不同方向上的两个匹配存在公共点"""
+        cells = {}
+        for slot in self._where[chess][pid]:
+            start, stride, k = self._slots[slot]
+            cells.setdefault(stride, []).append({start + t * stride for t in range(k)})
+        for dire1, dire2 in comb(cells, 2):
+            for arr1 in cells[dire1]:
+                for arr2 in cells[dire2]:
+                    if arr1 & arr2:
+                        return True
+        return False
+
+    def get_max_score(self, chess: int):
+        """对一方打分, 等价于IncrementalEvaluation.get_max_score"""
+        counts = self._counts[chess]
+        for score, forward, reverse in self._cases:
+            # 正序没有匹配时才使用逆序的结果
+            pid = forward if counts[forward] else reverse
+            if not counts[pid]:
+                continue
+            if score in COMBINED and self._is_multi_case(chess, pid):
+                return COMBINED[score]
+            return score
+        return 0
+
+    def get_score(self, chess: int):
+        """chess一方的得分"""
+        return self.get_max_score(chess) - self.get_max_score(3 - chess)
+
+
+
+class FlatSearcher(MinMaxSearcher):
+    """低分配的博弈树搜索, 参数及接口与MinMaxSearcher一致(roi及incremental不起作用)
+    每次搜索开始时由棋盘建立一维棋盘及评估状态, 递归中只做就地更新, 搜索不修改原棋盘
+    """
+
+    def _open(self):
+        """由棋盘建立一维棋盘、哈希、候选位置及评估状态"""
+        board = self._chessboard
+        size = board.size
+        width = size + 2 * PAD
+        area = width * width
+        self._width = width
+        # 排序键中走法所占的位数
+        self._bits = area.bit_length()
+        self._mask = (1 << self._bits) - 1
+        self._sides = (int(self._target), int(self._army))
+        cells = bytearray([BORDER]) * area
+        for x, row in enumerate(board.get_board()):
+            for y, value in enumerate(row):
+                cells[(x + PAD) * width + y + PAD] = value
+        self._cells = cells
+        self._center = (size // 2 + PAD) * width + size // 2 + PAD
+        self._strides = (1, width, width + 1, width - 1)
+        # Zobrist随机数表按下标展开
+        keys = chessboard.zobrist_keys(size)
+        self._keys = [None, [0] * area, [0] * area]
+        for x in range(size):
+            for y in range(size):
+                p = (x + PAD) * width + y + PAD
+                self._keys[Chess.BLACK][p] = keys[x][y][Chess.BLACK]
+                self._keys[Chess.WHITE][p] = keys[x][y][Chess.WHITE]
+        self._hash = board.hash
+        # 胜方及其出现时的落子数, 0表示没有
+        self._winner = int(board.winner) if board.winner is not None else 0
+        self._win_ply = 0
+        self._stack = []
+        # 邻居计数及候选位置
+        layer = Config.NEIGHBOR_LAYER
+        self._ring = [dx * width + dy for dx in range(-layer, layer + 1) for dy in range(-layer, layer + 1)
+                        if dx or dy]
+        self._neighbors = bytearray(area)
+        self._candidates = set()
+        for p in range(area):
+            if cells[p] in (Chess.BLACK, Chess.WHITE):
+                self._update_neighbors(p, 1)
+        self._evaluation = FlatEvaluation(cells, size)
+        # 排序: 每层的杀手走法及按下标的历史表
+        self._use_killers = self._ordering is not None and self._ordering.use_killers
+        self._use_history = self._ordering is not None and self._ordering.use_history
+        self._killers = []
+        self._history = [None, [0] * area, [0] * area]
+        # 每层复用的走法及主变例列表
+        self._move_lists = []
+        self._pv_lists = []
+
+    def _close(self):
+        """搜索结束后的清理"""
+        super()._close()
+        self._evaluation = None
+
+    def _buffers(self, ply: int):
+        """第ply层复用的(走法列表, 子节点主变例列表, 杀手走法列表)"""
+        while len(self._move_lists) <= ply:
+            self._move_lists.append([])
+            self._pv_lists.append([])
+            self._killers.append([])
+        return self._move_lists[ply], self._pv_lists[ply], self._killers[ply]
+
+    def _index(self, x: int, y: int):
+        """棋盘坐标 -> 一维下标"""
+        return (x + PAD) * self._width + y + PAD
+
+    def _point(self, p: int, chess: Chess):
+        """一维下标 -> Point"""
+        return Point(p // self._width - PAD, p % self._width - PAD, chess)
+
+    def _update_neighbors(self, p: int, delta: int):
+        """p点落子(delta=1)或提子(delta=-1)后更新周围的邻居计数及候选位置, 同ChessBoard._update_neighbors"""
+        cells, neighbors, candidates = self._cells, self._neighbors, self._candidates
+        for offset in self._ring:
+            q = p + offset
+            neighbors[q] += delta
+            if cells[q]:
+                continue
+            if neighbors[q]:
+                candidates.add(q)
+            else:
+                candidates.discard(q)
+        if cells[p]:
+            candidates.discard(p)
+        elif neighbors[p]:
+            candidates.add(p)
+
+    def _is_five(self, p: int, chess: int):
+        """经过p的四条线上是否有chess一方连成五子"""
+        cells = self._cells
+        for stride in self._strides:
+            count = 1
+            q = p + stride
+            while cells[q] == chess:
+                count += 1
+                q += stride
+            q = p - stride
+            while cells[q] == chess:
+                count += 1
+                q -= stride
+            if count >= 5:
+                return True
+        return False
+
+    def _play(self, p: int, chess: int):
+        """落子"""
+        self._cells[p] = chess
+        self._hash ^= self._keys[chess][p]
+        self._update_neighbors(p, 1)
+        stack = self._stack
+        stack.append(p)
+        if not self._winner and self._is_five(p, chess):
+            self._winner = chess
+            self._win_ply = len(stack)
+        self._evaluation.update(p, chess)
+
+    def _undo(self):
+        """回退一步"""
+        stack = self._stack
+        p = stack.pop()
+        chess = self._cells[p]
+        if self._winner and len(stack) < self._win_ply:
+            self._winner = 0
+        self._cells[p] = Chess.EMPTY
+        self._hash ^= self._keys[chess][p]
+        self._update_neighbors(p, -1)
+        self._evaluation.update(p, -chess)
+
+    def _point_score(self, p: int, chess: int):
+        """在p落子后四个方向上形成的棋形分数之和, 同ChessBoard._point_score"""
+        cells = self._cells
+        score = 0
+        for stride in self._strides:
+            count, open_ends = 1, 0
+            q = p + stride
+            while cells[q] == chess:
+                count += 1
+                q += stride
+            if not cells[q]:
+                open_ends += 1
+            q = p - stride
+            while cells[q] == chess:
+                count += 1
+                q -= stride
+            if not cells[q]:
+                open_ends += 1
+            score += SHAPE_SCORE[min(count, 5) * 3 + open_ends]
+        return score
+
+    def _generate(self, moves: list, turn: int, ply: int, killers: list):
+        """在moves中生成候选走法, 顺序与ChessBoard.get_candidates加MoveOrdering.order一致"""
+        del moves[:]
+        if not self._candidates:
+            if not self._cells[self._center]:
+                moves.append(self._center)
+            return
+        army = 3 - turn
+        bits = self._bits
+        history = self._history[turn] if self._use_history and ply > 0 else None
+        point_score = self._point_score
+        # 排序键: 启发式分数从高到低, 历史分数从高到低, 下标从小到大, 编码为一个整数
+        for p in self._candidates:
+            key = (-(2 * point_score(p, turn) + point_score(p, army)) << 64) + p
+            if history is not None:
+                key -= history[p] << bits
+            moves.append(key)
+        moves.sort()
+        mask = self._mask
+        for k in range(len(moves)):
+            moves[k] &= mask
+        if self._top_k:
+            del moves[self._top_k:]
+        if self._use_killers and ply > 0:
+            for killer in reversed(killers):
+                if killer in moves:
+                    moves.remove(killer)
+                    moves.insert(0, killer)
+
+    def _evaluate(self, pt: Optional[Point]):
+        """局面评分, 相对于target"""
+        cache = self.eval_cache
+        if cache is None:
+            return self._evaluation.get_score(self._sides[0])
+        score = cache.get(self._hash, self._target)
+        if score is None:
+            self.stats.eval_cache_misses += 1
+            score = self._evaluation.get_score(self._sides[0])
+            cache.put(self._hash, self._target, score)
+        else:
+            self.stats.eval_cache_hits += 1
+        return score
+
+    def _leaf(self, turn: int, pt: Optional[Point]):
+        """叶子节点评分, 相对于轮到落子的一方"""
+        start = time.perf_counter()
+        score = self._evaluate(pt)
+        self.stats.eval_time += time.perf_counter() - start
+        self.stats.evaluations += 1
+        return score if turn == self._sides[0] else -score
+
+    def _negetive_max(self, depth: int, alpha: float, beta: float, pv: list, pt: Optional[Point]=None):
+        """负极大值递归搜索, 与MinMaxSearcher._negetive_max相同, 走法及主变例为一维下标"""
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
+        if self._cancel is not None and self._cancel.is_set():
+            raise SearchTimeout()
+        del pv[:]
+        stats = self.stats
+        ply = self._max_depth - depth
+        turn = self._sides[ply & 1]
+        stats.nodes[ply] += 1
+        if self._on_node is not None:
+            self._on_node(stats, ply, depth)
+        winner = self._winner
+        if winner:
+            mate = Score.MATE - ply
+            return mate if winner == turn else -mate
+        if depth <= 0:
+            return self._leaf(turn, None)
+        alpha0 = alpha
+        pv_node = beta - alpha > 1
+        key = self._hash
+        entry = self.tt.probe(key) if self.tt is not None else None
+        if entry is not None:
+            stats.tt_hits += 1
+        if entry is not None and entry.depth >= depth and depth < self._max_depth and not pv_node:
+            score = score_from_tt(entry.score, ply)
+            if entry.bound == Bound.EXACT or \
+                    (entry.bound == Bound.LOWER and score >= beta) or \
+                    (entry.bound == Bound.UPPER and score <= alpha):
+                stats.tt_cutoffs += 1
+                return score
+        start = time.perf_counter()
+        moves, child_pv, killers = self._buffers(ply)
+        if ply == 0 and self._root_moves is not None:
+            moves[:] = [self._index(x, y) for x, y in self._root_moves]
+        else:
+            self._generate(moves, turn, ply, killers)
+        if ply == 0:
+            first = self._index(*self._root_move) if self._root_move is not None else None
+        else:
+            first = entry.move if entry is not None else None
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        stats.movegen_time += time.perf_counter() - start
+        if not moves:
+            return self._leaf(turn, None)
+        stats.expanded += 1
+        best_score, best_move = -float('inf'), -1
+        index = 0
+        # 子节点会重新生成下一层的走法列表, 这里遍历的是本层的列表
+        for p in moves:
+            stats.children += 1
+            self._play(p, turn)
+            try:
+                if index == 0 or not self._pvs:
+                    score = -self._negetive_max(depth - 1, -beta, -alpha, child_pv)
+                else:
+                    score = -self._negetive_max(depth - 1, -alpha - 1, -alpha, child_pv)
+                    if alpha < score < beta:
+                        stats.researches += 1
+                        score = -self._negetive_max(depth - 1, -beta, -alpha, child_pv)
+            finally:
+                self._undo()
+            if score > best_score:
+                best_score, best_move = score, p
+                if score > alpha:
+                    alpha = score
+                    del pv[:]
+                    pv.append(p)
+                    pv.extend(child_pv)
+                    if score >= beta:
+                        stats.cutoffs += 1
+                        stats.cutoff_index[index] += 1
+                        if self._use_killers:
+                            if p in killers:
+                                killers.remove(p)
+                            killers.insert(0, p)
+                            del killers[self._ordering.slots:]
+                        if self._use_history:
+                            self._history[turn][p] += depth * depth
+                        break
+            index += 1
+        if self.tt is not None:
+            if best_score <= alpha0:
+                bound = Bound.UPPER
+            elif best_score >= beta:
+                bound = Bound.LOWER
+            else:
+                bound = Bound.EXACT
+            self.tt.store(key, depth, bound, score_to_tt(best_score, ply), best_move)
+        return best_score
+
+    def _search_root(self, depth: int, guess: Optional[float]):
+        """搜索根节点, 返回的主变例转换为[Point]"""
+        score, pv = super()._search_root(depth, guess)
+        return score, [self._point(p, self._target if k % 2 == 0 else self._army) for k, p in enumerate(pv)]
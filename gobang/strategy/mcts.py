@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+蒙特卡洛树搜索(MCTS): UCT选择, 按启发式分数展开, 在加边框的一维棋盘上快速随机模拟
+搜索树的各字段存放在数组中, 不为节点创建对象, 可在多步之间保留并复用对应的子树
+author: yooongchun@foxmail.com
+"""
+import math
+import random
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Optional
+
+from gobang import chessboard
+from gobang import evaluate
+from gobang.config import Chess, Config, Point
+from gobang.strategy import opening_book, threat
+from gobang.strategy.flat_search import BORDER, PAD
+from gobang.strategy.stats import SearchStats
+
+# 模拟时在最近两步周围选择走法的范围, 及取到空位之前最多的尝试次数
+ROLLOUT_RADIUS = 2
+ROLLOUT_TRIES = 8
+
+
+class MCTSTree(object):
+    """数组存储的搜索树: 节点i的各字段是各数组的第i项, 节点0为树根, 一个节点的子节点在数组中连续存放
+    在多次搜索之间保留时, 新的局面由树根的局面继续走下去得到则保留对应的子树, 否则清空
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.move)
+
+    def clear(self):
+        """清空整棵树"""
+        self._reset()
+        # 树根局面的棋盘大小, 棋子{(x, y, chess)}及轮到落子的一方
+        self.size = 0
+        self.stones = frozenset()
+        self.turn = None
+
+    def _reset(self):
+        # 到达该节点的走法(x * size + y), 树根为-1
+        self.move = array("i")
+        self.parent = array("i")
+        # 第一个子节点及子节点数, 未展开时为-1和0
+        self.first = array("i")
+        self.count = array("i")
+        # 访问次数及到达该节点一方的累计收益(胜1, 平0.5, 负0)
+        self.visits = array("i")
+        self.value = array("d")
+
+    def add(self, move: int, parent: int, visits: int=0, value: float=0.0):
+        """添加节点, 返回其下标"""
+        self.move.append(move)
+        self.parent.append(parent)
+        self.first.append(-1)
+        self.count.append(0)
+        self.visits.append(visits)
+        self.value.append(value)
+        return len(self.move) - 1
+
+    def expand(self, node: int, moves: list):
+        """为node添加连续存放的子节点, moves为走法[(x, y)]"""
+        self.first[node] = len(self.move)
+        self.count[node] = len(moves)
+        for x, y in moves:
+            self.add(x * self.size + y, node)
+
+    def child(self, node: int, move: int):
+        """node下走法为move的子节点, 没有时返回-1"""
+        first = self.first[node]
+        for child in range(first, first + self.count[node]):
+            if self.move[child] == move:
+                return child
+        return -1
+
+    def attach(self, board: chessboard.ChessBoard, turn: Chess):
+        """让树根对应board上轮到turn落子的局面, 能由原来的树根走到时保留对应的子树, 否则清空
+        Returns:
+            保留的节点数
+        """
+        stones = frozenset((pt.x, pt.y, int(pt.chess)) for pt in board.stones)
+        node = -1
+        if len(self) and self.size == board.size and self.stones <= stones:
+            node = self._walk(stones - self.stones, int(turn))
+        if node > 0:
+            self._reroot(node)
+        elif node < 0:
+            self._reset()
+        if not len(self):
+            self.add(-1, -1)
+        self.size = board.size
+        self.stones = stones
+        self.turn = turn
+        return len(self) if node >= 0 else 0
+
+    def _walk(self, extra: set, target: int):
+        """从树根沿新增的棋子走下去, 同一方的棋子先后顺序不同时局面相同, 任取一条存在的路径
+        Returns:
+            到达的节点, 新增的棋子不能按双方交替的顺序走到或走到后不是轮到target时返回-1
+        """
+        node, turn = 0, int(self.turn)
+        extra = set(extra)
+        while extra:
+            best = -1
+            for x, y, chess in extra:
+                if chess != turn:
+                    continue
+                child = self.child(node, x * self.size + y)
+                if child >= 0 and (best < 0 or self.visits[child] > self.visits[best]):
+                    best, move = child, (x, y, chess)
+            if best < 0:
+                return -1
+            extra.discard(move)
+            node, turn = best, 3 - turn
+        return node if turn == target else -1
+
+    def _reroot(self, root: int):
+        """以root为新的树根, 按层复制其子树, 每个节点的子节点仍连续存放"""
+        move, first, count, visits, value = self.move, self.first, self.count, self.visits, self.value
+        self._reset()
+        self.add(-1, -1, visits[root], value[root])
+        queue = deque([(root, 0)])
+        while queue:
+            src, dst = queue.popleft()
+            if first[src] < 0:
+                continue
+            self.first[dst] = len(self.move)
+            self.count[dst] = count[src]
+            for child in range(first[src], first[src] + count[src]):
+                queue.append((child, self.add(move[child], dst, visits[child], value[child])))
+
+
+class MCTSSearcher(object):
+    """蒙特卡洛树搜索, search()接口与MinMaxSearcher一致
+    每次模拟: 从树根按UCT选择到叶子节点, 访问过的叶子节点按启发式分数展开最好的expand_k个走法,
+    然后双方模拟落子(先连五或堵四, 否则在最近两步周围随机落子)直到有一方连成五子或达到步数上限, 结果沿路径回传,
+    模拟中每一步只检查经过该步的四条线
+    """
+
+    def __init__(self, board: chessboard.ChessBoard, target: Chess, playouts: int=Config.MCTS_PLAYOUTS,
+                    max_nodes: int=Config.MCTS_MAX_NODES, exploration: float=Config.MCTS_EXPLORATION,
+                    expand_k: int=Config.MCTS_EXPAND_K, rollout_limit: int=Config.MCTS_ROLLOUT_LIMIT,
+                    tree: Optional[MCTSTree]=None, threat_search: bool=Config.THREAT_SEARCH,
+                    use_book: bool=Config.USE_OPENING_BOOK, book: Optional[opening_book.OpeningBook]=None,
+                    seed: Optional[int]=None, cancel: Optional[threading.Event]=None, **options):
+        """初始化
+        Args:
+            board: 棋盘
+            target: 角色, 黑棋或白棋
+            playouts: 每次搜索最多的模拟次数
+            max_nodes: 树的节点数上限, 达到后不再展开
+            exploration: UCT的探索系数
+            expand_k: 每个节点展开的候选走法数
+            rollout_limit: 每次模拟最多的步数, 达到时记为平局
+            tree: 搜索树, 传入时在多次搜索之间保留并复用子树, 不传时每次搜索新建
+            threat_search: 搜索前是否先算杀(VCF/VCT), 找到取胜序列时直接返回
+            use_book: 搜索前是否先查开局库, 命中时直接返回
+            book: 开局库, 不传时使用Config.OPENING_BOOK
+            seed: 模拟的随机种子
+            cancel: 取消事件, 设置后尽快返回当前的结果
+            options: 为与MinMaxSearcher的参数一致而接受(如tt, eval_cache, roi), 不使用
+        """
+        if playouts < 1 or expand_k < 1:
+            raise ValueError(f"Invalid playouts or expand_k: {playouts}, {expand_k}")
+        self._chessboard = board
+        self._target = target
+        self._army = Chess.BLACK if target == Chess.WHITE else Chess.WHITE
+        self._playouts = playouts
+        self._max_nodes = max_nodes
+        self._exploration = exploration
+        self._expand_k = expand_k
+        self._rollout_limit = rollout_limit
+        self.tree = tree
+        self._threat_search = threat_search
+        self._use_book = use_book
+        self._book = book
+        self._random = random.Random(seed)
+        self._cancel = cancel
+        # 最近一次搜索的模拟次数, 最常访问的路径的长度, 统计信息及主变例[Point]
+        self.playouts = 0
+        self.completed_depth = 0
+        self.stats = SearchStats()
+        self.pv = []
+
+    def search(self, max_depth: int=3, time_budget_ms: Optional[float]=None):
+        """模拟到次数上限、时间预算用完或被取消为止, 返回访问次数最多的走法
+        Args:
+            max_depth: 与MinMaxSearcher一致, 不限制搜索
+            time_budget_ms: 时间预算(毫秒), 不传则模拟到次数上限
+        Returns:
+            (分数, Point), 分数由胜率换算, 50%为0, 算杀找到的必胜为Score.MATE_BOUND
+        """
+        start = time.perf_counter()
+        self.playouts = 0
+        self.completed_depth = 0
+        self.pv = []
+        self.stats = SearchStats()
+        deadline = start + time_budget_ms / 1000 if time_budget_ms is not None else None
+        # 开局库及算杀也计入时间预算, 时间用完时跳过
+        in_time = lambda: deadline is None or time.perf_counter() < deadline
+        if self._use_book and in_time():
+            hit = opening_book.find_move(self._chessboard, self._target, self._book, self.stats)
+            if hit is not None:
+                self.stats.total_time = time.perf_counter() - start
+                self.pv = [hit[1]]
+                return hit
+        if self._threat_search and in_time():
+            move = threat.find_win(self._chessboard, self._target, self.stats, self._cancel, deadline)
+            if move is not None:
+                self.stats.total_time = time.perf_counter() - start
+                self.pv = [move]
+                return evaluate.Score.MATE_BOUND, move
+        if self.tree is None:
+            self.tree = MCTSTree()
+        self.tree.attach(self._chessboard, self._target)
+        self._open()
+        try:
+            while self.playouts < self._playouts:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if self._cancel is not None and self._cancel.is_set():
+                    break
+                self._simulate()
+                self.playouts += 1
+        finally:
+            self.stats.total_time = time.perf_counter() - start
+        return self._result()
+
+    def _open(self):
+        """由棋盘建立模拟用的一维棋盘"""
+        board = self._chessboard
+        size = board.size
+        width = size + 2 * PAD
+        self._size = size
+        self._width = width
+        cells = bytearray([BORDER]) * (width * width)
+        for x, row in enumerate(board.get_board()):
+            for y, value in enumerate(row):
+                cells[(x + PAD) * width + y + PAD] = value
+        self._cells = cells
+        self._inner = [(x + PAD) * width + y + PAD for x in range(size) for y in range(size)]
+        self._strides = (1, width, width + 1, width - 1)
+        self._ring = [dx * width + dy for dx in range(-ROLLOUT_RADIUS, ROLLOUT_RADIUS + 1)
+                        for dy in range(-ROLLOUT_RADIUS, ROLLOUT_RADIUS + 1) if dx or dy]
+        stones = board.stones
+        self._recent = [self._index(pt.x, pt.y) for pt in stones[-2:]]
+        # 根局面上双方再下一子即可连成五子的位置, 每次模拟从这里开始累积
+        fours = {Chess.BLACK: set(), Chess.WHITE: set()}
+        for pt in stones:
+            threats = self._threats(self._index(pt.x, pt.y), int(pt.chess))
+            if threats:
+                fours[pt.chess].update(threats)
+        self._fours = {chess: sorted(points) for chess, points in fours.items()}
+
+    def _index(self, x: int, y: int):
+        """棋盘坐标 -> 一维下标"""
+        return (x + PAD) * self._width + y + PAD
+
+    def _simulate(self):
+        """一次模拟: 选择, 展开, 随机模拟, 回传"""
+        tree, board, cells, stats = self.tree, self._chessboard, self._cells, self.stats
+        size = self._size
+        node, turn = 0, int(self._target)
+        path = [0]
+        recent = list(self._recent)
+        fours = {chess: list(points) for chess, points in self._fours.items()}
+        played = 0
+        try:
+            while board.winner is None:
+                if tree.first[node] < 0:
+                    # 访问过的叶子节点(及树根)展开后继续选择其第一个子节点
+                    if (node and not tree.visits[node]) or len(tree) >= self._max_nodes or \
+                            not self._expand(node, turn):
+                        break
+                node = self._select(node)
+                x, y = divmod(tree.move[node], size)
+                board.set(Point(x, y, Chess(turn)))
+                p = self._index(x, y)
+                cells[p] = turn
+                recent.append(p)
+                threats = self._threats(p, turn)
+                if threats:
+                    fours[turn] += threats
+                played += 1
+                path.append(node)
+                stats.nodes[len(path) - 1] += 1
+                turn = 3 - turn
+            winner = board.winner
+            if winner is None:
+                winner = self._rollout(turn, recent[-1] if recent else -1, recent[-2] if len(recent) > 1 else -1,
+                                        fours)
+        finally:
+            for _ in range(played):
+                pt = board.unset()
+                cells[self._index(pt.x, pt.y)] = Chess.EMPTY
+        stats.evaluations += 1
+        # 回传: 深度为奇数的节点由target走到
+        target = int(self._target)
+        for depth, node in enumerate(path):
+            tree.visits[node] += 1
+            if not winner:
+                tree.value[node] += 0.5
+            elif (winner == target) == (depth % 2 == 1):
+                tree.value[node] += 1
+
+    def _expand(self, node: int, turn: int):
+        """按启发式分数展开最好的expand_k个走法, 没有走法时返回False"""
+        moves = self._chessboard.get_candidates(Chess(turn), self._expand_k)
+        if not moves:
+            return False
+        self.tree.expand(node, moves)
+        self.stats.expanded += 1
+        self.stats.children += len(moves)
+        return True
+
+    def _select(self, node: int):
+        """UCT选择子节点, 未访问过的子节点按展开顺序优先"""
+        tree = self.tree
+        visits, value = tree.visits, tree.value
+        first = tree.first[node]
+        scale = self._exploration * math.sqrt(math.log(visits[node] or 1))
+        best, best_score = first, -1.0
+        for child in range(first, first + tree.count[node]):
+            n = visits[child]
+            if not n:
+                return child
+            score = value[child] / n + scale / math.sqrt(n)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def _rollout(self, turn: int, last: int, prev: int, fours: dict):
+        """模拟: 能连成五子时落在该处, 否则堵对方的四, 都没有时在最近两步周围随机落子
+        Args:
+            turn: 轮到落子的一方
+            last: 最后一步的下标, 没有时为-1
+            prev: 倒数第二步的下标, 没有时为-1
+            fours: 双方再下一子即可连成五子的位置{chess: [下标]}, 包括模拟开始时棋盘上已有的, 模拟中继续追加
+        Returns:
+            胜方, 达到步数上限或棋盘已满时返回0
+        """
+        cells, ring, rand = self._cells, self._ring, self._random.random
+        span = len(ring)
+        # fours由各自的落子累积, 使用时跳过已被占的
+        played = []
+        winner = 0
+        try:
+            for _ in range(self._rollout_limit):
+                p = -1
+                for q in fours[turn]:
+                    if not cells[q]:
+                        p = q
+                        break
+                if p < 0:
+                    for q in fours[3 - turn]:
+                        if not cells[q]:
+                            p = q
+                            break
+                # 在最近两步周围随机取点, 多次取到非空位置时从所有空位中选
+                for _ in range(ROLLOUT_TRIES if p < 0 else 0):
+                    anchor = prev if prev >= 0 and (last < 0 or rand() < 0.5) else last
+                    if anchor < 0:
+                        break
+                    q = anchor + ring[int(rand() * span)]
+                    if not cells[q]:
+                        p = q
+                        break
+                if p < 0:
+                    moves = [q for q in self._inner if not cells[q]]
+                    if not moves:
+                        break
+                    p = moves[int(rand() * len(moves))]
+                cells[p] = turn
+                played.append(p)
+                threats = self._threats(p, turn)
+                if threats is None:
+                    winner = turn
+                    break
+                fours[turn] += threats
+                last, prev = p, last
+                turn = 3 - turn
+        finally:
+            for p in played:
+                cells[p] = Chess.EMPTY
+        return winner
+
+    def _threats(self, p: int, chess: int):
+        """只检查经过p的四条线: chess一方已连成五子时返回None, 否则返回再下一子即可连成五子的空位"""
+        cells = self._cells
+        threats = []
+        for stride in self._strides:
+            q = p + stride
+            while cells[q] == chess:
+                q += stride
+            r = p - stride
+            while cells[r] == chess:
+                r -= stride
+            run = (q - r) // stride - 1
+            if run >= 5:
+                return None
+            # 连子一端的空位, 加上空位另一侧的连子后够五子(含xx_xx, x_xxx)
+            for end, step in ((q, stride), (r, -stride)):
+                if cells[end]:
+                    continue
+                count = run
+                t = end + step
+                while cells[t] == chess:
+                    count += 1
+                    t += step
+                if count >= 4:
+                    threats.append(end)
+        return threats
+
+    def _result(self):
+        """访问次数最多的走法及主变例"""
+        tree, size = self.tree, self._size
+        node, turn = 0, self._target
+        self.pv = []
+        score = None
+        while tree.first[node] >= 0:
+            first = tree.first[node]
+            best = max(range(first, first + tree.count[node]), key=lambda c: (tree.visits[c], tree.value[c]))
+            if not tree.visits[best]:
+                break
+            if node == 0:
+                # 胜率换算为分数: 50%为0, 100%为Score.LEVEL1, 不当作必胜
+                rate = tree.value[best] / tree.visits[best]
+                score = int(round((2 * rate - 1) * evaluate.Score.LEVEL1))
+            x, y = divmod(tree.move[best], size)
+            self.pv.append(Point(x, y, turn))
+            node, turn = best, (self._army if turn == self._target else self._target)
+        self.completed_depth = len(self.pv)
+        self.stats.completed_depth = self.completed_depth
+        if not self.pv:
+            return None, None
+        return score, self.pv[0]
@@ -4,75 +4,360 @@
 搜索算法的实现
 author: yooongchun@foxmail.com
 """
-from typing import Optional
+import threading
+import time
+from typing import Callable, Optional
+
+from gobang import chessboard
+from gobang import evaluate
+from gobang.config import Chess, Config, Point
+from gobang.strategy import opening_book, threat
+from gobang.strategy.eval_cache import EvalCache
+from gobang.strategy.ordering import MoveOrdering
+from gobang.strategy.stats import SearchStats
+from gobang.strategy.transposition import Bound, TranspositionTable, score_from_tt, score_to_tt
+
+
+class SearchTimeout(Exception):
+    """搜索超时, 用于从递归中退出"""
 
-import chessboard
-import evaluate
-from config import Chess, Point
 
 class MinMaxSearcher(object):
     """博弈树搜索"""
-    def __init__(self, board: chessboard.ChessBoard, target: Chess, roi: int=8):
+    def __init__(self, board: chessboard.ChessBoard, target: Chess, roi: int=8, incremental: bool=True,
+                    use_tt: bool=True, tt: Optional[TranspositionTable]=None, top_k: Optional[int]=None,
+                    on_node: Optional[Callable]=None, on_iteration: Optional[Callable]=None,
+                    threat_search: bool=Config.THREAT_SEARCH, use_book: bool=Config.USE_OPENING_BOOK,
+                    book: Optional[opening_book.OpeningBook]=None, eval_cache: Optional[EvalCache]=None,
+                    pvs: bool=True, aspiration: Optional[int]=Config.ASPIRATION_WINDOW,
+                    killers: bool=Config.KILLER_MOVES, history: bool=Config.HISTORY_HEURISTIC,
+                    cancel: Optional[threading.Event]=None):
         """初始化
         Args:
             board: 棋盘
             role: 角色, 黑棋或白棋
             roi: 搜索范围
+            incremental: 是否使用增量评估, 否则每个节点按roi重新扫描棋盘
+            use_tt: 是否使用置换表
+            tt: 置换表, 不传时新建一个, 传入时可在多次搜索间共享(需是同一角色)
+            top_k: 每个节点最多搜索的候选走法数量, 不传则搜索全部候选
+            on_node: 每访问一个节点时回调, 参数为(stats, 层数, 剩余深度)
+            on_iteration: 每完成一轮迭代时回调, 参数为stats
+            threat_search: 搜索前是否先算杀(VCF/VCT), 找到取胜序列时直接返回
+            use_book: 搜索前是否先查开局库, 命中时直接返回
+            book: 开局库, 不传时使用Config.OPENING_BOOK
+            eval_cache: 评估缓存, 传入时可在多次搜索及多局之间共享, 仅在增量评估时使用
+            pvs: 是否使用主变例搜索(PVS), 第一个走法之后的走法先用零窗口搜索
+            aspiration: 期望窗口的半径, 每轮迭代在此前同奇偶深度的分数附近搜索, None或0表示使用完整窗口
+            killers: 是否优先搜索同一层中引起剪枝的杀手走法
+            history: 是否按历史表(引起剪枝的次数)排序走法
+            cancel: 取消事件, 可在其他线程中设置, 之后搜索像超时一样尽快返回已完成的最深一轮的结果
         """
         self._target = target
         self._army = Chess.BLACK if target == Chess.WHITE else Chess.WHITE
         self._roi = roi
         self._chessboard = board
+        self._incremental = incremental
+        self._evaluator = None
+        self.tt = (tt if tt is not None else TranspositionTable()) if use_tt else None
+        self._top_k = top_k
         # 储存中间结果
         self._max_depth = -1
+        # 超时时间点, None表示不限时
+        self._deadline = None
+        # 上一轮迭代的最佳走法, 根节点优先搜索
+        self._root_move = None
+        # 指定的根节点走法, None时由棋盘生成
+        self._root_moves = None
+        # 最近一次搜索完成的深度
+        self.completed_depth = 0
+        # 最近一次搜索的统计信息
+        self.stats = SearchStats()
+        self._on_node = on_node
+        self._on_iteration = on_iteration
+        self._threat_search = threat_search
+        self._use_book = use_book
+        self._book = book
+        self.eval_cache = eval_cache
+        self._pvs = pvs
+        self._aspiration = aspiration
+        # 杀手走法及历史表, 根节点以外的节点按其排序
+        self._ordering = MoveOrdering(board.size, killers, history) if killers or history else None
+        self._cancel = cancel
+        # 最近一次搜索完成的最深一轮的主变例[Point], 从target的走法开始双方交替
+        self.pv = []
 
-    def _negetive_max(self, turn: bool, depth: int, pt:Optional[Point]=None,
-                    alpha: float=-float('inf'), beta: float=float('inf'), path=[]):
-        """递归搜索：返回最佳分数
+    def _evaluate(self, pt: Optional[Point]):
+        """局面评分"""
+        if self._evaluator is not None:
+            # 增量评估的结果只取决于局面, 可以按哈希缓存
+            cache = self.eval_cache
+            if cache is None:
+                return self._evaluator.get_score(self._target)
+            key = self._chessboard.hash
+            score = cache.get(key, self._target)
+            if score is None:
+                self.stats.eval_cache_misses += 1
+                score = self._evaluator.get_score(self._target)
+                cache.put(key, self._target, score)
+            else:
+                self.stats.eval_cache_hits += 1
+            return score
+        return evaluate.Evaluation(self._chessboard, self._target, self._roi, pt).get_score()
+
+    def _negetive_max(self, depth: int, alpha: float, beta: float, pv: list, pt: Optional[Point]=None):
+        """负极大值递归搜索, 分数总是相对于轮到落子的一方, 非主变例走法先用零窗口搜索
         Args:
-            turn: 上一步棋
-            depth: 递归深度
-            alpha: 上界
-            beta: 下界
+            depth: 剩余深度
+            alpha: 下界
+            beta: 上界
+            pv: 输出参数, 清空后填入从当前节点开始的主变例[Point]
+            pt: 上一步棋, 非增量评估时用于位置分
+        Returns:
+            轮到落子一方的分数, 不在(alpha, beta)内时只是边界(fail-soft)
         """
-        evaluater = evaluate.Evaluation(self._chessboard, self._target, self._roi, pt)
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
+        if self._cancel is not None and self._cancel.is_set():
+            raise SearchTimeout()
+        del pv[:]
+        stats = self.stats
+        ply = self._max_depth - depth
+        turn = self._target if ply % 2 == 0 else self._army
+        stats.nodes[ply] += 1
+        if self._on_node is not None:
+            self._on_node(stats, ply, depth)
+        # 如果结束则立马返回, 棋盘在落子时已由最后一步判断胜负, 胜负分高于所有形态分, 越快取胜越高
+        winner = self._chessboard.winner
+        if winner is not None:
+            mate = evaluate.Score.MATE - ply
+            return mate if winner == turn else -mate
         # 如果深度为零则返回
         if depth <= 0:
-            score = evaluater.get_score()
-            return score, pt
-        # 如果结束则立马返回
-        if evaluater.check_win():
-            print(f"win path: {path}")
-            return evaluate.Score.WIN, pt
-        # 产生新的走法
-        moves = self._chessboard.get_empty(neighbor_layer=2, shuffle=True)
+            return self._leaf(turn, pt)
+        # 查置换表, 主变例节点(窗口大于零)不直接返回, 保证主变例完整
+        alpha0 = alpha
+        pv_node = beta - alpha > 1
+        key = self._chessboard.hash
+        entry = self.tt.probe(key) if self.tt is not None else None
+        if entry is not None:
+            stats.tt_hits += 1
+        if entry is not None and entry.depth >= depth and depth < self._max_depth and not pv_node:
+            score = score_from_tt(entry.score, ply)
+            if entry.bound == Bound.EXACT or \
+                    (entry.bound == Bound.LOWER and score >= beta) or \
+                    (entry.bound == Bound.UPPER and score <= alpha):
+                stats.tt_cutoffs += 1
+                return score
+        # 产生新的走法, 按启发式分数排序使剪枝更早发生
+        start = time.perf_counter()
+        if depth == self._max_depth and self._root_moves is not None:
+            moves = list(self._root_moves)
+        else:
+            moves = self._get_moves(turn, ply, depth)
+        # 上一轮迭代的最佳走法及置换表中的最佳走法优先搜索
+        first = self._root_move if depth == self._max_depth else (entry.move if entry is not None else None)
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        stats.movegen_time += time.perf_counter() - start
+        if not moves:
+            # 棋盘已满
+            return self._leaf(turn, pt)
+        if depth == 1:
+            self._prefetch(turn, moves)
+        stats.expanded += 1
         # 遍历每一个候选步
-        best_move = None
-        for i, j in moves:
+        best_score, best_move = -float('inf'), None
+        child_pv = []
+        for index, (i, j) in enumerate(moves):
+            stats.children += 1
             # 标记当前走法
-            pt = Point(i, j, self._target if turn else self._army)
+            pt = Point(i, j, turn)
             self._chessboard.set(pt)
-            score, _ = self._negetive_max(not turn, depth - 1, pt, alpha, beta, path + [(i,j)])
-            # 清除当前走法
-            self._chessboard.unset()
-            best_move = pt
+            try:
+                if index == 0 or not self._pvs:
+                    score = -self._negetive_max(depth - 1, -beta, -alpha, child_pv, pt)
+                else:
+                    # 零窗口验证该走法不优于当前最佳, 否则用完整窗口重新搜索
+                    score = -self._negetive_max(depth - 1, -alpha - 1, -alpha, child_pv, pt)
+                    if alpha < score < beta:
+                        stats.researches += 1
+                        score = -self._negetive_max(depth - 1, -beta, -alpha, child_pv, pt)
+            finally:
+                # 清除当前走法, 超时退出时同样需要恢复棋盘
+                self._chessboard.unset()
             # 计算最好分值的走法
-            if turn and score > alpha : # 当前为Max节点
-                alpha = score
-                # alpha + beta剪枝点
-                if score >= beta:
+            if score > best_score:
+                best_score, best_move = score, pt
+                if score > alpha:
+                    alpha = score
+                    pv[:] = [pt] + child_pv
+                    # alpha + beta剪枝点
+                    if score >= beta:
+                        stats.cutoffs += 1
+                        stats.cutoff_index[index] += 1
+                        if self._ordering is not None:
+                            self._ordering.update((i, j), ply, turn, depth)
+                        break
+        if self.tt is not None:
+            if best_score <= alpha0:
+                bound = Bound.UPPER
+            elif best_score >= beta:
+                bound = Bound.LOWER
+            else:
+                bound = Bound.EXACT
+            self.tt.store(key, depth, bound, score_to_tt(best_score, ply), (best_move.x, best_move.y))
+        return best_score
+
+    def _get_moves(self, turn: Chess, ply: int, depth: int):
+        """候选走法, 按启发式分数排序, 根节点以外再按杀手走法及历史表调整
+        Args:
+            turn: 轮到落子的一方
+            ply: 距根节点的步数
+            depth: 剩余深度
+        """
+        if self._ordering is not None and ply > 0:
+            moves = self._chessboard.get_candidates(turn, self._top_k, self._ordering.tiebreak(turn))
+            return self._ordering.order(moves, ply)
+        return self._chessboard.get_candidates(turn, self._top_k)
+
+    def _prefetch(self, turn: Chess, moves: list):
+        """剩余深度为1的节点在搜索子节点之前调用, 子节点都是叶子节点, 子类可在此一次评估所有子节点"""
+
+    def _leaf(self, turn: Chess, pt: Optional[Point]):
+        """叶子节点评分, 相对于轮到落子的一方"""
+        start = time.perf_counter()
+        score = self._evaluate(pt)
+        self.stats.eval_time += time.perf_counter() - start
+        self.stats.evaluations += 1
+        return score if turn == self._target else -score
+
+    def _search_root(self, depth: int, guess: Optional[float]):
+        """搜索根节点, 有预期分数时先在其附近的期望窗口内搜索, 落在窗口外时放宽窗口重新搜索
+        Args:
+            depth: 搜索深度
+            guess: 预期分数, 即上上一轮迭代的分数
+        Returns:
+            (分数, 主变例[Point])
+        """
+        pv = []
+        window = self._aspiration
+        if not window or guess is None or abs(guess) >= evaluate.Score.WIN:
+            return self._negetive_max(depth, -float('inf'), float('inf'), pv), pv
+        alpha, beta = guess - window, guess + window
+        while True:
+            score = self._negetive_max(depth, alpha, beta, pv)
+            if alpha < score < beta:
+                return score, pv
+            self.stats.aspiration_fails += 1
+            # 每次失败窗口放大4倍, 超过胜负分后不再限制
+            window *= 4
+            if score <= alpha:
+                alpha = guess - window if window < evaluate.Score.WIN else -float('inf')
+            else:
+                beta = guess + window if window < evaluate.Score.WIN else float('inf')
+
+    def search(self, max_depth:int=3, time_budget_ms:Optional[float]=None):
+        """迭代加深搜索, 从深度1开始逐层加深, 每一轮优先搜索上一轮的最佳走法
+        Args:
+            max_depth: 最大递归深度
+            time_budget_ms: 时间预算(毫秒), 用完后返回已完成的最深一轮的结果, 不传则搜索到max_depth
+        """
+        start = time.perf_counter()
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = start + time_budget_ms / 1000
+        score, move = None, None
+        self._root_move = None
+        self.completed_depth = 0
+        self.pv = []
+        self.stats = SearchStats()
+        # 开局库及算杀也计入时间预算, 时间用完时跳过, 直接进入不限时的第一轮
+        if self._use_book and (deadline is None or time.perf_counter() < deadline):
+            hit = opening_book.find_move(self._chessboard, self._target, self._book, self.stats)
+            if hit is not None:
+                self.stats.total_time = time.perf_counter() - start
+                return hit
+        if self._threat_search and (deadline is None or time.perf_counter() < deadline):
+            move = threat.find_win(self._chessboard, self._target, self.stats, self._cancel, deadline)
+            if move is not None:
+                self.stats.total_time = time.perf_counter() - start
+                return evaluate.Score.MATE_BOUND, move
+        # 每一轮迭代的分数, 深度奇偶不同时分数差别很大, 期望窗口以上上一轮的分数为中心
+        scores = []
+        self._open()
+        try:
+            for depth in range(1, max_depth + 1):
+                self._max_depth = depth
+                # 第一轮不限时, 保证总有可用的走法(被取消时除外)
+                self._deadline = deadline if depth > 1 else None
+                try:
+                    score, pv = self._search_root(depth, scores[-2] if len(scores) >= 2 else None)
+                except SearchTimeout:
+                    break
+                self.completed_depth = depth
+                scores.append(score)
+                self.pv = pv
+                move = pv[0] if pv else None
+                self._root_move = (move.x, move.y) if move else None
+                self._finish_iteration(depth, start)
+                # 已证明胜负(不是形态的启发式分数)或者时间用完则不再加深
+                if evaluate.is_mate(score):
                     break
-            elif not turn and score < beta: # 当前节点为MIN节点
-                beta = score
-                # alpha + beta剪枝点
-                if score <= alpha:
+                if deadline is not None and time.perf_counter() >= deadline:
                     break
-        if turn:
-            return alpha, best_move
-        return beta, best_move
-
-    def search(self, max_depth:int=3):
-        """最大递归深度"""
-        self._max_depth = max_depth
-        score, move = self._negetive_max(True, max_depth)
+        finally:
+            self.stats.total_time = time.perf_counter() - start
+            self._close()
         return score, move
+
+    def _finish_iteration(self, depth: int, start: float):
+        """记录完成的一轮迭代"""
+        self.stats.completed_depth = depth
+        self.stats.iterations.append((depth, self.stats.total_nodes, time.perf_counter() - start))
+        if self._on_iteration is not None:
+            self._on_iteration(self.stats)
+
+    def search_moves(self, moves: list, depth: int, time_budget_ms:Optional[float]=None):
+        """在固定深度下按给定顺序只搜索根节点的这些走法, 超时返回(None, None)
+        用于把根节点的走法分给多个进程并行搜索, 分数相同时取顺序靠前的走法
+        Args:
+            moves: 根节点走法[(x, y)]
+            depth: 搜索深度
+            time_budget_ms: 时间预算(毫秒)
+        """
+        start = time.perf_counter()
+        self._max_depth = depth
+        self._root_moves = moves
+        if time_budget_ms is not None:
+            self._deadline = start + time_budget_ms / 1000
+        self.stats = SearchStats()
+        self.pv = []
+        self._open()
+        try:
+            score, pv = self._search_root(depth, None)
+        except SearchTimeout:
+            return None, None
+        finally:
+            self.stats.total_time = time.perf_counter() - start
+            self._root_moves = None
+            self._close()
+        self.completed_depth = depth
+        self.pv = pv
+        self._finish_iteration(depth, start)
+        return score, pv[0] if pv else None
+
+    def _open(self):
+        """搜索开始前的准备"""
+        if self._ordering is not None:
+            self._ordering.clear()
+        if self._incremental:
+            self._evaluator = evaluate.IncrementalEvaluation(self._chessboard)
+
+    def _close(self):
+        """搜索结束后的清理"""
+        self._deadline = None
+        if self._evaluator is not None:
+            self._evaluator.close()
+            self._evaluator = None
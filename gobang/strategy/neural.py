@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+神经网络评估: 小型卷积网络同时输出局面价值及每个位置的走法logit, 在CPU上批量推理
+torch是可选依赖, 未安装时仍可导入本模块, 创建NeuralEvaluator时才报错
+author: yooongchun@foxmail.com
+"""
+import argparse
+import os
+import random
+import time
+import warnings
+from typing import Optional
+
+import numpy as np
+
+from gobang import batch_evaluate
+from gobang import chessboard
+from gobang import evaluate
+from gobang.config import Chess, Config, Point
+from gobang.strategy.min_max_tree import MinMaxSearcher
+
+try:
+    import torch
+    from torch import nn
+except ImportError:
+    torch = None
+
+
+def encode(boards: np.ndarray, sides: np.ndarray):
+    """编码为网络输入
+    Args:
+        boards: (N, n, n)的棋盘, 取值为Chess
+        sides: (N,)评估的一方
+    Returns:
+        (N, 3, n, n)的float32: 评估一方的棋子, 对方的棋子, 全1(卷积补零后可分辨棋盘边缘)
+    """
+    boards = np.asarray(boards)
+    sides = np.asarray(sides)
+    own = boards == sides[:, None, None]
+    planes = np.empty((len(boards), 3) + boards.shape[1:], dtype=np.float32)
+    planes[:, 0] = own
+    planes[:, 1] = (boards != Chess.EMPTY) & ~own
+    planes[:, 2] = 1
+    return planes
+
+
+if torch is not None:
+    class PolicyValueNet(nn.Module):
+        """全卷积的价值/策略网络, 与棋盘大小无关
+        主干为若干层3x3卷积, 策略头用1x1卷积输出每个位置的logit,
+        价值头用1x1卷积后全局平均池化, 经全连接层输出[-1, 1]内的价值
+        """
+
+        def __init__(self, channels: int=Config.NEURAL_CHANNELS, blocks: int=Config.NEURAL_BLOCKS):
+            super().__init__()
+            layers = [nn.Conv2d(3, channels, 3, padding=1), nn.ReLU(inplace=True)]
+            for _ in range(blocks - 1):
+                layers += [nn.Conv2d(channels, channels, 3, padding=1), nn.ReLU(inplace=True)]
+            self.trunk = nn.Sequential(*layers)
+            self.policy = nn.Conv2d(channels, 1, 1)
+            self.value = nn.Sequential(nn.Conv2d(channels, channels, 1), nn.ReLU(inplace=True),
+                                        nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(channels, 1), nn.Tanh())
+
+        def forward(self, x):
+            """返回(价值(N,), 走法logit(N, n*n))"""
+            h = self.trunk(x)
+            return self.value(h).squeeze(1), self.policy(h).flatten(1)
+
+
+class NeuralEvaluator(object):
+    """在CPU上批量推理的价值/策略网络, 分数与Evaluation一致为相对于评估一方的整数"""
+
+    def __init__(self, model: Optional[str]=Config.NEURAL_MODEL, channels: int=Config.NEURAL_CHANNELS,
+                    blocks: int=Config.NEURAL_BLOCKS, batch_size: int=Config.NEURAL_BATCH_SIZE,
+                    threads: Optional[int]=None):
+        """初始化
+        Args:
+            model: 权重文件(torch.save保存的state_dict), 不存在时随机初始化
+            channels: 卷积通道数, 需与权重一致
+            blocks: 主干的卷积层数, 需与权重一致
+            batch_size: 每次推理的最大局面数, 更多的局面分批推理
+            threads: torch的线程数, 不传时使用torch的默认值
+        """
+        if torch is None:
+            raise ImportError("NeuralEvaluator requires torch, install it with `pip install torch`")
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: {batch_size}")
+        self.net = PolicyValueNet(channels, blocks)
+        if model and os.path.exists(model):
+            self.net.load_state_dict(torch.load(model, map_location="cpu"))
+        else:
+            warnings.warn(f"Neural model {model} not found, using random weights")
+        self.net.eval()
+        if threads:
+            torch.set_num_threads(threads)
+        self.batch_size = batch_size
+        # 推理次数及推理的局面数
+        self.calls = 0
+        self.positions = 0
+
+    def infer(self, boards: np.ndarray, sides: np.ndarray):
+        """批量推理, 超过batch_size时分批
+        Args:
+            boards: (N, n, n)的棋盘
+            sides: (N,)评估的一方
+        Returns:
+            (价值(N,), 走法logit(N, n*n)), 价值相对于评估的一方
+        """
+        planes = encode(boards, sides)
+        count, size = planes.shape[0], planes.shape[2]
+        if not count:
+            return np.zeros(0, dtype=np.float32), np.zeros((0, size * size), dtype=np.float32)
+        values, logits = [], []
+        with torch.inference_mode():
+            for start in range(0, count, self.batch_size):
+                value, logit = self.net(torch.from_numpy(planes[start:start + self.batch_size]))
+                values.append(value.numpy())
+                logits.append(logit.numpy())
+                self.calls += 1
+        self.positions += count
+        return np.concatenate(values), np.concatenate(logits)
+
+    def scores(self, boards: np.ndarray, sides: np.ndarray):
+        """批量评分, 价值按Config.NEURAL_VALUE_SCALE换算为整数分数"""
+        values, _ = self.infer(boards, sides)
+        return np.rint(values * Config.NEURAL_VALUE_SCALE).astype(np.int64)
+
+    def get_score(self, board: chessboard.ChessBoard, target: Chess):
+        """单个局面的评分, 相对于target, 可代替Evaluation.get_score"""
+        return int(self.scores(np.asarray(board.get_board())[None], np.asarray([target]))[0])
+
+    def order_moves(self, board: chessboard.ChessBoard, chess: Chess, moves: Optional[list]=None):
+        """按策略头的logit从高到低排列走法
+        Args:
+            board: 棋盘
+            chess: 轮到落子的一方
+            moves: 走法[(x, y)], 不传时为ChessBoard.get_empty的有邻居的空位置
+        """
+        if moves is None:
+            moves = board.get_empty(Config.NEIGHBOR_LAYER, shuffle=False)
+        if len(moves) <= 1:
+            return list(moves)
+        _, logits = self.infer(np.asarray(board.get_board())[None], np.asarray([chess]))
+        logits = logits[0]
+        size = board.size
+        return sorted(moves, key=lambda move: (-logits[move[0] * size + move[1]], move))
+
+
+class NeuralSearcher(MinMaxSearcher):
+    """用神经网络评估叶子节点的博弈树搜索
+    剩余深度为1的节点先把所有子节点(都是叶子节点)放在一批中推理, 子节点评分时直接取结果,
+    剩余深度不小于2的节点按策略头排列候选走法, 其余与MinMaxSearcher一致
+    """
+
+    def __init__(self, board: chessboard.ChessBoard, target: Chess, evaluator: Optional[NeuralEvaluator]=None,
+                    **options):
+        """初始化
+        Args:
+            board: 棋盘
+            target: 角色, 黑棋或白棋
+            evaluator: 神经网络评估, 不传时新建一个, 传入时可在多次搜索间共享
+            options: MinMaxSearcher的参数, incremental及eval_cache不使用
+        """
+        options["incremental"] = False
+        options.pop("eval_cache", None)
+        super().__init__(board, target, **options)
+        self.evaluator = evaluator if evaluator is not None else NeuralEvaluator()
+        self._zobrist = chessboard.zobrist_keys(board.size)
+        # 最近一个剩余深度为1的节点的子节点评分: 局面哈希 -> 相对于target的分数
+        self._leaf_scores = {}
+
+    def _get_moves(self, turn: Chess, ply: int, depth: int):
+        """剩余深度为1时子节点一起评估, 沿用启发式排序, 否则按策略头排列ChessBoard.get_empty的走法"""
+        if depth <= 1:
+            return super()._get_moves(turn, ply, depth)
+        moves = self.evaluator.order_moves(self._chessboard, turn)
+        if self._top_k:
+            moves = moves[:self._top_k]
+        if self._ordering is not None and ply > 0:
+            moves = self._ordering.order(moves, ply)
+        return moves
+
+    def _prefetch(self, turn: Chess, moves: list):
+        """把所有子节点放在一批中推理, 结果按子节点的局面哈希保存"""
+        base = np.asarray(self._chessboard.get_board())
+        boards = np.repeat(base[None], len(moves), axis=0)
+        xs, ys = zip(*moves)
+        boards[np.arange(len(moves)), xs, ys] = turn
+        scores = self.evaluator.scores(boards, np.full(len(moves), int(self._target)))
+        key, zobrist = self._chessboard.hash, self._zobrist
+        self._leaf_scores = {key ^ zobrist[x][y][turn]: score for (x, y), score in zip(moves, scores.tolist())}
+
+    def _evaluate(self, pt: Optional[Point]):
+        """局面评分, 相对于target, 优先使用批量推理的结果"""
+        score = self._leaf_scores.get(self._chessboard.hash)
+        if score is not None:
+            return score
+        return self.evaluator.get_score(self._chessboard, self._target)
+
+
+def sample_positions(count: int, size: int=Config.SIZE, seed: int=0, max_moves: int=40):
+    """随机对局中的局面, 双方在启发式最好的3个走法中随机选择, 返回(棋盘(N, n, n), 轮到落子的一方(N,))"""
+    rand = random.Random(seed)
+    boards, sides = [], []
+    while len(boards) < count:
+        board = chessboard.ChessBoard(size=size)
+        turn = Chess.BLACK
+        for _ in range(rand.randint(1, max_moves)):
+            x, y = rand.choice(board.get_candidates(turn, 3))
+            board.set(Point(x, y, turn))
+            turn = Chess.WHITE if turn == Chess.BLACK else Chess.BLACK
+            if board.winner is not None:
+                break
+        boards.append(np.array(board.get_board(), dtype=np.uint8))
+        sides.append(int(turn))
+    return np.stack(boards), np.asarray(sides, dtype=np.uint8)
+
+
+def bench(boards: np.ndarray, sides: np.ndarray, batch_sizes: list, evaluator: Optional[NeuralEvaluator]=None):
+    """每秒评估的局面数: 逐个局面的Evaluation, 各批大小下的向量化形态评估及神经网络评估(需要torch)"""
+    results = []
+    start = time.perf_counter()
+    for board, side in zip(boards, sides):
+        evaluate.Evaluation(chessboard.ChessBoard(board.tolist(), len(board)), Chess(side)).get_score(min_max=True)
+    elapsed = time.perf_counter() - start
+    results.append({"evaluator": "pattern", "batch": 1, "positions_per_sec": len(boards) / elapsed})
+    for batch in batch_sizes:
+        start = time.perf_counter()
+        for k in range(0, len(boards), batch):
+            batch_evaluate.evaluate_batch(boards[k:k + batch], sides[k:k + batch])
+        elapsed = time.perf_counter() - start
+        results.append({"evaluator": "pattern-batch", "batch": batch, "positions_per_sec": len(boards) / elapsed})
+    if evaluator is None:
+        return results
+    for batch in batch_sizes:
+        evaluator.batch_size = batch
+        start = time.perf_counter()
+        evaluator.infer(boards, sides)
+        elapsed = time.perf_counter() - start
+        results.append({"evaluator": "neural", "batch": batch, "positions_per_sec": len(boards) / elapsed})
+    return results
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Positions/sec of the neural and pattern evaluators")
+    parser.add_argument("-n", "--positions", type=int, default=1024, help="number of sampled positions")
+    parser.add_argument("-s", "--size", type=int, default=Config.SIZE, help="board size")
+    parser.add_argument("-b", "--batch-sizes", type=int, nargs="*", default=[1, 8, 32, 128, 512],
+                        help="batch sizes to measure")
+    parser.add_argument("-m", "--model", default=Config.NEURAL_MODEL, help="neural model weights")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the sampled positions")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    """主函数入口"""
+    args = parse_args()
+    boards, sides = sample_positions(args.positions, args.size, args.seed)
+    evaluator = None
+    if torch is None:
+        print("torch is not installed, only the pattern evaluators are measured")
+    else:
+        evaluator = NeuralEvaluator(args.model, threads=args.threads)
+    for result in bench(boards, sides, args.batch_sizes, evaluator):
+        print(f"{result['evaluator']:>14} batch={result['batch']:<5} {result['positions_per_sec']:.0f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
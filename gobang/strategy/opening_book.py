@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+开局库: 以规范化局面哈希为键的紧凑二进制文件, 查找时内存映射后二分查找
+棋盘的8种对称(旋转及翻转)折叠为同一个键, 走法按规范化后的方向储存
+author: yooongchun@foxmail.com
+"""
+import functools
+import mmap
+import os
+import struct
+from typing import Optional
+
+from gobang import chessboard
+from gobang.config import Chess, Config, Point
+
+# 文件头: 魔数, 版本, 棋盘大小, 条目数
+MAGIC = b"GBOB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+# 条目: 局面哈希, 走法(x, y), 分数, 权重(搜索深度或对局次数), 按(哈希, -权重, -分数)排序
+ENTRY = struct.Struct("<QBBhH")
+
+
+def symmetries(size: int):
+    """8种对称变换, 第0种为恒等变换"""
+    n = size - 1
+    return (
+        lambda x, y: (x, y),
+        lambda x, y: (y, n - x),
+        lambda x, y: (n - x, n - y),
+        lambda x, y: (n - y, x),
+        lambda x, y: (y, x),
+        lambda x, y: (n - x, y),
+        lambda x, y: (x, n - y),
+        lambda x, y: (n - y, n - x),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _inverses(size: int):
+    """每种对称变换的逆变换的序号"""
+    transforms = symmetries(size)
+    probes = [(0, 1), (2, 5)]
+    inverses = []
+    for t in transforms:
+        for k, u in enumerate(transforms):
+            if all(u(*t(x, y)) == (x, y) for x, y in probes):
+                inverses.append(k)
+                break
+    return inverses
+
+
+def canonical(stones: list, size: int):
+    """局面的规范化哈希: 8种对称变换下Zobrist哈希的最小值
+    Args:
+        stones: 棋子[(x, y, chess)]
+        size: 棋盘大小
+    Returns:
+        (哈希, 取得最小值的变换序号)
+    """
+    keys = chessboard.zobrist_keys(size)
+    transforms = symmetries(size)
+    hashes = [0] * len(transforms)
+    for x, y, chess in stones:
+        for k, t in enumerate(transforms):
+            i, j = t(x, y)
+            hashes[k] ^= keys[i][j][chess]
+    key = min(hashes)
+    return key, hashes.index(key)
+
+
+def board_key(board: chessboard.ChessBoard):
+    """棋盘的规范化哈希及变换序号"""
+    return canonical([(pt.x, pt.y, int(pt.chess)) for pt in board.stones], board.size)
+
+
+class OpeningBook(object):
+    """只读的开局库, 文件以mmap打开, 查找只读取二分路径上的条目"""
+
+    def __init__(self, path: str):
+        """初始化
+        Args:
+            path: 开局库文件
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.count = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Invalid opening book: {path}")
+        if len(self._data) != HEADER.size + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f"Truncated opening book: {path}")
+
+    def close(self):
+        """关闭文件"""
+        self._data.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key_at(self, index: int):
+        return struct.unpack_from("<Q", self._data, HEADER.size + index * ENTRY.size)[0]
+
+    def _find(self, key: int):
+        """第一个哈希不小于key的条目序号"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, board: chessboard.ChessBoard):
+        """查找当前局面的全部走法, 已转换回棋盘的方向
+        Returns:
+            [((x, y), 分数, 权重)], 好的走法在前, 不在库中时为空
+        """
+        if board.size != self.size:
+            return []
+        key, k = board_key(board)
+        inverse = symmetries(self.size)[_inverses(self.size)[k]]
+        moves = []
+        index = self._find(key)
+        while index < self.count:
+            entry_key, x, y, score, weight = ENTRY.unpack_from(self._data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((inverse(x, y), score, weight))
+            index += 1
+        return moves
+
+    def probe(self, board: chessboard.ChessBoard):
+        """当前局面的最佳走法, 不在库中或该点已有棋子时返回None"""
+        for (x, y), score, _ in self.lookup(board):
+            if board.is_empty(Point(x, y)):
+                return (x, y), score
+        return None
+
+
+class OpeningBookWriter(object):
+    """收集局面及走法并写出开局库文件"""
+
+    def __init__(self, size: int=Config.SIZE):
+        self.size = size
+        # 规范化哈希 -> {规范化方向的走法: [分数, 权重]}
+        self.entries = {}
+
+    def add(self, board: chessboard.ChessBoard, move: tuple, score: int, weight: int=1):
+        """加入一个局面的走法, 同一局面同一走法再次加入时权重累加, 分数取平均"""
+        key, k = board_key(board)
+        move = symmetries(self.size)[k](*move)
+        moves = self.entries.setdefault(key, {})
+        if move in moves:
+            old_score, old_weight = moves[move]
+            total = old_weight + weight
+            moves[move] = [(old_score * old_weight + score * weight) // total, total]
+        else:
+            moves[move] = [score, weight]
+
+    def merge(self, book: OpeningBook):
+        """并入已有开局库中的全部条目"""
+        for index in range(book.count):
+            key, x, y, score, weight = ENTRY.unpack_from(book._data, HEADER.size + index * ENTRY.size)
+            self.entries.setdefault(key, {})[(x, y)] = [score, weight]
+
+    def write(self, path: str):
+        """写出文件, 先写临时文件再替换, 避免读取到写了一半的文件"""
+        rows = []
+        for key, moves in self.entries.items():
+            for (x, y), (score, weight) in moves.items():
+                score = max(-0x8000, min(0x7fff, int(score)))
+                rows.append((key, -min(weight, 0xffff), -score, x, y))
+        rows.sort()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.size, len(rows)))
+            for key, weight, score, x, y in rows:
+                f.write(ENTRY.pack(key, x, y, -score, -weight))
+        os.replace(tmp, path)
+        return len(rows)
+
+
+@functools.lru_cache(maxsize=None)
+def default_book(path: str=Config.OPENING_BOOK):
+    """默认的开局库, 文件不存在时返回None, 同一进程中只打开一次"""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def find_move(board: chessboard.ChessBoard, target: Chess, book: Optional[OpeningBook]=None, stats=None):
+    """在开局库中查找target一方的走法
+    Args:
+        board: 棋盘
+        target: 角色, 需是轮到落子的一方(黑棋先手)
+        book: 开局库, 不传时使用默认的开局库
+        stats: SearchStats, 传入时累计命中次数
+    Returns:
+        (分数, Point), 不在库中时返回None
+    """
+    if book is None:
+        book = default_book()
+    if book is None or (len(board.stones) % 2 == 0) != (target == Chess.BLACK):
+        return None
+    hit = book.probe(board)
+    if hit is None:
+        return None
+    if stats is not None:
+        stats.book_hits += 1
+    (x, y), score = hit
+    return score, Point(x, y, target)
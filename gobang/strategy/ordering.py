@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+走法排序: 杀手走法及历史启发, 让在兄弟节点中引起剪枝的走法优先搜索
+author: yooongchun@foxmail.com
+"""
+from gobang.config import Chess
+
+
+class MoveOrdering(object):
+    """一次搜索中在节点之间共享的走法排序信息
+    杀手走法: 每一层最近引起剪枝的走法, 在同一层的其他节点中优先尝试
+    历史表: 按(角色, 位置)累计引起剪枝的次数, 按剩余深度的平方加权, 启发式分数相同时历史分数高的在前
+    """
+
+    def __init__(self, size: int, killers: bool=True, history: bool=True, slots: int=2):
+        """初始化
+        Args:
+            size: 棋盘大小
+            killers: 是否使用杀手走法
+            history: 是否使用历史表
+            slots: 每一层保留的杀手走法数量
+        """
+        self.size = size
+        self.use_killers = killers
+        self.use_history = history
+        self.slots = slots
+        self.clear()
+
+    def clear(self):
+        """清空杀手走法及历史表, 每次搜索开始时调用"""
+        # 层数 -> 杀手走法[(x, y)], 最新的在前
+        self.killers = {}
+        # 角色 -> 棋盘大小的历史分数表
+        self.history = {chess: [[0] * self.size for _ in range(self.size)] for chess in (Chess.BLACK, Chess.WHITE)}
+
+    def tiebreak(self, chess: Chess):
+        """chess一方的历史表, 作为启发式分数相同时的次序传给ChessBoard.get_candidates, 未启用时返回None"""
+        return self.history[chess] if self.use_history else None
+
+    def order(self, moves: list, ply: int):
+        """把这一层的杀手走法提到最前面, 其余走法保持原来的顺序
+        Args:
+            moves: 候选走法[(x, y)]
+            ply: 距根节点的步数
+        """
+        if self.use_killers:
+            for killer in reversed(self.killers.get(ply, ())):
+                if killer in moves:
+                    moves.remove(killer)
+                    moves.insert(0, killer)
+        return moves
+
+    def update(self, move: tuple, ply: int, chess: Chess, depth: int):
+        """记录引起剪枝的走法
+        Args:
+            move: 走法(x, y)
+            ply: 距根节点的步数
+            chess: 走这一步的一方
+            depth: 剩余深度
+        """
+        if self.use_killers:
+            slots = self.killers.setdefault(ply, [])
+            if move in slots:
+                slots.remove(move)
+            slots.insert(0, move)
+            del slots[self.slots:]
+        if self.use_history:
+            self.history[chess][move[0]][move[1]] += depth * depth
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+多进程并行搜索: 根节点的候选走法分给进程池中的多个进程
+author: yooongchun@foxmail.com
+"""
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Optional
+
+from gobang import chessboard
+from gobang import evaluate
+from gobang.config import Chess, Config, Point
+from gobang.strategy import flat_search, min_max_tree, opening_book, threat
+from gobang.strategy.stats import SearchStats
+
+
+def _search_worker(stones: list, size: int, target: int, moves: list, depth: int,
+                    time_budget_ms: Optional[float], options: dict):
+    """子进程: 按落子顺序重放stones([(x, y, chess)])复原棋盘后在固定深度下搜索分到的根节点走法"""
+    board = chessboard.replay([Point(x, y, Chess(chess)) for x, y, chess in stones], size)
+    options = dict(options)
+    low_alloc = options.pop("low_alloc", Config.LOW_ALLOC_SEARCH)
+    searcher_cls = flat_search.FlatSearcher if low_alloc else min_max_tree.MinMaxSearcher
+    searcher = searcher_cls(board, Chess(target), **options)
+    score, move = searcher.search_moves(moves, depth, time_budget_ms)
+    return score, (move.x, move.y) if move else None, searcher.stats
+
+
+class ParallelSearcher(object):
+    """根节点并行的博弈树搜索
+    每一轮迭代加深时把根节点的候选走法轮流分给各个进程, 每个进程独立搜索并返回其中的最佳走法,
+    汇总时取分数最高、顺序最靠前的走法, 因此结果与单进程的MinMaxSearcher在相同深度下一致
+    """
+
+    def __init__(self, board: chessboard.ChessBoard, target: Chess, workers: int=Config.SEARCH_WORKERS,
+                    executor: Optional[Executor]=None, on_iteration: Optional[Callable]=None, **options):
+        """初始化
+        Args:
+            board: 棋盘
+            target: 角色, 黑棋或白棋
+            workers: 进程数
+            executor: 进程池, 传入时可在多次搜索间复用, 否则每次搜索新建
+            on_iteration: 每完成一轮迭代时回调, 参数为汇总后的stats
+            options: 传给每个进程中MinMaxSearcher的参数, 如roi, top_k, use_tt,
+                另外low_alloc为True时子进程使用低分配的FlatSearcher
+        """
+        if workers < 1:
+            raise ValueError(f"Invalid workers: {workers}")
+        self._chessboard = board
+        self._target = target
+        self._workers = workers
+        self._executor = executor
+        self._options = options
+        # 开局库在主进程中查找, 评估缓存无法在进程间共享, 都不传给子进程
+        self._worker_options = {key: value for key, value in options.items()
+                                    if key not in ("use_book", "book", "eval_cache")}
+        self._on_iteration = on_iteration
+        # 最近一次搜索完成的深度
+        self.completed_depth = 0
+        # 最近一次搜索各进程汇总的统计信息
+        self.stats = SearchStats()
+
+    def search(self, max_depth:int=3, time_budget_ms:Optional[float]=None):
+        """迭代加深搜索, 与MinMaxSearcher.search接口一致"""
+        start = time.perf_counter()
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = start + time_budget_ms / 1000
+        stones = [(pt.x, pt.y, int(pt.chess)) for pt in self._chessboard.stones]
+        size = self._chessboard.size
+        score, move = None, None
+        self.completed_depth = 0
+        self.stats = SearchStats()
+        # 开局库及算杀也计入时间预算, 时间用完时跳过, 直接进入不限时的第一轮
+        in_time = lambda: deadline is None or time.perf_counter() < deadline
+        if self._options.get("use_book", Config.USE_OPENING_BOOK) and in_time():
+            hit = opening_book.find_move(self._chessboard, self._target, self._options.get("book"), self.stats)
+            if hit is not None:
+                self.stats.total_time = time.perf_counter() - start
+                return hit
+        if self._options.get("threat_search", Config.THREAT_SEARCH) and in_time():
+            # 算杀在主进程中完成, 与单进程搜索一致
+            win = threat.find_win(self._chessboard, self._target, self.stats, deadline=deadline)
+            if win is not None:
+                self.stats.total_time = time.perf_counter() - start
+                return evaluate.Score.MATE_BOUND, win
+        executor = self._executor or ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            for depth in range(1, max_depth + 1):
+                # 每轮重新生成候选走法, 只把上一轮的最佳走法移到最前, 与单进程搜索的根节点顺序一致
+                moves = self._chessboard.get_candidates(self._target, self._options.get("top_k"))
+                if move in moves:
+                    moves.remove(move)
+                    moves.insert(0, move)
+                budget = None
+                if deadline is not None and depth > 1:
+                    budget = (deadline - time.perf_counter()) * 1000
+                    if budget <= 0:
+                        break
+                # 轮流分配, 每个进程内的走法保持全局顺序
+                futures = []
+                for k in range(min(self._workers, len(moves))):
+                    chunk = moves[k::self._workers]
+                    futures.append(executor.submit(_search_worker, stones, size, int(self._target),
+                                                    chunk, depth, budget, self._worker_options))
+                results = [future.result() for future in futures]
+                for result in results:
+                    self.stats.merge(result[2])
+                if not results or any(result[0] is None for result in results):
+                    break
+                # 分数最高者胜出, 分数相同时取全局顺序靠前的走法
+                score, move, _ = max(results, key=lambda result: (result[0], -moves.index(result[1])))
+                self.completed_depth = depth
+                self.stats.completed_depth = depth
+                self.stats.iterations.append((depth, self.stats.total_nodes, time.perf_counter() - start))
+                if self._on_iteration is not None:
+                    self._on_iteration(self.stats)
+                # 已证明胜负时不再加深, 形态的启发式分数不算
+                if evaluate.is_mate(score):
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+        finally:
+            self.stats.total_time = time.perf_counter() - start
+            if self._executor is None:
+                executor.shutdown()
+        if move is None:
+            return score, None
+        return score, Point(move[0], move[1], self._target)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+后台思考(ponder): AI落子后在对手思考期间预测其应对, 在预测的局面上继续搜索并填充置换表,
+对手走了预测的走法时直接使用搜索结果, 否则后续搜索也能用到置换表中的结果
+author: yooongchun@foxmail.com
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Optional
+
+from gobang import chessboard
+from gobang import evaluate
+from gobang.config import Chess, Config, Point
+from gobang.strategy import min_max_tree
+from gobang.strategy.transposition import TranspositionTable
+
+# 后台思考的结果: 分数, 走法(Point或None), 完成的深度, 耗时(秒), 是否命中开局库或算杀, 主变例,
+# MCTS完成的模拟次数(博弈树搜索为None)
+PonderResult = namedtuple("PonderResult", ["score", "move", "depth", "elapsed", "conclusive", "pv", "playouts"])
+
+
+class Ponderer(object):
+    """在后台线程中思考, 同一时间最多一个后台搜索, 落子前需先调用take或stop"""
+
+    def __init__(self, role: Chess, max_depth: int=Config.AI_MAX_DEPTH,
+                    time_budget_ms: Optional[float]=Config.AI_TIME_BUDGET_MS,
+                    searcher_cls: type=min_max_tree.MinMaxSearcher,
+                    ponder_time_ms: Optional[float]=None, **options):
+        """初始化
+        Args:
+            role: AI的角色
+            max_depth: 最大搜索深度
+            time_budget_ms: AI每步的时间预算(毫秒), 后台思考的时间不少于它时结果可直接使用
+            searcher_cls: 搜索类, MinMaxSearcher或其子类, 或MCTSSearcher
+            ponder_time_ms: 每次后台思考的时间上限(毫秒), 不传时为time_budget_ms的Config.PONDER_TIME_FACTOR倍,
+                time_budget_ms也为None时不限时
+            options: 传给搜索类的参数, tt不传时新建一个, 与前台搜索共享;
+                MCTS的tree需与前台搜索分开, 否则后台思考会把前台的树移到预测的局面上
+        """
+        self.role = role
+        self.army = Chess.BLACK if role == Chess.WHITE else Chess.WHITE
+        self.max_depth = max_depth
+        self.time_budget_ms = time_budget_ms
+        if ponder_time_ms is None and time_budget_ms is not None:
+            ponder_time_ms = time_budget_ms * Config.PONDER_TIME_FACTOR
+        self.ponder_time_ms = ponder_time_ms
+        self._searcher_cls = searcher_cls
+        self.tt = options.pop("tt", None) or TranspositionTable()
+        self._options = options
+        self._thread = None
+        self._cancel = threading.Event()
+        # 预测的对手走法(x, y)及在其之后的思考结果
+        self.prediction = None
+        self.result = None
+        # 命中及未命中预测的次数
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def running(self):
+        """后台搜索是否正在进行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def predict(self, board: chessboard.ChessBoard, pv: Optional[list]=None):
+        """预测对手的应对: 主变例中的第二步, 没有时取对手启发式分数最高的候选走法"""
+        if pv and len(pv) > 1 and pv[1].chess == self.army and board.is_empty(pv[1]):
+            return pv[1].x, pv[1].y
+        moves = board.get_candidates(self.army, 1)
+        return moves[0] if moves else None
+
+    def start(self, board: chessboard.ChessBoard, pv: Optional[list]=None):
+        """AI落子后开始后台思考, 在棋盘的副本上搜索, 不修改棋盘
+        Args:
+            board: 轮到对手落子的棋盘
+            pv: AI刚完成的搜索的主变例, 从AI刚下的一步开始
+        Returns:
+            是否开始了后台搜索
+        """
+        self.stop()
+        self.prediction, self.result = None, None
+        if board.is_over():
+            return False
+        move = self.predict(board, pv)
+        if move is None:
+            return False
+        copy = board.copy()
+        copy.set(Point(move[0], move[1], self.army))
+        if copy.is_over():
+            return False
+        self.prediction = move
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(copy, self._cancel), daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, board: chessboard.ChessBoard, cancel: threading.Event):
+        """后台线程: 迭代加深直到最大深度、用完ponder_time_ms或被取消"""
+        searcher = self._searcher_cls(board, self.role, tt=self.tt, cancel=cancel, **self._options)
+        start = time.perf_counter()
+        score, move = searcher.search(self.max_depth, self.ponder_time_ms)
+        # 命中开局库或已证明胜负时可直接使用, 形态的启发式分数(如活四)不算
+        conclusive = searcher.stats.book_hits > 0 or evaluate.is_mate(score)
+        self.result = PonderResult(score, move, searcher.completed_depth, time.perf_counter() - start, conclusive,
+                                    list(searcher.pv), getattr(searcher, "playouts", None))
+
+    def stop(self):
+        """取消后台搜索并等待线程退出"""
+        if self._thread is not None:
+            self._cancel.set()
+            self._thread.join()
+            self._thread = None
+
+    def take(self, move: Point):
+        """对手落子后调用: 停止后台思考, 对手走了预测的走法且思考足够充分时返回(分数, 走法)
+        足够充分指搜索到了最大深度(MCTS为完成了每步的全部模拟)、用时不少于每步的时间预算, 或命中开局库/算杀
+        Returns:
+            (分数, Point)或None, 为None时需要正常搜索(置换表已被填充)
+        """
+        self.stop()
+        if self.prediction is None:
+            return None
+        if (move.x, move.y) != self.prediction:
+            self.misses += 1
+            return None
+        self.hits += 1
+        result = self.result
+        if result is None or result.move is None:
+            return None
+        budget = self.time_budget_ms / 1000 if self.time_budget_ms is not None else float('inf')
+        if result.playouts is not None:
+            # MCTS的完成深度只是主变例的长度, 少量模拟后就可能达到, 按模拟次数判断
+            complete = result.playouts >= self._options.get("playouts", Config.MCTS_PLAYOUTS)
+        else:
+            complete = result.depth >= self.max_depth
+        if complete or result.elapsed >= budget or result.conclusive:
+            return result.score, result.move
+        return None
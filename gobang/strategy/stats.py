@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+搜索统计
+author: yooongchun@foxmail.com
+"""
+from collections import defaultdict as ddict
+
+
+class SearchStats(object):
+    """一次搜索的统计信息, 每次search()开始时重置"""
+
+    def __init__(self):
+        # 每一层(距根节点的步数)访问的节点数
+        self.nodes = ddict(int)
+        # 叶子节点评估次数
+        self.evaluations = 0
+        # 展开的内部节点数及其搜索的子节点数, 用于计算有效分支因子
+        self.expanded = 0
+        self.children = 0
+        # 剪枝次数及发生剪枝的走法序号
+        self.cutoffs = 0
+        self.cutoff_index = ddict(int)
+        # 置换表命中及直接返回的次数
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        # 零窗口搜索失败后重新搜索的次数, 及根节点期望窗口失败的次数
+        self.researches = 0
+        self.aspiration_fails = 0
+        # 算杀(VCF/VCT)的节点数及耗时
+        self.threat_nodes = 0
+        self.threat_time = 0.0
+        # 开局库命中次数
+        self.book_hits = 0
+        # 评估缓存的命中及未命中次数
+        self.eval_cache_hits = 0
+        self.eval_cache_misses = 0
+        # 耗时(秒): 评估、走法生成及总耗时
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        self.total_time = 0.0
+        # 每一轮迭代: (深度, 累计节点数, 累计耗时)
+        self.iterations = []
+        self.completed_depth = 0
+
+    @property
+    def total_nodes(self):
+        """访问的节点总数"""
+        return sum(self.nodes.values())
+
+    @property
+    def search_time(self):
+        """除评估和走法生成外的递归耗时"""
+        return max(0.0, self.total_time - self.eval_time - self.movegen_time)
+
+    @property
+    def branching_factor(self):
+        """有效分支因子: 内部节点平均实际搜索的子节点数"""
+        return self.children / self.expanded if self.expanded else 0.0
+
+    @property
+    def nps(self):
+        """每秒搜索的节点数"""
+        return self.total_nodes / self.total_time if self.total_time else 0.0
+
+    @property
+    def eval_cache_hit_rate(self):
+        """评估缓存命中率"""
+        total = self.eval_cache_hits + self.eval_cache_misses
+        return self.eval_cache_hits / total if total else 0.0
+
+    @property
+    def first_cutoff_rate(self):
+        """第一个走法即发生剪枝的比例, 越高说明走法排序越好"""
+        return self.cutoff_index.get(0, 0) / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def mean_cutoff_index(self):
+        """发生剪枝的走法的平均序号, 越小说明走法排序越好"""
+        return sum(index * count for index, count in self.cutoff_index.items()) / self.cutoffs if self.cutoffs else 0.0
+
+    def merge(self, other: "SearchStats"):
+        """合并另一次(如其他进程中)搜索的统计, 评估和走法生成耗时累加, 总耗时由调用方设置"""
+        for ply, count in other.nodes.items():
+            self.nodes[ply] += count
+        for index, count in other.cutoff_index.items():
+            self.cutoff_index[index] += count
+        for name in ("evaluations", "expanded", "children", "cutoffs", "tt_hits", "tt_cutoffs",
+                        "researches", "aspiration_fails",
+                        "threat_nodes", "threat_time", "book_hits",
+                        "eval_cache_hits", "eval_cache_misses", "eval_time", "movegen_time"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def to_dict(self):
+        """转换为字典, 便于输出到监控系统"""
+        return {
+            "nodes": dict(self.nodes),
+            "total_nodes": self.total_nodes,
+            "evaluations": self.evaluations,
+            "expanded": self.expanded,
+            "cutoffs": self.cutoffs,
+            "cutoff_index": dict(self.cutoff_index),
+            "first_cutoff_rate": self.first_cutoff_rate,
+            "mean_cutoff_index": self.mean_cutoff_index,
+            "tt_hits": self.tt_hits,
+            "tt_cutoffs": self.tt_cutoffs,
+            "researches": self.researches,
+            "aspiration_fails": self.aspiration_fails,
+            "threat_nodes": self.threat_nodes,
+            "threat_time": self.threat_time,
+            "book_hits": self.book_hits,
+            "eval_cache_hits": self.eval_cache_hits,
+            "eval_cache_misses": self.eval_cache_misses,
+            "eval_cache_hit_rate": self.eval_cache_hit_rate,
+            "eval_time": self.eval_time,
+            "movegen_time": self.movegen_time,
+            "search_time": self.search_time,
+            "total_time": self.total_time,
+            "branching_factor": self.branching_factor,
+            "nps": self.nps,
+            "iterations": list(self.iterations),
+            "completed_depth": self.completed_depth,
+        }
+
+    def __repr__(self) -> str:
+        return (f"SearchStats(depth={self.completed_depth}, nodes={self.total_nodes}, "
+                f"evaluations={self.evaluations}, cutoffs={self.cutoffs}, "
+                f"first_cutoff={self.first_cutoff_rate:.2f}, ebf={self.branching_factor:.2f}, "
+                f"nps={self.nps:.0f}, eval_cache={self.eval_cache_hit_rate:.2f}, time={self.total_time:.2f}s, eval={self.eval_time:.2f}s, "
+                f"movegen={self.movegen_time:.2f}s)")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+算杀: 连续冲四(VCF)及连续冲四活三(VCT)取胜的搜索
+只展开进攻方的冲四/活三及防守方的应对, 比全宽度搜索更深更快
+author: yooongchun@foxmail.com
+"""
+import functools
+import threading
+import time
+from typing import Optional
+
+from gobang import chessboard
+from gobang.config import Chess, Config, Point
+
+# 一个点前后各4格即可判断成五、冲四和活三
+SPAN = 4
+# 棋盘四周填充的宽度及边界值
+PAD = SPAN
+WALL = 3
+# 线上除中心外8格的三进制编码: 0空, 1己方, 2对方或边界, 中心两侧的格子依次为第0~7位
+SLOTS = [k for k in range(-SPAN, SPAN + 1) if k != 0]
+
+
+@functools.lru_cache(maxsize=None)
+def line_table():
+    """线形查找表: 编码 -> (中心落子后是否成五, 成五点相对中心的偏移, 是否活三)
+    冲四: 5格内有4子且另一格为空, 空格即为成五点, 对应Score中的oxxxxd, xoxxx, xxoxx
+    活三: 6格两端为空, 中间4格有3子1空, 即再下一子可成活四(Score.oxxxxo),
+        对应Score中的oxxxo, oxoxxo, 而doxxxod只能成冲四, 不算活三
+    """
+    table = []
+    for code in range(3 ** len(SLOTS)):
+        line, rest = [], code
+        for _ in SLOTS:
+            line.append(rest % 3)
+            rest //= 3
+        line.insert(SPAN, 1)
+        five, fours, three = False, set(), False
+        for start in range(SPAN + 1):
+            window = line[start:start + 5]
+            if window.count(1) == 5:
+                five = True
+            elif window.count(1) == 4 and window.count(0) == 1:
+                fours.add(start + window.index(0) - SPAN)
+        for start in range(SPAN):
+            window = line[start:start + 6]
+            middle = window[1:5]
+            if window[0] == 0 and window[5] == 0 and middle.count(1) == 3 and middle.count(0) == 1:
+                three = True
+        table.append((five, tuple(sorted(fours)), three))
+    return table
+
+
+class ThreatSolver(object):
+    """VCF/VCT搜索
+    棋盘复制为带边界的一维数组, 并增量维护每个点在每个方向上的线形编码, 判断形态只需查表
+    """
+
+    def __init__(self, board: chessboard.ChessBoard, target: Chess, max_nodes: int=Config.THREAT_MAX_NODES,
+                    time_budget_ms: Optional[float]=Config.THREAT_TIME_MS, cancel: Optional[threading.Event]=None,
+                    deadline: Optional[float]=None):
+        """初始化
+        Args:
+            board: 棋盘, 搜索时复制一份, 不修改原棋盘
+            target: 进攻方
+            max_nodes: 每次solve最多搜索的节点数
+            time_budget_ms: 每次solve的时间预算(毫秒), None表示不限时
+            cancel: 取消事件, 被设置后与超时一样中止
+            deadline: 所有solve共同的期限(time.perf_counter()), 与time_budget_ms取先到者, None表示没有
+        """
+        self.size = board.size
+        self._target = int(target)
+        self._army = int(Chess.BLACK if target == Chess.WHITE else Chess.WHITE)
+        self._table = line_table()
+        width = self._width = self.size + 2 * PAD
+        # 方向偏移: 竖, 横, 主对角, 副对角
+        self._offsets = (width, 1, width + 1, width - 1)
+        self._board = [WALL] * (width * width)
+        for x in range(self.size):
+            for y in range(self.size):
+                self._board[self._index(x, y)] = Chess.EMPTY
+        # 每个点每个方向在黑/白视角下的编码, 下标为 点 * 4 + 方向
+        self._codes = {chess: [0] * (width * width * 4) for chess in (Chess.BLACK, Chess.WHITE)}
+        for index, value in enumerate(self._board):
+            if value == Chess.EMPTY:
+                for d, offset in enumerate(self._offsets):
+                    code = 0
+                    for slot, k in enumerate(SLOTS):
+                        if self._board[index + k * offset] == WALL:
+                            code += 2 * 3 ** slot
+                    self._codes[Chess.BLACK][index * 4 + d] = self._codes[Chess.WHITE][index * 4 + d] = code
+        # 周围2格内有棋子的空点, 冲四和活三只可能出现在这些位置
+        self._near = [0] * (width * width)
+        self._candidates = set()
+        self._keys = chessboard.zobrist_keys(self.size)
+        self._hash = 0
+        cells = board.get_board()
+        for x in range(self.size):
+            for y in range(self.size):
+                if cells[x][y] != Chess.EMPTY:
+                    self._place(self._index(x, y), int(cells[x][y]))
+        self._max_nodes = max_nodes
+        self._time_budget_ms = time_budget_ms
+        self._end = deadline
+        self._deadline = None
+        self._cancel = cancel
+        self._vct = False
+        self._cache = {}
+        # 最近一次solve的节点数, 耗时(秒)及是否因节点或时间限制中止
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.aborted = False
+
+    def _index(self, x: int, y: int):
+        return (x + PAD) * self._width + y + PAD
+
+    def _point(self, index: int):
+        return index // self._width - PAD, index % self._width - PAD
+
+    def _update(self, index: int, chess: int, sign: int):
+        """落子(sign=1)或提子(sign=-1)后更新周围的编码及候选点"""
+        own, other = self._codes[chess], self._codes[3 - chess]
+        for d, offset in enumerate(self._offsets):
+            for slot, k in enumerate(SLOTS):
+                # index位于点(index - k * offset)的第slot位上
+                pos = (index - k * offset) * 4 + d
+                weight = sign * 3 ** slot
+                own[pos] += weight
+                other[pos] += 2 * weight
+        board, near, candidates, width = self._board, self._near, self._candidates, self._width
+        for dx in range(-2, 3):
+            row = index + dx * width
+            for dy in range(-2, 3):
+                cell = row + dy
+                if 0 <= cell < len(near):
+                    near[cell] += sign
+                    if near[cell] > 0 and board[cell] == Chess.EMPTY:
+                        candidates.add(cell)
+                    else:
+                        candidates.discard(cell)
+        x, y = self._point(index)
+        self._hash ^= self._keys[x][y][chess]
+
+    def _place(self, index: int, chess: int):
+        self._board[index] = chess
+        self._update(index, chess, 1)
+
+    def _remove(self, index: int):
+        chess = self._board[index]
+        self._board[index] = Chess.EMPTY
+        self._update(index, chess, -1)
+
+    def _scan(self, chess: int):
+        """chess一方的形态: (成五点, 冲四点[(成五点数, 活三数, 点)], 活三点[(活三数, 点)])"""
+        table, codes = self._table, self._codes[chess]
+        fives, fours, threes = [], [], []
+        for index in self._candidates:
+            base = index * 4
+            five, points, live = False, 0, 0
+            for d in range(4):
+                entry = table[codes[base + d]]
+                if entry[0]:
+                    five = True
+                    break
+                points += len(entry[1])
+                live += entry[2]
+            if five:
+                fives.append(index)
+            elif points:
+                fours.append((points, live, index))
+            elif live:
+                threes.append((live, index))
+        fives.sort()
+        fours.sort(key=lambda item: (-item[0] - item[1], item[2]))
+        threes.sort(key=lambda item: (-item[0], item[1]))
+        return fives, fours, threes
+
+    def _check_limits(self):
+        self.nodes += 1
+        if self.nodes > self._max_nodes or \
+                (self._deadline is not None and time.perf_counter() >= self._deadline) or \
+                (self._cancel is not None and self._cancel.is_set()):
+            self.aborted = True
+            return False
+        return True
+
+    def _attack(self, depth: int):
+        """进攻方走棋, 返回取胜的走法序列, 不能取胜时返回None"""
+        if not self._check_limits():
+            return None
+        fives, fours, threes = self._scan(self._target)
+        if fives:
+            return [fives[0]]
+        if depth <= 0:
+            return None
+        key = (self._hash, depth)
+        if key in self._cache:
+            return self._cache[key]
+        if depth == 1:
+            # 最后一步必须一次形成两个成五点(活四或双四)
+            threats = [index for points, _, index in fours if points > 1]
+        else:
+            threats = [index for _, _, index in fours]
+            if self._vct:
+                threats += [index for _, index in threes]
+        blocks = self._scan(self._army)[0]
+        if len(blocks) > 1:
+            threats = []
+        elif blocks:
+            # 对方已冲四, 只能堵在成五点上, 且这一步本身需要是进攻
+            threats = [index for index in threats if index == blocks[0]]
+        result = None
+        for index in threats:
+            self._place(index, self._target)
+            try:
+                line = self._defend(depth, index)
+            finally:
+                self._remove(index)
+            if line is not None:
+                result = [index] + line
+                break
+            if self.aborted:
+                return None
+        self._cache[key] = result
+        return result
+
+    def _defend(self, depth: int, last: int):
+        """防守方应对, 所有应对都被攻破时返回取胜的走法序列
+        Args:
+            depth: 进攻方剩余步数
+            last: 进攻方刚下的一步
+        """
+        if not self._check_limits():
+            return None
+        own_fives, own_fours, _ = self._scan(self._army)
+        if own_fives:
+            return None
+        fives, fours, _ = self._scan(self._target)
+        if len(fives) > 1:
+            return [fives[0], fives[1]]
+        if fives:
+            defenses = fives
+        else:
+            # 活三: 堵在这个活三所在线上的冲四点, 或者自己冲四反击
+            lines = set(last + k * offset for offset in self._offsets for k in SLOTS)
+            defenses = sorted(set(index for _, _, index in fours if index in lines) |
+                                set(index for _, _, index in own_fours))
+        line = None
+        for index in defenses:
+            self._place(index, self._army)
+            try:
+                reply = self._attack(depth - 1)
+            finally:
+                self._remove(index)
+            if reply is None:
+                return None
+            if line is None:
+                line = [index] + reply
+        return line
+
+    def solve(self, vct: bool=False, max_depth: Optional[int]=None):
+        """搜索连续进攻取胜的走法
+        Args:
+            vct: 是否允许活三进攻, 否则只搜索连续冲四
+            max_depth: 进攻方最多的步数, 默认取Config中的设置
+        Returns:
+            取胜的走法序列[(x, y)], 双方交替, 找不到时返回None
+        """
+        start = time.perf_counter()
+        if max_depth is None:
+            max_depth = Config.VCT_DEPTH if vct else Config.VCF_DEPTH
+        self._vct = vct
+        self._cache = {}
+        self.nodes = 0
+        self.aborted = False
+        self._deadline = self._end
+        if self._time_budget_ms is not None:
+            self._deadline = start + self._time_budget_ms / 1000
+            if self._end is not None:
+                self._deadline = min(self._deadline, self._end)
+        result = None
+        # 逐步加深, 优先找到最短的取胜序列
+        for depth in range(1, max_depth + 1):
+            result = self._attack(depth)
+            if result is not None or self.aborted:
+                break
+        self.elapsed = time.perf_counter() - start
+        return [self._point(index) for index in result] if result is not None else None
+
+
+def find_win(board: chessboard.ChessBoard, target: Chess, stats=None, cancel: Optional[threading.Event]=None,
+                deadline: Optional[float]=None):
+    """先VCF后VCT, 找到取胜走法时返回Point, 否则返回None
+    Args:
+        board: 棋盘
+        target: 进攻方
+        stats: SearchStats, 传入时累计算杀的节点数和耗时
+        cancel: 取消事件
+        deadline: 期限(time.perf_counter()), 到期后不再开始新的算杀, 进行中的算杀也会中止
+    """
+    solver = ThreatSolver(board, target, cancel=cancel, deadline=deadline)
+    for vct in (False, True):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        line = solver.solve(vct)
+        if stats is not None:
+            stats.threat_nodes += solver.nodes
+            stats.threat_time += solver.elapsed
+        if line is not None:
+            return Point(*line[0], target)
+    return None
+
+
+if __name__ == "__main__":
+    board = chessboard.ChessBoard(size=15)
+    for x, y, c in [(7, 7, 2), (7, 8, 2), (8, 6, 2), (9, 6, 2), (6, 6, 1), (6, 7, 1), (5, 8, 1), (10, 9, 1)]:
+        board.set(Point(x, y, Chess(c)))
+    board.show()
+    start = time.perf_counter()
+    line_table()
+    print(f"line table: {(time.perf_counter() - start) * 1000:.1f}ms")
+    solver = ThreatSolver(board, Chess.WHITE, max_nodes=100000, time_budget_ms=None)
+    for vct in (False, True):
+        print("VCT" if vct else "VCF", solver.solve(vct), f"nodes={solver.nodes} time={solver.elapsed * 1000:.1f}ms")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+置换表: 以Zobrist哈希为键缓存搜索结果
+author: yooongchun@foxmail.com
+"""
+import enum
+import sys
+from collections import namedtuple
+from typing import Optional
+
+from gobang.config import Config
+from gobang.evaluate import Score
+
+
+class Bound(enum.IntEnum):
+    """分数的边界类型"""
+    EXACT = 0  # 精确值
+    LOWER = 1  # 下界, 真实值 >= score
+    UPPER = 2  # 上界, 真实值 <= score
+
+
+class Replacement(object):
+    """槽位冲突时的替换策略"""
+    DEPTH_PREFERRED = "depth"  # 只有搜索深度不小于已有记录时才替换
+    ALWAYS = "always"  # 总是替换
+
+
+def score_to_tt(score: float, ply: int):
+    """存入置换表的分数: 胜负分换算为从当前节点起的步数, 与到达该局面的路径长度无关"""
+    if score >= Score.MATE_BOUND:
+        return score + ply
+    if score <= -Score.MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: float, ply: int):
+    """从置换表取出的分数: 胜负分换算回从根节点起的步数, 与score_to_tt相反"""
+    if score >= Score.MATE_BOUND:
+        return score - ply
+    if score <= -Score.MATE_BOUND:
+        return score + ply
+    return score
+
+
+# 置换表条目, move为(x, y)或None
+TTEntry = namedtuple("TTEntry", ["key", "depth", "bound", "score", "move"])
+
+
+class TranspositionTable(object):
+    """固定大小的置换表"""
+
+    def __init__(self, size: int=Config.TT_SIZE, policy: str=Config.TT_POLICY):
+        """初始化
+        Args:
+            size: 槽位数量, 按key % size定位
+            policy: 替换策略, 见Replacement
+        """
+        if size <= 0:
+            raise ValueError(f"Invalid table size: {size}")
+        if policy not in (Replacement.DEPTH_PREFERRED, Replacement.ALWAYS):
+            raise ValueError(f"Unsupported replacement policy: {policy}")
+        self.size = size
+        self.policy = policy
+        self._table = [None] * size
+        # 计数器
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.replaced = 0
+        self.rejected = 0
+        self.used = 0
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """查找局面, 不存在时返回None"""
+        entry = self._table[key % self.size]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.key != key:
+            # 槽位被其他局面占用
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, bound: Bound, score: float, move: Optional[tuple]=None):
+        """保存局面, 返回是否写入"""
+        index = key % self.size
+        old = self._table[index]
+        if old is None:
+            self.used += 1
+        elif old.key != key:
+            if self.policy == Replacement.DEPTH_PREFERRED and old.depth > depth:
+                self.rejected += 1
+                return False
+            self.replaced += 1
+        elif move is None and old.move is not None:
+            # 同一局面没有新的最佳走法时保留原来的
+            move = old.move
+        self._table[index] = TTEntry(key, depth, bound, score, move)
+        self.stores += 1
+        return True
+
+    def clear(self):
+        """清空表及计数器"""
+        self.__init__(self.size, self.policy)
+
+    @property
+    def hit_rate(self):
+        """命中率"""
+        total = self.hits + self.misses + self.collisions
+        return self.hits / total if total else 0.0
+
+    def memory_usage(self):
+        """估算占用的内存字节数"""
+        entry_size = sys.getsizeof(TTEntry(0, 0, Bound.EXACT, 0, None)) + sys.getsizeof(1 << 63) + sys.getsizeof((0, 0))
+        return sys.getsizeof(self._table) + self.used * entry_size
+
+    def stats(self):
+        """计数器汇总"""
+        return {
+            "size": self.size,
+            "policy": self.policy,
+            "used": self.used,
+            "fill_rate": self.used / self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hit_rate,
+            "stores": self.stores,
+            "replaced": self.replaced,
+            "rejected": self.rejected,
+            "memory_bytes": self.memory_usage(),
+        }
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+批量评估: 结果与逐个局面的Evaluation一致, 流式读写文件不改变结果
+在仓库根目录运行: python -m pytest tests
+"""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from gobang import batch_evaluate, chessboard, evaluate
+from gobang.config import Chess, Point
+
+
+def random_positions(count: int, size: int, seed: int=0):
+    """黑白交替随机落子的局面及轮到落子的一方, 有一方连成五子时停止落子"""
+    rand = random.Random(seed)
+    boards, sides = [], []
+    for _ in range(count):
+        board = chessboard.ChessBoard(size=size)
+        cells = [(x, y) for x in range(size) for y in range(size)]
+        rand.shuffle(cells)
+        for k, (x, y) in enumerate(cells[:rand.randint(0, size * size // 2)]):
+            board.set(Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE))
+            if board.winner is not None:
+                break
+        boards.append([list(row) for row in board.get_board()])
+        sides.append(int(rand.choice((Chess.BLACK, Chess.WHITE))))
+    return boards, sides
+
+
+@pytest.mark.parametrize("size", [9, 15])
+def test_evaluate_batch_matches_evaluation(size):
+    boards, sides = random_positions(40, size, seed=size)
+    scores = batch_evaluate.evaluate_batch(np.array(boards), np.array(sides))
+    for board, side, score in zip(boards, sides, scores):
+        expected = evaluate.Evaluation(chessboard.ChessBoard(board, size), Chess(side)).get_score(min_max=True)
+        assert tuple(int(v) for v in score) == expected
+
+
+def test_evaluate_file_matches_evaluate_batch(tmp_path):
+    size = 9
+    boards, sides = random_positions(25, size, seed=1)
+    src, dst = str(tmp_path / "positions.bin"), str(tmp_path / "scores.bin")
+    batch_evaluate.write_positions(src, np.array(boards), np.array(sides))
+    # 块大小不整除记录数, 最后一块不满
+    assert batch_evaluate.evaluate_file(src, dst, size, chunk=7) == len(boards)
+    scores = np.fromfile(dst, dtype="<i4").reshape(-1, 2)
+    assert (scores == batch_evaluate.evaluate_batch(np.array(boards), np.array(sides))).all()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+局面评估: 增量评估与全局评估一致, 以及Matcher逆对角线的搜索
+在仓库根目录运行: python -m pytest tests
+"""
+import random
+
+import pytest
+
+from gobang import chessboard, evaluate
+from gobang.config import Chess, Point
+from gobang.evaluate import Direction
+
+
+def random_board(seed: int, size: int=15, stones: int=30):
+    """黑白交替在随机位置落子, 有一方连成五子时停止"""
+    rand = random.Random(seed)
+    board = chessboard.ChessBoard(size=size)
+    cells = [(x, y) for x in range(size) for y in range(size)]
+    rand.shuffle(cells)
+    for k, (x, y) in enumerate(cells[:stones]):
+        board.set(Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE))
+        if board.winner is not None:
+            break
+    return board
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_matches_full_evaluation(seed):
+    board = random_board(seed, stones=10 + seed * 3)
+    incremental = evaluate.IncrementalEvaluation(board)
+    try:
+        for target in (Chess.BLACK, Chess.WHITE):
+            assert incremental.get_score(target) == evaluate.Evaluation(board, target).get_score()
+    finally:
+        incremental.close()
+
+
+def test_incremental_follows_set_unset_and_reset():
+    board = random_board(7, size=11, stones=12)
+    incremental = evaluate.IncrementalEvaluation(board)
+    try:
+        while board.history:
+            board.unset()
+            for target in (Chess.BLACK, Chess.WHITE):
+                assert incremental.get_score(target) == evaluate.Evaluation(board, target).get_score()
+        board.set(Point(5, 5, Chess.BLACK))
+        board.reset()
+        assert incremental.get_score(Chess.BLACK) == evaluate.Evaluation(board, Chess.BLACK).get_score()
+    finally:
+        incremental.close()
+
+
+def test_rdiag_finds_windows_near_top_left():
+    # 起点在第0行、第k-1到n-k-2列的逆对角线窗口曾经被跳过
+    n, arr = 15, [1, 1, 1, 1, 1]
+    for col in range(len(arr) - 1, n):
+        matrix = [[0] * n for _ in range(n)]
+        for m in range(len(arr)):
+            matrix[m][col - m] = 1
+        expected = tuple((m, col - m) for m in range(len(arr)))
+        assert evaluate.Matcher(matrix, arr).match_arr() == expected
+
+
+def test_rdiag_visits_each_window_once():
+    # 主逆对角线上的窗口曾经被搜索两次
+    n, arr = 7, [1, 1, 1, 1, 1]
+    matrix = [[0] * n for _ in range(n)]
+    for m in range(n):
+        matrix[m][n - 1 - m] = 1
+    indexes = evaluate.Matcher(matrix, arr, match_all=True).match_arr()
+    windows = indexes[Direction.RDIAG]
+    assert len(windows) == len(set(windows)) == n - len(arr) + 1
+
+
+def case_arrays():
+    """Score中所有形态及其逆序, 以x=1, d=2, o=0表示"""
+    values = {'x': 1, 'd': 2, 'o': 0}
+    arrs = []
+    for case in dir(evaluate.Score):
+        if case[0] not in 'oxd':
+            continue
+        arr = [values[c] for c in case]
+        arrs.append(arr)
+        if arr != arr[::-1]:
+            arrs.append(arr[::-1])
+    return arrs
+
+
+def random_matrix(seed: int, n: int):
+    """随机矩阵, 空位稍多, 使各种形态都能出现"""
+    rand = random.Random(seed)
+    return [[rand.choice((0, 0, 0, 1, 1, 2)) for _ in range(n)] for _ in range(n)]
+
+
+def as_sets(indexes):
+    """match_all的结果按方向转为集合, 只比较找到的位置"""
+    if not indexes:
+        return indexes
+    return {dire: set(found) for dire, found in indexes.items() if found}
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_batch_matcher_matches_matcher(seed):
+    matrix = random_matrix(seed, 9 + seed)
+    arrs = case_arrays()
+    batch = evaluate.BatchMatcher(matrix, arrs)
+    for arr in arrs:
+        assert batch.match_arr(arr) == evaluate.Matcher(matrix, arr).match_arr()
+        assert as_sets(batch.match_arr(arr, True)) == as_sets(evaluate.Matcher(matrix, arr, True).match_arr())
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_pattern_table_search_matches_matcher(seed):
+    matrix = random_matrix(100 + seed, 9 + seed)
+    table = evaluate.get_pattern_table()
+    # 所有形态都由查找表搜索, 不会退回到按数组搜索
+    assert {tuple(arr) for arr in case_arrays()} <= set(table.arrays(1, 2))
+    batch = evaluate.BatchMatcher(matrix)
+    batch.search_table(table, 1, 2)
+    for arr in case_arrays():
+        assert batch.match_arr(arr) == evaluate.Matcher(matrix, arr).match_arr()
+        assert as_sets(batch.match_arr(arr, True)) == as_sets(evaluate.Matcher(matrix, arr, True).match_arr())
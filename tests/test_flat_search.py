@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+低分配搜索: FlatSearcher与MinMaxSearcher的分数、走法及主变例一致
+在仓库根目录运行: python -m pytest tests
+"""
+import random
+
+import pytest
+
+from gobang import chessboard
+from gobang.config import Chess, Point
+from gobang.strategy import flat_search, min_max_tree
+
+
+def random_position(seed: int, size: int=11):
+    """在中心附近黑白交替随机落子, 返回棋盘及轮到落子的一方"""
+    rand = random.Random(seed)
+    board = chessboard.ChessBoard(size=size)
+    center = size // 2
+    cells = [(x, y) for x in range(center - 3, center + 4) for y in range(center - 3, center + 4)]
+    rand.shuffle(cells)
+    count = rand.randint(2, 12)
+    for k, (x, y) in enumerate(cells[:count]):
+        board.set(Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE))
+        if board.winner is not None:
+            break
+    return board, Chess.WHITE if len(board.history) % 2 else Chess.BLACK
+
+
+def search(searcher_cls: type, board: chessboard.ChessBoard, target: Chess, depth: int):
+    """不查开局库、不算杀, 只比较博弈树搜索"""
+    searcher = searcher_cls(board, target, use_book=False, threat_search=False)
+    score, move = searcher.search(depth)
+    return score, (move.x, move.y) if move else None, [(pt.x, pt.y, pt.chess) for pt in searcher.pv]
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_flat_search_matches_min_max_search(seed):
+    board, target = random_position(seed)
+    if board.winner is not None:
+        pytest.skip("game already over")
+    before = board.hash
+    expected = search(min_max_tree.MinMaxSearcher, board, target, 3)
+    assert search(flat_search.FlatSearcher, board, target, 3) == expected
+    # 搜索不修改棋盘
+    assert board.hash == before
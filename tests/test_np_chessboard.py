@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+NumPy棋盘: 落子、悔棋后与ChessBoard的哈希、胜负及评分一致
+在仓库根目录运行: python -m pytest tests
+"""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from gobang import chessboard, evaluate, np_chessboard
+from gobang.config import Chess, Point
+from gobang.evaluate import Direction
+
+
+def assert_same(board: chessboard.ChessBoard, np_board: np_chessboard.NumpyChessBoard, pt: Point):
+    """哈希、胜负、棋盘内容及评分都相同"""
+    assert np_board.hash == board.hash
+    assert np_board.winner == board.winner
+    assert np.asarray(np_board.get_board()).tolist() == board.get_board()
+    for target in (Chess.BLACK, Chess.WHITE):
+        assert evaluate.Evaluation(np_board, target).get_score() == evaluate.Evaluation(board, target).get_score()
+        assert evaluate.Evaluation(np_board, target, 4, pt).get_score() == \
+            evaluate.Evaluation(board, target, 4, pt).get_score()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_chessboard_through_set_and_unset(seed):
+    rand = random.Random(seed)
+    size = 11
+    board, np_board = chessboard.ChessBoard(size=size), np_chessboard.NumpyChessBoard(size=size)
+    cells = [(x, y) for x in range(size) for y in range(size)]
+    rand.shuffle(cells)
+    for k, (x, y) in enumerate(cells[:40]):
+        pt = Point(x, y, Chess.BLACK if k % 2 == 0 else Chess.WHITE)
+        board.set(pt)
+        np_board.set(pt)
+        assert_same(board, np_board, pt)
+        if rand.random() < 0.3:
+            board.unset()
+            np_board.unset()
+            assert_same(board, np_board, pt)
+
+
+def test_loaded_board_matches_chessboard():
+    rand = random.Random(3)
+    size = 9
+    matrix = [[rand.choice((0, 0, 1, 2)) for _ in range(size)] for _ in range(size)]
+    board = chessboard.ChessBoard([list(row) for row in matrix], size)
+    np_board = np_chessboard.NumpyChessBoard(np.array(matrix, dtype=np.uint8), size)
+    stones = lambda b: [(pt.x, pt.y, pt.chess) for pt in b.stones]
+    assert stones(np_board) == stones(board)
+    assert_same(board, np_board, Point(4, 4, Chess.BLACK))
+
+
+def test_direction_views_follow_the_board():
+    size = 9
+    np_board = np_chessboard.NumpyChessBoard(size=size)
+    np_board.set(Point(2, 6, Chess.BLACK))
+    np_board.set(Point(5, 1, Chess.WHITE))
+    grid = np.asarray(np_board.get_board())
+    diag, rdiag = np_board.get_lines(Direction.DIAG), np_board.get_lines(Direction.RDIAG)
+    for k in range(-size + 1, size):
+        line = [v for v in diag[k + size - 1] if v != np_chessboard.WALL]
+        assert line == np.diagonal(grid, k).tolist()
+    for k in range(2 * size - 1):
+        line = [v for v in rdiag[k] if v != np_chessboard.WALL]
+        assert line == [int(grid[i, k - i]) for i in range(size) if 0 <= k - i < size]
+    assert (np_board.get_lines(Direction.VERT) == grid.T).all()